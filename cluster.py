@@ -0,0 +1,466 @@
+"""
+Cluster launcher: run the bot as several processes, each an AutoShardedBot over a slice of shards.
+
+    python cluster.py
+
+The supervisor fetches the recommended shard count, splits the shard IDs across worker
+processes running main.py, restarts workers that fail, and hosts a small IPC hub on a
+Unix socket. Workers connect to the hub (ClusterLink) to share guild counts for the
+presence string and to pair userphone calls across clusters. Messages in a call are
+still relayed by the worker that sees them: sending to a channel is a REST call, which
+works from any process.
+
+Environment:
+    CLUSTER_PROCESSES  worker processes (default: CPU count, at most one per shard)
+    SHARD_COUNT        total shards (default: Discord's recommendation)
+    CLUSTER_SOCKET     IPC socket path (default: a file in the temp directory)
+
+The supervisor sets CLUSTER_ID, SHARD_IDS, SHARD_COUNT and CLUSTER_SOCKET for each worker.
+Running main.py directly (no CLUSTER_SOCKET) keeps the single-process behaviour.
+"""
+import asyncio
+import itertools
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from userphone import Call, CallRegistry, CallSide, HANGUP_ENDED, HANGUP_LEFT_QUEUE
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+# Seconds per shard to wait for a worker to come up before launching the next one
+# (Discord limits how fast shards may identify, across all processes)
+IDENTIFY_SECONDS_PER_SHARD = 5.0
+# Restart backoff for failed workers, in seconds
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 60.0
+# A worker that ran at least this long before failing restarts with the minimum backoff again
+RESTART_BACKOFF_RESET = 300.0
+# Seconds a worker waits for a hub reply (interactions must be answered within 3 seconds)
+IPC_TIMEOUT = 2.0
+# Seconds a stopping worker gets to flush and disconnect before it is killed
+SHUTDOWN_TIMEOUT = 30.0
+# Longest IPC message, in bytes (the calls snapshot sent on connect is one line)
+IPC_LINE_LIMIT = 16 * 1024 * 1024
+
+
+def shard_options() -> dict:
+    """AutoShardedBot keyword arguments for this process (empty outside a cluster: shard automatically)."""
+    options = {}
+    shard_count = os.environ.get('SHARD_COUNT')
+    shard_ids = os.environ.get('SHARD_IDS')
+    if shard_count:
+        options['shard_count'] = int(shard_count)
+    if shard_ids:
+        options['shard_ids'] = [int(shard_id) for shard_id in shard_ids.split(',') if shard_id.strip()]
+    return options
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    """Split shard IDs into contiguous, near-equal slices, one per process."""
+    size, extra = divmod(shard_count, processes)
+    slices = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        slices.append(list(range(start, end)))
+        start = end
+    return slices
+
+
+# IPC: newline-delimited JSON objects. Requests carry an 'id' that the reply echoes.
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+async def _read_messages(reader: asyncio.StreamReader):
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        try:
+            yield json.loads(line)
+        except ValueError:
+            print(f"[cluster] Ignoring malformed IPC message: {line[:100]!r}")
+
+
+def _sides(call: Call) -> list:
+    return [[side.user_id, side.channel.id] for side in call.sides]
+
+
+class ChannelRef:
+    """A channel as the hub sees it: only its ID (the hub has no gateway connection)."""
+    __slots__ = ('id',)
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class ClusterHub:
+    """Supervisor side of the IPC channel: guild counts and the shared userphone switchboard."""
+
+    def __init__(self):
+        self.writers: Dict[int, asyncio.StreamWriter] = {}
+        self.guild_counts: Dict[int, int] = {}
+        self.calls = CallRegistry()
+        self._ready: Dict[int, asyncio.Event] = {}
+
+    def ready_event(self, cluster_id: int) -> asyncio.Event:
+        return self._ready.setdefault(cluster_id, asyncio.Event())
+
+    @property
+    def guild_total(self) -> int:
+        return sum(self.guild_counts.values())
+
+    def broadcast(self, message: dict):
+        data = _encode(message)
+        for writer in self.writers.values():
+            if not writer.is_closing():
+                writer.write(data)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        cluster_id = None
+        try:
+            async for message in _read_messages(reader):
+                try:
+                    cluster_id = self._handle_message(message, writer, cluster_id)
+                except Exception as e:
+                    # A bad message must not take down the worker's connection
+                    print(f"[cluster] Failed to handle IPC message {message!r:.100}: {e}")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except Exception as e:
+            print(f"[cluster] Dropping connection to cluster {cluster_id}: {e}")
+        finally:
+            if cluster_id is not None and self.writers.get(cluster_id) is writer:
+                del self.writers[cluster_id]
+                self.guild_counts.pop(cluster_id, None)
+                self.broadcast({'op': 'guild_total', 'count': self.guild_total})
+            writer.close()
+
+    def _handle_message(self, message: dict, writer: asyncio.StreamWriter, cluster_id: Optional[int]) -> Optional[int]:
+        # Returns the connection's cluster id (set by its hello)
+        op = message.get('op')
+        if op == 'hello':
+            cluster_id = message['cluster']
+            self.writers[cluster_id] = writer
+            writer.write(_encode({'op': 'calls', 'calls': [_sides(call) for call in self.calls.active_calls()]}))
+            writer.write(_encode({'op': 'guild_total', 'count': self.guild_total}))
+        elif op == 'ready':
+            self.ready_event(cluster_id).set()
+        elif op == 'guilds':
+            self.guild_counts[cluster_id] = message['count']
+            self.broadcast({'op': 'guild_total', 'count': self.guild_total})
+        elif op in ('dial', 'hang_up'):
+            reply = getattr(self, '_' + op)(message)
+            writer.write(_encode({'op': 'reply', 'id': message['id'], **reply}))
+        return cluster_id
+
+    def _dial(self, message: dict) -> dict:
+        status, call = self.calls.dial(message['user_id'], ChannelRef(message['channel_id']))
+        if call is None:
+            return {'status': status}
+        # Every worker mirrors every call, so whichever sees a message can relay it
+        self.broadcast({'op': 'call_started', 'sides': _sides(call)})
+        return {'status': status, 'sides': _sides(call)}
+
+    def _hang_up(self, message: dict) -> dict:
+        status, result = self.calls.hang_up(message['user_id'], message['channel_id'])
+        if status == HANGUP_ENDED:
+            self.broadcast({'op': 'call_ended', 'user_id': message['user_id']})
+            return {'status': status, 'sides': _sides(result)}
+        if status == HANGUP_LEFT_QUEUE:
+            return {'status': status, 'channel_id': result.id}
+        return {'status': status}
+
+
+class ClusterLink:
+    """Worker side of the IPC channel. Mirrors the hub's calls into the worker's CallRegistry."""
+
+    def __init__(self, bot, calls: CallRegistry, path: str, cluster_id: int):
+        self.bot = bot
+        self.calls = calls
+        self.path = path
+        self.cluster_id = cluster_id
+        # Guilds across all clusters, once the hub has reported it
+        self.guild_total: Optional[int] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, bot, calls: CallRegistry) -> Optional['ClusterLink']:
+        """A link to the hub if this process was started by the cluster supervisor, else None."""
+        path = os.environ.get('CLUSTER_SOCKET')
+        if not path:
+            return None
+        return cls(bot, calls, path, int(os.environ.get('CLUSTER_ID', '0')))
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _run(self):
+        backoff = RESTART_BACKOFF_MIN
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=IPC_LINE_LIMIT)
+            except OSError as e:
+                print(f"[cluster] Could not reach the cluster hub at {self.path}: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+                continue
+            backoff = RESTART_BACKOFF_MIN
+            self._writer = writer
+            self.send('hello', cluster=self.cluster_id)
+            if self.bot.is_ready():
+                self.send('ready')
+                self.report_guilds()
+            try:
+                async for message in _read_messages(reader):
+                    try:
+                        self._dispatch(message)
+                    except Exception as e:
+                        print(f"[cluster] Failed to handle IPC message {message!r:.100}: {e}")
+            except ConnectionError:
+                pass
+            except Exception as e:
+                # e.g. a line over IPC_LINE_LIMIT: reconnect rather than lose the link for good
+                print(f"[cluster] Cluster hub connection failed: {e}")
+            finally:
+                self._writer = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("Lost connection to the cluster hub"))
+                writer.close()
+            print("[cluster] Lost connection to the cluster hub, reconnecting")
+
+    def _dispatch(self, message: dict):
+        op = message.get('op')
+        if op == 'reply':
+            future = self._pending.get(message['id'])
+            if future is not None and not future.done():
+                future.set_result(message)
+        elif op == 'guild_total':
+            self.guild_total = message['count']
+            self.bot.dispatch('cluster_guild_total', self.guild_total)
+        elif op == 'calls':
+            # The hub's snapshot replaces every mirrored call: any that ended while disconnected must go
+            for call in self.calls.active_calls():
+                self.calls.end_call(call.sides[0].user_id)
+            for sides in message['calls']:
+                self.calls.attach(self._call(sides))
+        elif op == 'call_started':
+            self.calls.attach(self._call(message['sides']))
+        elif op == 'call_ended':
+            self.calls.end_call(message['user_id'])
+
+    def _channel(self, channel_id: int):
+        # Channels on other clusters' shards aren't cached here, but can still be sent to
+        return self.bot.get_channel(channel_id) or self.bot.get_partial_messageable(channel_id)
+
+    def _call(self, sides: list) -> Call:
+        return Call(*(CallSide(user_id, self._channel(channel_id)) for user_id, channel_id in sides))
+
+    def send(self, op: str, **data):
+        """Send a message to the hub without waiting; dropped if not connected."""
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(_encode({'op': op, **data}))
+
+    async def request(self, op: str, **data) -> dict:
+        """Send a request to the hub and wait for its reply. Raises ConnectionError or asyncio.TimeoutError."""
+        if self._writer is None or self._writer.is_closing():
+            raise ConnectionError("Not connected to the cluster hub")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self.send(op, id=request_id, **data)
+            return await asyncio.wait_for(future, IPC_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def report_guilds(self):
+        self.send('guilds', count=len(self.bot.guilds))
+
+    async def dial(self, user_id: int, channel) -> Tuple[str, Optional[Call]]:
+        """CallRegistry.dial, run by the hub so users on any cluster can be paired."""
+        reply = await self.request('dial', user_id=user_id, channel_id=channel.id)
+        call = self._call(reply['sides']) if 'sides' in reply else None
+        return reply['status'], call
+
+    async def hang_up(self, user_id: int, channel_id: int) -> Tuple[str, object]:
+        """CallRegistry.hang_up, run by the hub."""
+        reply = await self.request('hang_up', user_id=user_id, channel_id=channel_id)
+        status = reply['status']
+        if 'sides' in reply:
+            return status, self._call(reply['sides'])
+        if 'channel_id' in reply:
+            return status, self._channel(reply['channel_id'])
+        return status, None
+
+
+# Supervisor
+
+class Worker:
+    """One supervised main.py process running a slice of the shards."""
+
+    def __init__(self, cluster_id: int, shard_ids: List[int], shard_count: int, socket_path: str):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.socket_path = socket_path
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+
+    def env(self) -> dict:
+        env = dict(os.environ)
+        env.update(
+            CLUSTER_ID=str(self.cluster_id),
+            SHARD_IDS=','.join(map(str, self.shard_ids)),
+            SHARD_COUNT=str(self.shard_count),
+            CLUSTER_SOCKET=self.socket_path,
+        )
+        return env
+
+    async def start(self):
+        # Own session: a terminal Ctrl-C reaches only the supervisor, which then stops workers itself
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, MAIN_SCRIPT, env=self.env(), start_new_session=True
+        )
+        self.started_at = time.monotonic()
+        print(f"[cluster] Started cluster {self.cluster_id} (pid {self.process.pid}, shards {self.shard_ids[0]}-{self.shard_ids[-1]})")
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class Supervisor:
+    """Launches the workers one after another, restarts failed ones, and hosts the hub."""
+
+    def __init__(self, shard_count: int, processes: int, socket_path: str):
+        self.socket_path = socket_path
+        self.hub = ClusterHub()
+        self.workers = [
+            Worker(cluster_id, shard_ids, shard_count, socket_path)
+            for cluster_id, shard_ids in enumerate(split_shards(shard_count, processes))
+        ]
+        self.stopping = False
+
+    async def run(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.hub.handle, path=self.socket_path, limit=IPC_LINE_LIMIT)
+        tasks = []
+        try:
+            for worker in self.workers:
+                if self.stopping:
+                    break
+                tasks.append(asyncio.create_task(self._supervise(worker)))
+                # Stagger launches so shards in different processes don't identify at the same time
+                try:
+                    await asyncio.wait_for(
+                        self.hub.ready_event(worker.cluster_id).wait(),
+                        IDENTIFY_SECONDS_PER_SHARD * len(worker.shard_ids)
+                    )
+                except asyncio.TimeoutError:
+                    print(f"[cluster] Cluster {worker.cluster_id} not ready yet, launching the next one anyway")
+            await asyncio.gather(*tasks)
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def _supervise(self, worker: Worker):
+        backoff = RESTART_BACKOFF_MIN
+        while not self.stopping:
+            await worker.start()
+            code = await worker.process.wait()
+            if self.stopping:
+                return
+            if code == 0:
+                print(f"[cluster] Cluster {worker.cluster_id} exited cleanly, not restarting it")
+                return
+            ran = time.monotonic() - worker.started_at
+            if ran >= RESTART_BACKOFF_RESET:
+                backoff = RESTART_BACKOFF_MIN
+            print(f"[cluster] Cluster {worker.cluster_id} exited with code {code} after {ran:.0f}s, restarting in {backoff:.0f}s")
+            self.hub.ready_event(worker.cluster_id).clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+
+    async def stop(self):
+        """Ask every worker to shut down (SIGINT lets the bot flush stats and close cleanly)."""
+        if self.stopping:
+            return
+        self.stopping = True
+        print("[cluster] Stopping workers...")
+        running = [worker for worker in self.workers if worker.running]
+        for worker in running:
+            worker.process.send_signal(signal.SIGINT)
+        for worker in running:
+            try:
+                await asyncio.wait_for(worker.process.wait(), SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"[cluster] Cluster {worker.cluster_id} did not stop in time, killing it")
+                worker.process.kill()
+
+
+async def recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards this bot should run."""
+    from discord.http import HTTPClient
+    http = HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shards, _, _ = await http.get_bot_gateway()
+        return shards
+    finally:
+        await http.close()
+
+
+async def run_cluster(token: str):
+    shard_count = int(os.environ.get('SHARD_COUNT') or 0) or await recommended_shard_count(token)
+    processes = int(os.environ.get('CLUSTER_PROCESSES') or os.cpu_count() or 1)
+    processes = max(1, min(processes, shard_count))
+    socket_path = os.environ.get('CLUSTER_SOCKET') or os.path.join(tempfile.gettempdir(), f'nightshade-cluster-{os.getpid()}.sock')
+    print(f"[cluster] Running {shard_count} shard(s) across {processes} process(es)")
+
+    supervisor = Supervisor(shard_count, processes, socket_path)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(supervisor.stop()))
+    await supervisor.run()
+
+
+if __name__ == '__main__':
+    # Optional: load a .env file if python-dotenv is installed
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+
+    TOKEN = os.environ.get('DISCORD_TOKEN') or os.environ.get('TOKEN')
+    if not TOKEN:
+        print("ERROR: Discord bot token not found!")
+        print("Please set the DISCORD_TOKEN or TOKEN environment variable.")
+        sys.exit(1)
+    if not hasattr(asyncio, 'start_unix_server'):
+        print("Cluster mode needs Unix sockets, which this platform lacks. Run main.py directly instead.")
+        sys.exit(1)
+    asyncio.run(run_cluster(TOKEN))
@@ -1,23 +1,63 @@
+import asyncio
+import functools
 import io
+import multiprocessing
 import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional, List
 import discord
 from discord.ext import commands
 from discord import app_commands
-from PIL import Image, ImageDraw, ImageFont # type: ignore
-
-
-def _generate_empty_board_image(width: int = 700, height: int = 600) -> io.BytesIO:
-
-    cols = 7
-    rows = 6
+from connectfour_engine import MOVE_ORDER, ConnectFourState, best_move
+from fonts import get_font, text_size
+
+# Board image geometry, shared by the empty board, the disc sprites and per-game canvases
+BOARD_WIDTH = 700
+BOARD_HEIGHT = 600
+BOARD_PAD = 30
+BOARD_COLS = 7
+BOARD_ROWS = 6
+# Disc colours: X is red, O is green
+DISC_COLORS = {'X': (220, 20, 60), 'O': (50, 205, 50)}
+WIN_LINE_COLOR = (255, 215, 0)
+# Encode boards as palette PNGs: a fraction of the size of truecolor ones, and faster to compress
+QUANTIZE_PNG = True
+# Processes for the bot's move search. The search is pure Python and holds the GIL for its whole
+# budget, so it gets its own pool instead of taking render slots and slowing the event loop
+AI_WORKERS = 2
+
+_ai_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _ai_pool() -> ProcessPoolExecutor:
+    global _ai_executor
+    if _ai_executor is None:
+        # spawn, like the render service's process mode: forking a process running an event loop is unsafe
+        _ai_executor = ProcessPoolExecutor(max_workers=AI_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _ai_executor
+
+
+def _shutdown_ai_pool():
+    global _ai_executor
+    if _ai_executor is not None:
+        _ai_executor.shutdown(wait=False, cancel_futures=True)
+        _ai_executor = None
+
+
+def _draw_empty_board(width: int = BOARD_WIDTH, height: int = BOARD_HEIGHT) -> 'Image.Image':
+    from PIL import Image, ImageDraw
+
+    cols = BOARD_COLS
+    rows = BOARD_ROWS
     bg = (30, 30, 30, 255)
     slot = (220, 220, 220)
     img = Image.new('RGBA', (width, height), bg)
     draw = ImageDraw.Draw(img)
 
-    pad_x = 30
-    pad_y = 30
+    pad_x = BOARD_PAD
+    pad_y = BOARD_PAD
     board_w = width - pad_x * 2
     board_h = height - pad_y * 2
     # draw rounded rectangle background for the board
@@ -36,43 +76,15 @@ def _generate_empty_board_image(width: int = 700, height: int = 600) -> io.Bytes
             draw.ellipse(bbox, fill=(40, 40, 40), outline=(10, 10, 10))
 
     # draw column numbers (1..cols) centered above each column
-    # choose a readable font sized relative to cell height; prefer a TTF if available
-    try:
-        # compute a font size based on cell height
-        font_size = max(12, int(cell_h * 0.28))
-        try:
-            # common Windows font path; Pillow will raise if not found
-            font = ImageFont.truetype(r'C:\Windows\Fonts\arial.ttf', font_size)
-        except Exception:
-            # fallback to default bitmap font
-            font = ImageFont.load_default()
-    except Exception:
-        font = None
+    # choose a readable font sized relative to cell height
+    font = get_font(max(12, int(cell_h * 0.28)), 'regular')
 
     num_color = (245, 245, 245)
     stroke_color = (0, 0, 0)
     stroke_w = 1
     for c in range(cols):
         text = str(c + 1)
-        # Compute text width/height in a Pillow-version-compatible way
-        try:
-            # Pillow >= 8.0: ImageDraw.textbbox
-            bbox = draw.textbbox((0, 0), text, font=font) if hasattr(draw, 'textbbox') else None
-            if bbox:
-                tw = bbox[2] - bbox[0]
-                th = bbox[3] - bbox[1]
-            else:
-                raise AttributeError
-        except Exception:
-            try:
-                # fallback to font.getsize
-                if font:
-                    tw, th = font.getsize(text)
-                else:
-                    # last resort: estimate
-                    tw, th = (10, 10)
-            except Exception:
-                tw, th = (10, 10)
+        tw, th = text_size(text, font)
 
         tx = int(pad_x + c * cell_w + cell_w / 2 - tw / 2)
         # place the numbers slightly above the board area with a small gap
@@ -91,22 +103,7 @@ def _generate_empty_board_image(width: int = 700, height: int = 600) -> io.Bytes
     # draw column numbers centered below each column as well
     for c in range(cols):
         text = str(c + 1)
-        # reuse computed text size logic
-        try:
-            bbox = draw.textbbox((0, 0), text, font=font) if hasattr(draw, 'textbbox') else None
-            if bbox:
-                tw = bbox[2] - bbox[0]
-                th = bbox[3] - bbox[1]
-            else:
-                raise AttributeError
-        except Exception:
-            try:
-                if font:
-                    tw, th = font.getsize(text)
-                else:
-                    tw, th = (10, 10)
-            except Exception:
-                tw, th = (10, 10)
+        tw, th = text_size(text, font)
 
         tx = int(pad_x + c * cell_w + cell_w / 2 - tw / 2)
         # place the numbers slightly below the board area with a small gap
@@ -125,10 +122,122 @@ def _generate_empty_board_image(width: int = 700, height: int = 600) -> io.Bytes
         else:
             draw.text((tx, ty), text, fill=num_color)
 
-    bio = io.BytesIO()
-    img.save(bio, 'PNG')
-    bio.seek(0)
-    return bio
+    return img
+
+
+@functools.lru_cache(maxsize=1)
+def _empty_board() -> 'Image.Image':
+    """The empty board, drawn once per process. Shared: copy it before drawing on it."""
+    # The background is opaque, so RGB loses nothing and skips alpha compositing later
+    return _draw_empty_board().convert('RGB')
+
+
+def _cell_center(row: int, col: int):
+    cell_w = (BOARD_WIDTH - BOARD_PAD * 2) / BOARD_COLS
+    cell_h = (BOARD_HEIGHT - BOARD_PAD * 2) / BOARD_ROWS
+    return int(BOARD_PAD + col * cell_w + cell_w / 2), int(BOARD_PAD + row * cell_h + cell_h / 2)
+
+
+@functools.lru_cache(maxsize=None)
+def _disc_sprite(mark: str) -> 'Image.Image':
+    """A player's disc, exactly covering one slot, with a transparent surround."""
+    from PIL import Image, ImageDraw
+    cell_w = (BOARD_WIDTH - BOARD_PAD * 2) / BOARD_COLS
+    cell_h = (BOARD_HEIGHT - BOARD_PAD * 2) / BOARD_ROWS
+    radius = int(min(cell_w, cell_h) * 0.38)
+    size = radius * 2 + 1
+    sprite = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).ellipse([0, 0, size - 1, size - 1], fill=DISC_COLORS[mark], outline=(0, 0, 0))
+    return sprite
+
+
+def _stamp(image: 'Image.Image', row: int, col: int, mark: str):
+    sprite = _disc_sprite(mark)
+    cx, cy = _cell_center(row, col)
+    offset = sprite.size[0] // 2
+    image.paste(sprite, (cx - offset, cy - offset), sprite)
+
+
+def _draw_win_line(image: 'Image.Image', combo):
+    from PIL import ImageDraw
+    draw = ImageDraw.Draw(image)
+    p1 = _cell_center(*combo[0])
+    p4 = _cell_center(*combo[-1])
+    # draw bold line with outline
+    draw.line([p1, p4], fill=(0, 0, 0), width=14)
+    draw.line([p1, p4], fill=WIN_LINE_COLOR, width=10)
+
+
+@functools.lru_cache(maxsize=1)
+def _palette() -> 'Image.Image':
+    """Palette covering every colour a board can contain, taken from a sample board."""
+    sample = _empty_board().copy()
+    _stamp(sample, 0, 0, 'X')
+    _stamp(sample, 0, 1, 'O')
+    _draw_win_line(sample, [(1, 0), (1, 3)])
+    return sample.quantize(colors=64)
+
+
+def _encode(image: 'Image.Image') -> bytes:
+    from PIL import Image
+    if QUANTIZE_PNG:
+        # Fixed palette, no dithering: a per-image palette search would cost more than it saves
+        no_dither = getattr(Image, 'Dither', Image).NONE
+        image = image.quantize(palette=_palette(), dither=no_dither)
+    out = io.BytesIO()
+    image.save(out, 'PNG')
+    return out.getvalue()
+
+
+def _generate_empty_board_image() -> io.BytesIO:
+    return io.BytesIO(_empty_board_png())
+
+
+@functools.lru_cache(maxsize=1)
+def _empty_board_png() -> bytes:
+    return _encode(_empty_board())
+
+
+def render_board(board: List[List[Optional[str]]], combo) -> bytes:
+    """Render a Connect Four position (board[row][col] is 'X', 'O' or None) as PNG bytes."""
+    image = _empty_board().copy()
+    for r, cells in enumerate(board):
+        for c, mark in enumerate(cells):
+            if mark is not None:
+                _stamp(image, r, c, mark)
+    if combo:
+        _draw_win_line(image, combo)
+    return _encode(image)
+
+
+class BoardCanvas:
+    """
+    A game's board image, kept between moves so each move only stamps its new disc.
+
+    Lives in the bot process, so it can only be used with an in-process (thread) render pool.
+    """
+
+    def __init__(self):
+        self.image = None
+        self._stamped = set()
+        self._lock = threading.Lock()
+
+    def render(self, board: List[List[Optional[str]]], combo) -> bytes:
+        """Stamp the discs not drawn yet (normally just the last move) and encode the board."""
+        with self._lock:
+            if self.image is None:
+                self.image = _empty_board().copy()
+            for r, cells in enumerate(board):
+                for c, mark in enumerate(cells):
+                    if mark is not None and (r, c) not in self._stamped:
+                        _stamp(self.image, r, c, mark)
+                        self._stamped.add((r, c))
+            image = self.image
+            if combo:
+                # Keep the winning line off the canvas itself
+                image = image.copy()
+                _draw_win_line(image, combo)
+            return _encode(image)
 
 
 class ConnectFourButton(discord.ui.Button):
@@ -144,95 +253,117 @@ class ConnectFourButton(discord.ui.Button):
             await interaction.response.send_message("<a:warning:1424944783587147868> You're not a participant in this game.", ephemeral=True)
             return
 
-        if user.id != self.c4_view.current_player_id:
+        view = self.c4_view
+        # The turn only passes once the move has been rendered, so a second click meanwhile must be refused
+        if view.busy:
+            await interaction.response.send_message("<a:warning:1424944783587147868> Wait for the last move to finish.", ephemeral=True)
+            return
+
+        if user.id != view.current_player_id:
             await interaction.response.send_message("<a:warning:1424944783587147868> Not your turn.", ephemeral=True)
             return
 
         col = self.col
-        # find lowest empty slot in column
-        row = None
-        for r in range(self.c4_view.rows - 1, -1, -1):
-            if self.c4_view.board[r][col] is None:
-                row = r
-                break
-
-        if row is None:
+        if not view.state.can_play(col):
             await interaction.response.send_message("<a:warning:1424944783587147868> This column is full.", ephemeral=True)
             return
 
-        symbol = self.c4_view.current_symbol
-        self.c4_view.board[row][col] = symbol
+        # Set before the first await, so the move and its turn switch can't interleave with another click
+        view.busy = True
+        try:
+            view.play(col)
+
+            # Acknowledge quickly and then update the single game message
+            await interaction.response.defer()
 
-        # Acknowledge quickly and then update the single game message
-        await interaction.response.defer()
+            if await view.finish_move(interaction, col):
+                return
+            if view.ai_symbol == view.current_symbol:
+                await view.play_ai_move(interaction)
+        finally:
+            view.busy = False
+
+
+class ConnectFourView(discord.ui.View):
+    def __init__(self, player1: discord.User, player2: discord.User, timeout: Optional[float] = 3600,
+                 ai_symbol: Optional[str] = None):
+        super().__init__(timeout=timeout)
+        self.player1 = player1
+        self.player2 = player2
+        self.cols = 7
+        self.rows = 6
+        # Bitboard game state; board mirrors it as marks for rendering
+        self.state = ConnectFourState()
+        self.board: List[List[Optional[str]]] = [[None for _ in range(self.cols)] for _ in range(self.rows)]
+        self.current_symbol = 'X'
+        self.player_map = {'X': player1.id, 'O': player2.id}
+        # Symbol played by the bot in a single-player game (None for two players)
+        self.ai_symbol = ai_symbol
+        self.game_message = None
+        # True while a move is being played (rendered, and answered by the bot)
+        self.busy = False
+        # Board image updated in place move by move
+        self.canvas = BoardCanvas()
+        # add column buttons (placed in a single row)
+        for c in range(self.cols):
+            self.add_item(ConnectFourButton(c, self))
+
+    @property
+    def current_player_id(self):
+        return self.player_map[self.current_symbol]
+
+    def switch_turn(self):
+        self.current_symbol = 'O' if self.current_symbol == 'X' else 'X'
+
+    def play(self, col: int) -> int:
+        """Drop the current player's disc in col (which must not be full) and return its row."""
+        row = self.state.play(col)
+        self.board[row][col] = self.current_symbol
+        return row
+
+    def check_winner(self) -> Optional[str]:
+        # Only the player who just moved can have completed a line
+        combo = self.get_winning_combo()
+        if combo is None:
+            return None
+        r, c = combo[0]
+        return self.board[r][c]
 
-        # render updated image
+    def get_winning_combo(self):
+        if not self.state.last_mover_won():
+            return None
+        return self.state.winning_line()
+
+    async def finish_move(self, interaction: discord.Interaction, col: int) -> bool:
+        """Render the move just played in col, update the game message and announce the result. True when the game is over."""
+        # render updated image on the render pool
         try:
-            bio = _generate_empty_board_image()
-            img = Image.open(bio).convert('RGBA')
-            draw = ImageDraw.Draw(img)
-
-            pad_x = 30
-            pad_y = 30
-            cols = self.c4_view.cols
-            rows = self.c4_view.rows
-            w, h = img.size
-            board_w = w - pad_x * 2
-            board_h = h - pad_y * 2
-            cell_w = board_w / cols
-            cell_h = board_h / rows
-
-            # colors
-            color1 = (220, 20, 60)   # red
-            color2 = (50, 205, 50)   # green
-
-            for r in range(rows):
-                for c in range(cols):
-                    mark = self.c4_view.board[r][c]
-                    if mark is None:
-                        continue
-                    cx = int(pad_x + c * cell_w + cell_w / 2)
-                    cy = int(pad_y + r * cell_h + cell_h / 2)
-                    radius = int(min(cell_w, cell_h) * 0.38)
-                    bbox = [cx - radius, cy - radius, cx + radius, cy + radius]
-                    fill = color1 if mark == 'X' else color2
-                    draw.ellipse(bbox, fill=fill, outline=(0, 0, 0))
-
-            # highlight winning line if exists
-            combo = self.c4_view.get_winning_combo()
-            if combo:
-                (r1, c1), (r2, c2), (r3, c3), (r4, c4) = combo
-                def center(rr, cc):
-                    return (int(pad_x + cc * cell_w + cell_w / 2), int(pad_y + rr * cell_h + cell_h / 2))
-
-                p1 = center(r1, c1)
-                p4 = center(r4, c4)
-                color_line = (255, 215, 0)
-                # draw bold line with outline
-                draw.line([p1, p4], fill=(0, 0, 0), width=14)
-                draw.line([p1, p4], fill=color_line, width=10)
-
-            out = io.BytesIO()
-            img.save(out, 'PNG')
-            out.seek(0)
+            render = interaction.client.render
+            board = [cells[:] for cells in self.board]
+            combo = self.get_winning_combo()
+            if render.in_process:
+                # Stamp only the new disc onto this game's canvas
+                png = await render.run('connectfour.move', self.canvas.render, board, combo)
+            else:
+                png = await render.run('connectfour.board', render_board, board, combo)
+            out = io.BytesIO(png)
         except Exception as e:
             print(f"[connectfour] Failed to render image: {e}")
             out = None
 
         # check win/draw
-        winner = self.c4_view.check_winner()
-        is_draw = all(self.c4_view.board[r][c] is not None for r in range(self.c4_view.rows) for c in range(self.c4_view.cols))
+        winner = self.check_winner()
+        is_draw = self.state.is_full()
 
         # disable buttons if column full or game over
         if winner or is_draw:
-            for item in self.c4_view.children:
+            for item in self.children:
                 item.disabled = True
         else:
             # optionally disable button if column is full
-            col_full = all(self.c4_view.board[r][col] is not None for r in range(self.c4_view.rows))
-            if col_full:
+            if not self.state.can_play(col):
                 # find corresponding button and disable
-                for item in self.c4_view.children:
+                for item in self.children:
                     if isinstance(item, ConnectFourButton) and item.col == col:
                         item.disabled = True
 
@@ -240,29 +371,29 @@ class ConnectFourButton(discord.ui.Button):
         if out is not None:
             file = discord.File(out, filename='connect4.png')
             # show color words instead of X/O
-            new_embed = discord.Embed(title=f"<a:connectfour:1425036938984947712> Connect Four — {self.c4_view.player1.display_name} (🔴) vs {self.c4_view.player2.display_name} (🟢)")
+            new_embed = discord.Embed(title=f"<a:connectfour:1425036938984947712> Connect Four — {self.player1.display_name} (🔴) vs {self.player2.display_name} (🟢)")
             if winner:
-                winner_name = self.c4_view.player1.display_name if winner == 'X' else self.c4_view.player2.display_name
+                winner_name = self.player1.display_name if winner == 'X' else self.player2.display_name
                 winner_color = '🔴' if winner == 'X' else '🟢'
                 new_embed.description = f"<a:trophy:1424944527315042415> Game over — **{winner_name}** ({winner_color}) wins! <a:trophy:1424944527315042415>"
             elif is_draw:
                 new_embed.description = "<a:connectfour:1425036938984947712> Game over — Draw!"
             else:
-                next_symbol = 'O' if self.c4_view.current_symbol == 'X' else 'X'
-                next_name = self.c4_view.player1.display_name if next_symbol == 'X' else self.c4_view.player2.display_name
+                next_symbol = 'O' if self.current_symbol == 'X' else 'X'
+                next_name = self.player1.display_name if next_symbol == 'X' else self.player2.display_name
                 next_color = '🔴' if next_symbol == 'X' else '🟢'
                 new_embed.description = f"**{next_name}**'s turn ({next_color})"
             new_embed.set_image(url='attachment://connect4.png')
 
             try:
-                gm = getattr(self.c4_view, 'game_message', None)
+                gm = getattr(self, 'game_message', None)
                 if gm:
                     # Edit the existing message with new attachment, embed and view
                     # Use attachments=[] to clear old attachments and provide new file
-                    await gm.edit(attachments=[file], embed=new_embed, view=self.c4_view)
+                    await gm.edit(attachments=[file], embed=new_embed, view=self)
                 else:
-                    new_msg = await interaction.followup.send(file=file, embed=new_embed, view=self.c4_view)
-                    self.c4_view.game_message = new_msg
+                    new_msg = await interaction.followup.send(file=file, embed=new_embed, view=self)
+                    self.game_message = new_msg
             except Exception as e:
                 # log the exception to help debug
                 try:
@@ -271,13 +402,13 @@ class ConnectFourButton(discord.ui.Button):
                     pass
                 # If edit fails, try without replacing attachment (just update embed and view)
                 try:
-                    gm = getattr(self.c4_view, 'game_message', None)
+                    gm = getattr(self, 'game_message', None)
                     if gm:
                         # Keep the existing attachment, just update embed text and view
-                        await gm.edit(embed=new_embed, view=self.c4_view)
+                        await gm.edit(embed=new_embed, view=self)
                     else:
-                        new_msg = await interaction.followup.send(file=file, embed=new_embed, view=self.c4_view)
-                        self.c4_view.game_message = new_msg
+                        new_msg = await interaction.followup.send(file=file, embed=new_embed, view=self)
+                        self.game_message = new_msg
                 except Exception as e2:
                     try:
                         print(f"[connectfour] fallback embed-only edit failed: {e2}")
@@ -286,13 +417,14 @@ class ConnectFourButton(discord.ui.Button):
 
         # announce results if any
         if winner:
-            winner_name = self.c4_view.player1.display_name if winner == 'X' else self.c4_view.player2.display_name
+            winner_name = self.player1.display_name if winner == 'X' else self.player2.display_name
             # record persistent win counter if available on bot
             try:
                 bot = interaction.client
-                winner_id = self.c4_view.player1.id if winner == 'X' else self.c4_view.player2.id
+                winner_id = self.player1.id if winner == 'X' else self.player2.id
                 inc_fn = getattr(bot, 'increment_win_connectfour', None)
-                if inc_fn is not None:
+                # Wins by the bot itself aren't recorded
+                if inc_fn is not None and winner != self.ai_symbol:
                     try:
                         await inc_fn(winner_id)
                     except Exception as e:
@@ -305,89 +437,35 @@ class ConnectFourButton(discord.ui.Button):
                 await interaction.followup.send(f"<a:trophy:1424944527315042415> **{winner_name}** wins! ({winner_color})<a:trophy:1424944527315042415>")
             except Exception:
                 pass
-            self.c4_view.stop()
-            return
+            self.stop()
+            return True
 
         if is_draw and not winner:
             try:
                 await interaction.followup.send("<a:connectfour:1425036938984947712> It's a draw!")
             except Exception:
                 pass
-            self.c4_view.stop()
-            return
+            self.stop()
+            return True
 
         # switch turn
-        self.c4_view.switch_turn()
-
-
-class ConnectFourView(discord.ui.View):
-    def __init__(self, player1: discord.User, player2: discord.User, timeout: Optional[float] = 3600):
-        super().__init__(timeout=timeout)
-        self.player1 = player1
-        self.player2 = player2
-        self.cols = 7
-        self.rows = 6
-        self.board: List[List[Optional[str]]] = [[None for _ in range(self.cols)] for _ in range(self.rows)]
-        self.current_symbol = 'X'
-        self.player_map = {'X': player1.id, 'O': player2.id}
-        self.game_message = None
-        # add column buttons (placed in a single row)
-        for c in range(self.cols):
-            self.add_item(ConnectFourButton(c, self))
-
-    @property
-    def current_player_id(self):
-        return self.player_map[self.current_symbol]
+        self.switch_turn()
+        return False
 
-    def switch_turn(self):
-        self.current_symbol = 'O' if self.current_symbol == 'X' else 'X'
-
-    def check_winner(self) -> Optional[str]:
-        # check horizontal, vertical and two diagonal directions for 4 in a row
-        board = self.board
-        rows = self.rows
-        cols = self.cols
-        for r in range(rows):
-            for c in range(cols):
-                mark = board[r][c]
-                if not mark:
-                    continue
-                # horizontal
-                if c + 3 < cols and all(board[r][c + i] == mark for i in range(4)):
-                    return mark
-                # vertical
-                if r + 3 < rows and all(board[r + i][c] == mark for i in range(4)):
-                    return mark
-                # diag down-right
-                if r + 3 < rows and c + 3 < cols and all(board[r + i][c + i] == mark for i in range(4)):
-                    return mark
-                # diag down-left
-                if r + 3 < rows and c - 3 >= 0 and all(board[r + i][c - i] == mark for i in range(4)):
-                    return mark
-        return None
-
-    def get_winning_combo(self):
-        board = self.board
-        rows = self.rows
-        cols = self.cols
-        for r in range(rows):
-            for c in range(cols):
-                mark = board[r][c]
-                if not mark:
-                    continue
-                # horizontal
-                if c + 3 < cols and all(board[r][c + i] == mark for i in range(4)):
-                    return [(r, c + i) for i in range(4)]
-                # vertical
-                if r + 3 < rows and all(board[r + i][c] == mark for i in range(4)):
-                    return [(r + i, c) for i in range(4)]
-                # diag down-right
-                if r + 3 < rows and c + 3 < cols and all(board[r + i][c + i] == mark for i in range(4)):
-                    return [(r + i, c + i) for i in range(4)]
-                # diag down-left
-                if r + 3 < rows and c - 3 >= 0 and all(board[r + i][c - i] == mark for i in range(4)):
-                    return [(r + i, c - i) for i in range(4)]
-        return None
+    async def play_ai_move(self, interaction: discord.Interaction):
+        """Let the bot pick and play its move (searched on the AI process pool, off the event loop)."""
+        try:
+            col = await asyncio.get_running_loop().run_in_executor(
+                _ai_pool(), best_move, self.state.current, self.state.mask, self.state.moves
+            )
+        except Exception as e:
+            print(f"[connectfour] AI search failed: {e}")
+            if isinstance(e, BrokenProcessPool):
+                # A worker died: start a fresh pool for the next move
+                _shutdown_ai_pool()
+            col = next(c for c in MOVE_ORDER if self.state.can_play(c))
+        self.play(col)
+        await self.finish_move(interaction, col)
 
 
 class ChallengeView(discord.ui.View):
@@ -405,7 +483,7 @@ class ChallengeView(discord.ui.View):
         await interaction.response.edit_message(content=f"**{self.opponent.display_name}** accepted the challenge! Starting Connect Four...", view=None)
 
         try:
-            bio = _generate_empty_board_image()
+            bio = await interaction.client.render.run('connectfour.empty', _generate_empty_board_image)
         except Exception:
             await interaction.followup.send("This command requires the Pillow library. Install it in the bot environment.")
             return
@@ -439,14 +517,21 @@ class ConnectFourCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
+    def cog_unload(self):
+        _shutdown_ai_pool()
+
     @app_commands.command(name='connectfour', description='Challenge someone to a Connect Four match')
-    @app_commands.describe(opponent='User to challenge')
+    @app_commands.describe(opponent='User to challenge (pick the bot to play against it)')
     async def connectfour(self, interaction: discord.Interaction, opponent: discord.User):
         challenger = interaction.user
         if opponent.id == challenger.id:
             await interaction.response.send_message("<a:warning:1424944783587147868> You can't challenge yourself.", ephemeral=True)
             return
 
+        if opponent.id == interaction.client.user.id:
+            await self.start_ai_game(interaction)
+            return
+
         view = ChallengeView(challenger, opponent)
         # Try to respond to the interaction; if that fails (unknown interaction / already acknowledged),
         # fall back to followup, channel send, or DM to ensure the opponent sees the challenge.
@@ -495,6 +580,30 @@ class ConnectFourCog(commands.Cog):
             except Exception:
                 return
 
+    async def start_ai_game(self, interaction: discord.Interaction):
+        """Single-player game against the bot; who goes first is random, as in a challenge."""
+        await interaction.response.defer()
+        try:
+            bio = await interaction.client.render.run('connectfour.empty', _generate_empty_board_image)
+        except Exception:
+            await interaction.followup.send("This command requires the Pillow library. Install it in the bot environment.")
+            return
+
+        human, bot_user = interaction.user, interaction.client.user
+        if random.choice([True, False]):
+            view = ConnectFourView(human, bot_user, ai_symbol='O')
+        else:
+            view = ConnectFourView(bot_user, human, ai_symbol='X')
+        p1, p2 = view.player1, view.player2
+
+        embed = discord.Embed(title=f"<a:connectfour:1425036938984947712> Connect Four: **{p1.display_name}** (🔴) vs **{p2.display_name}** (🟢)")
+        embed.description = f"**{p1.display_name}**'s turn (🔴)"
+        embed.set_image(url='attachment://connect4.png')
+        view.game_message = await interaction.followup.send(file=discord.File(bio, filename='connect4.png'), embed=embed, view=view)
+
+        if view.ai_symbol == view.current_symbol:
+            await view.play_ai_move(interaction)
+
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(ConnectFourCog(bot))
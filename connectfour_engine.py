@@ -0,0 +1,251 @@
+"""
+Connect Four game state and AI on bitboards.
+
+The board is stored as two integers, one bit per cell, column-major with one spare
+bit on top of each column:
+
+     6 13 20 27 34 41 48
+     5 12 19 26 33 40 47
+     4 11 18 25 32 39 46
+     3 10 17 24 31 38 45
+     2  9 16 23 30 37 44
+     1  8 15 22 29 36 43
+     0  7 14 21 28 35 42    <- bottom row
+
+`mask` has a bit for every disc and `current` one for every disc of the player to move.
+Dropping a disc is `mask | (mask + bottom_of_column)`, and four in a row is a handful of
+shifts and ANDs, so drop, full-column and win tests all take constant time. Rows in the
+public API count from the top (row 0 is the top row), like ConnectFourView.board.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+WIDTH = 7
+HEIGHT = 6
+CELLS = WIDTH * HEIGHT
+# Bits per column, including the spare bit that keeps shifted lines from wrapping
+COLUMN_BITS = HEIGHT + 1
+
+BOTTOM_MASK = [1 << (col * COLUMN_BITS) for col in range(WIDTH)]
+TOP_MASK = [1 << (HEIGHT - 1 + col * COLUMN_BITS) for col in range(WIDTH)]
+COLUMN_MASK = [((1 << HEIGHT) - 1) << (col * COLUMN_BITS) for col in range(WIDTH)]
+BOTTOM_ROW = sum(BOTTOM_MASK)
+BOARD_MASK = BOTTOM_ROW * ((1 << HEIGHT) - 1)
+# Shifts between neighbouring cells: vertical, horizontal and the two diagonals
+DIRECTIONS = (1, COLUMN_BITS, COLUMN_BITS - 1, COLUMN_BITS + 1)
+# Search centre columns first: they take part in the most lines
+MOVE_ORDER = (3, 2, 4, 1, 5, 0, 6)
+
+# Seconds the AI may think per move, and the deepest it searches
+AI_THINK_SECONDS = 0.5
+AI_MAX_DEPTH = CELLS
+# Scores at or above WIN_SCORE - CELLS are forced wins (sooner wins score higher)
+WIN_SCORE = 10_000
+
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+
+def _popcount(bits: int) -> int:
+    return bin(bits).count('1')
+
+
+def _alignment(bits: int) -> bool:
+    """True if bits contain four in a row in any direction."""
+    for shift in DIRECTIONS:
+        pairs = bits & (bits >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
+    return False
+
+
+def _winning_cells(bits: int, mask: int) -> int:
+    """Empty cells that would give bits four in a row (playable now or not)."""
+    # vertical: three stacked discs below the cell
+    found = (bits << 1) & (bits << 2) & (bits << 3)
+    for shift in DIRECTIONS[1:]:
+        pair = (bits << shift) & (bits << 2 * shift)
+        found |= pair & (bits << 3 * shift)
+        found |= pair & (bits >> shift)
+        pair = (bits >> shift) & (bits >> 2 * shift)
+        found |= pair & (bits << shift)
+        found |= pair & (bits >> 3 * shift)
+    return found & (BOARD_MASK ^ mask)
+
+
+def _playable(mask: int) -> int:
+    """The cell each non-full column would fill next."""
+    return (mask + BOTTOM_ROW) & BOARD_MASK
+
+
+class ConnectFourState:
+    """Connect Four position: who has which cells, as bitboards."""
+
+    def __init__(self):
+        self.current = 0  # discs of the player to move
+        self.mask = 0     # all discs
+        self.moves = 0
+
+    def can_play(self, col: int) -> bool:
+        return not self.mask & TOP_MASK[col]
+
+    def play(self, col: int) -> int:
+        """Drop a disc for the player to move and return the row (from the top) it lands in."""
+        new_mask = self.mask | (self.mask + BOTTOM_MASK[col])
+        disc = new_mask ^ self.mask
+        # The mover's discs become the opponent's: hand the turn over
+        self.current ^= self.mask
+        self.mask = new_mask
+        self.moves += 1
+        return HEIGHT - 1 - (disc.bit_length() - 1 - col * COLUMN_BITS)
+
+    def is_full(self) -> bool:
+        return self.moves == CELLS
+
+    def last_mover_won(self) -> bool:
+        """True if the disc just played completed four in a row."""
+        return _alignment(self.current ^ self.mask)
+
+    def winning_line(self) -> Optional[List[Tuple[int, int]]]:
+        """(row, col) of one four-in-a-row of the player who just moved, or None."""
+        bits = self.current ^ self.mask
+        for shift in DIRECTIONS:
+            pairs = bits & (bits >> shift)
+            starts = pairs & (pairs >> (2 * shift))
+            if starts:
+                start = (starts & -starts).bit_length() - 1
+                cells = []
+                for i in range(4):
+                    index = start + i * shift
+                    col, height = divmod(index, COLUMN_BITS)
+                    cells.append((HEIGHT - 1 - height, col))
+                return cells
+        return None
+
+
+class _Timeout(Exception):
+    pass
+
+
+def _negamax(current: int, mask: int, moves: int, depth: int, alpha: int, beta: int,
+             table: Dict[int, tuple], deadline: float) -> int:
+    playable = _playable(mask)
+    if not playable:
+        return 0
+    if _winning_cells(current, mask) & playable:
+        return WIN_SCORE - moves
+
+    opponent = current ^ mask
+    threats = _winning_cells(opponent, mask)
+    forced = threats & playable
+    if forced:
+        if forced & (forced - 1):
+            # Two threats at once: whichever is blocked, the other wins next move
+            return -(WIN_SCORE - moves - 1)
+        playable = forced
+    # Never fill the cell directly below an opponent's winning cell
+    playable &= ~(threats >> 1)
+    if not playable:
+        return -(WIN_SCORE - moves - 1)
+
+    if depth <= 0:
+        return _evaluate(current, mask)
+    if time.perf_counter() > deadline:
+        raise _Timeout()
+
+    key = current + mask
+    entry = table.get(key)
+    first = None
+    if entry is not None:
+        entry_depth, flag, value, first = entry
+        if entry_depth >= depth:
+            if flag == _EXACT:
+                return value
+            if flag == _LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+    original_alpha = alpha
+    best, best_col = -WIN_SCORE - 1, None
+    order = MOVE_ORDER if first is None else (first,) + tuple(c for c in MOVE_ORDER if c != first)
+    for col in order:
+        if not playable & COLUMN_MASK[col]:
+            continue
+        score = -_negamax(opponent, mask | (mask + BOTTOM_MASK[col]), moves + 1,
+                          depth - 1, -beta, -alpha, table, deadline)
+        if score > best:
+            best, best_col = score, col
+        if score > alpha:
+            alpha = score
+            if alpha >= beta:
+                break
+
+    if best <= original_alpha:
+        flag = _UPPER
+    elif best >= beta:
+        flag = _LOWER
+    else:
+        flag = _EXACT
+    table[key] = (depth, flag, best, best_col)
+    return best
+
+
+def _evaluate(current: int, mask: int) -> int:
+    """Static score for the player to move: open threats and centre control."""
+    opponent = current ^ mask
+    empty_ours = _winning_cells(current, mask)
+    empty_theirs = _winning_cells(opponent, mask)
+    centre = COLUMN_MASK[WIDTH // 2]
+    return (
+        4 * (_popcount(empty_ours) - _popcount(empty_theirs))
+        + _popcount(current & centre) - _popcount(opponent & centre)
+    )
+
+
+def best_move(current: int, mask: int, moves: int, think_seconds: float = AI_THINK_SECONDS,
+              max_depth: int = AI_MAX_DEPTH) -> int:
+    """
+    Column for the player to move, by iterative-deepening negamax with alpha-beta pruning.
+
+    Takes the raw bitboards (ConnectFourState.current/mask/moves) so it can run on a
+    worker process. Searches deeper until think_seconds run out and returns the best
+    move of the last completed depth.
+    """
+    deadline = time.perf_counter() + think_seconds
+    playable = _playable(mask)
+    columns = [col for col in MOVE_ORDER if playable & COLUMN_MASK[col]]
+    if not columns:
+        raise ValueError("No legal moves: the board is full")
+
+    # Take an immediate win, and block an immediate loss, without searching
+    wins = _winning_cells(current, mask) & playable
+    if wins:
+        return next(col for col in columns if wins & COLUMN_MASK[col])
+    blocks = _winning_cells(current ^ mask, mask) & playable
+    if blocks:
+        return next(col for col in columns if blocks & COLUMN_MASK[col])
+
+    table: Dict[int, tuple] = {}
+    choice = columns[0]
+    opponent = current ^ mask
+    for depth in range(1, min(max_depth, CELLS - moves) + 1):
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best, best_col = -WIN_SCORE - 1, columns[0]
+        # Re-search last depth's choice first: its score tightens alpha for the rest
+        order = [choice] + [col for col in columns if col != choice]
+        try:
+            for col in order:
+                score = -_negamax(opponent, mask | (mask + BOTTOM_MASK[col]), moves + 1,
+                                  depth - 1, -beta, -alpha, table, deadline)
+                if score > best:
+                    best, best_col = score, col
+                alpha = max(alpha, score)
+        except _Timeout:
+            break
+        choice = best_col
+        if abs(best) >= WIN_SCORE - CELLS:
+            # Forced result found: deeper searches won't change it
+            break
+    return choice
@@ -5,8 +5,17 @@ Falls back to SQLite if no PostgreSQL is configured (for local development).
 """
 import os
 import asyncio
+import contextlib
+import copy
 import json
-from typing import Optional, Dict, Any
+import time
+from urllib.parse import urlparse
+from typing import Optional, Dict, Any, List, Tuple
+
+from db_queries import (
+    QUERIES, STAT_COLUMNS, STALE_STATEMENT_ERRORS, LeaderboardRow, PreparedConnection
+)
+from metrics import LatencyHistogram
 
 # Try to import asyncpg for PostgreSQL
 try:
@@ -25,6 +34,85 @@ except ImportError:
     print("Warning: aiosqlite not installed. SQLite fallback disabled.")
 
 
+# Seconds between background flushes of buffered stat increments
+STAT_FLUSH_INTERVAL = 5.0
+
+# Postgres NOTIFY channel used to invalidate cached bot_config keys across bot processes
+CONFIG_NOTIFY_CHANNEL = 'bot_config_changed'
+
+# Port of Supabase's transaction-mode pooler (pgbouncer). A transaction pooler runs each
+# transaction on whichever server connection is free, so statements prepared on one are
+# missing on the next and LISTEN receives nothing. Set DATABASE_POOLER=transaction (or
+# =session) when the port doesn't tell, and DATABASE_DIRECT_URL to a direct connection
+# for the bot_config change listener.
+TRANSACTION_POOLER_PORT = 6543
+
+
+def _uses_transaction_pooler(database_url: str) -> bool:
+    configured = (os.environ.get('DATABASE_POOLER') or '').lower()
+    if configured:
+        return configured == 'transaction'
+    try:
+        return urlparse(database_url).port == TRANSACTION_POOLER_PORT
+    except ValueError:
+        return False
+
+
+def _asyncpg_url(database_url: str) -> str:
+    # DigitalOcean uses postgres:// but asyncpg needs postgresql://
+    if database_url.startswith('postgres://'):
+        return database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
+# SQLite tuning: WAL lets readers run alongside the writer, and NORMAL sync only
+# fsyncs at checkpoints instead of on every commit
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',  # ~16 MB page cache per connection
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+# Number of read-only SQLite connections
+SQLITE_READERS = 4
+
+# Maximum number of queued writes grouped into one SQLite transaction
+SQLITE_WRITE_BATCH = 256
+
+# guild_config feature names
+GIVEAWAY_FEATURE = 'giveaway'
+WELCOMER_FEATURE = 'welcomer'
+TIMECHANNEL_FEATURE = 'timechannel'
+
+
+def _split_giveaway_blob(blob: dict):
+    """{message_id: info} -> (guild_id, message_id, info) rows."""
+    for message_id, info in blob.items():
+        yield int(info.get('guild_id', 0)), int(message_id), info
+
+
+def _split_welcomer_blob(blob: dict):
+    """{guild_id: channel_id} -> (guild_id, 0, {'channel_id': ...}) rows."""
+    for guild_id, channel_id in blob.items():
+        yield int(guild_id), 0, {'channel_id': int(channel_id)}
+
+
+def _split_timechannel_blob(blob: dict):
+    """{message_id: info} -> (guild_id, message_id, info) rows, skipping old-format entries."""
+    for message_id, info in blob.items():
+        if isinstance(info, dict) and 'channel_id' in info and 'cities' in info:
+            yield int(info.get('guild_id', 0)), int(message_id), info
+
+
+# Legacy whole-feature bot_config blobs and how they split into guild_config rows
+LEGACY_CONFIG_BLOBS = {
+    'giveaway_config': (GIVEAWAY_FEATURE, _split_giveaway_blob),
+    'welcomer_config': (WELCOMER_FEATURE, _split_welcomer_blob),
+    'timechannel_config': (TIMECHANNEL_FEATURE, _split_timechannel_blob),
+}
+
+
 class Database:
     """Async database wrapper supporting PostgreSQL (production) and SQLite (development)."""
     
@@ -33,6 +121,32 @@ class Database:
         self.sqlite_conn = None
         self.is_postgres = False
         self.is_sqlite = False
+        # Postgres behind a transaction-mode pooler: no per-connection prepared statements
+        self.transaction_pooler = False
+        # Write-behind buffer for increment_stat: {(user_id, stat_name): pending delta}
+        self._pending_stats: Dict[Tuple[int, str], int] = {}
+        # Deltas currently being written by flush_stats (still merged into reads)
+        self._inflight_stats: Dict[Tuple[int, str], int] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Read-through cache of decoded bot_config values ({key: value or None})
+        self._config_cache: Dict[str, Any] = {}
+        # Bumped on every invalidation so a read racing a write never caches the old value
+        self._config_version = 0
+        self.config_cache_hits = 0
+        self.config_cache_misses = 0
+        self.config_cache_invalidations = 0
+        self._database_url: Optional[str] = None
+        self._listen_conn = None
+        self._listener_task: Optional[asyncio.Task] = None
+        # SQLite: pool of read-only connections and the queue feeding the single writer task
+        self._sqlite_readers: Optional[asyncio.Queue] = None
+        # Every reader connection, including ones checked out of the queue, so close() reaches all of them
+        self._sqlite_reader_conns: List[Any] = []
+        self._sqlite_write_queue: Optional[asyncio.Queue] = None
+        self._sqlite_writer_task: Optional[asyncio.Task] = None
+        # Latency histogram per named query (see db_queries.QUERIES)
+        self._query_latency: Dict[str, LatencyHistogram] = {}
     
     async def connect(self):
         """Connect to database. Tries PostgreSQL first, falls back to SQLite."""
@@ -41,31 +155,67 @@ class Database:
         if database_url and HAS_ASYNCPG:
             # Use PostgreSQL
             try:
-                # DigitalOcean uses postgres:// but asyncpg needs postgresql://
-                if database_url.startswith('postgres://'):
-                    database_url = database_url.replace('postgres://', 'postgresql://', 1)
+                database_url = _asyncpg_url(database_url)
+                self.transaction_pooler = _uses_transaction_pooler(database_url)
+                if self.transaction_pooler:
+                    # Nothing may be cached per server connection (see TRANSACTION_POOLER_PORT)
+                    pool_options = {'statement_cache_size': 0}
+                else:
+                    # Keeps one prepared statement per registered query on each pooled connection
+                    pool_options = {'connection_class': PreparedConnection}
                 
                 self.pool = await asyncpg.create_pool(
                     database_url,
                     min_size=1,
                     max_size=10,
-                    command_timeout=60
+                    command_timeout=60,
+                    **pool_options
                 )
                 self.is_postgres = True
-                print("✅ Connected to PostgreSQL database")
+                print(f"✅ Connected to PostgreSQL database{' (transaction pooler)' if self.transaction_pooler else ''}")
                 await self._create_tables_postgres()
+                await self._migrate_legacy_configs()
+                self._start_stat_flusher()
+                # LISTEN needs a real session: the direct URL when given, else the pool's unless it is a transaction pooler
+                direct_url = os.environ.get('DATABASE_DIRECT_URL')
+                if direct_url:
+                    self._database_url = _asyncpg_url(direct_url)
+                elif not self.transaction_pooler:
+                    self._database_url = database_url
+                if self._database_url:
+                    self._listener_task = asyncio.create_task(self._start_config_listener())
+                else:
+                    print("⚠ Transaction pooler without DATABASE_DIRECT_URL: bot_config changes can't be listened for, config cache disabled")
                 return
             except Exception as e:
                 print(f"❌ Failed to connect to PostgreSQL: {e}")
                 print("Falling back to SQLite...")
         
-        # Fall back to SQLite for local development
+        # Fall back to SQLite for local development and small single-node deployments
         if HAS_AIOSQLITE:
             db_path = os.path.join(os.path.dirname(__file__), 'bot_data.db')
-            self.sqlite_conn = await aiosqlite.connect(db_path)
+            # Single writer connection; transactions are managed explicitly by the writer task
+            self.sqlite_conn = await aiosqlite.connect(db_path, isolation_level=None)
+            for pragma in SQLITE_PRAGMAS:
+                await self.sqlite_conn.execute(pragma)
             self.is_sqlite = True
             print(f"✅ Connected to SQLite database at {db_path}")
             await self._create_tables_sqlite()
+            
+            # Separate read-only connections so reads never wait behind the writer (WAL)
+            self._sqlite_readers = asyncio.Queue()
+            for _ in range(SQLITE_READERS):
+                reader = await aiosqlite.connect(db_path, isolation_level=None)
+                for pragma in SQLITE_PRAGMAS:
+                    await reader.execute(pragma)
+                await reader.execute('PRAGMA query_only=ON')
+                self._sqlite_reader_conns.append(reader)
+                self._sqlite_readers.put_nowait(reader)
+            self._sqlite_write_queue = asyncio.Queue()
+            self._sqlite_writer_task = asyncio.create_task(self._sqlite_writer_loop())
+            
+            await self._migrate_legacy_configs()
+            self._start_stat_flusher()
         else:
             raise RuntimeError(
                 "No database available! Install either 'asyncpg' (for PostgreSQL) "
@@ -87,6 +237,11 @@ class Database:
                     wins_hangman INTEGER DEFAULT 0
                 )
             ''')
+            # One descending index per stat so leaderboard top-N and rank queries are range scans
+            for stat in STAT_COLUMNS:
+                await conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_user_stats_{stat} ON user_stats ({stat} DESC, user_id)'
+                )
             
             # Warnings table
             await conn.execute('''
@@ -112,6 +267,17 @@ class Database:
                 )
             ''')
             
+            # Per-guild config rows (entity_id is e.g. a message ID, 0 when unused)
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS guild_config (
+                    feature TEXT NOT NULL,
+                    guild_id BIGINT NOT NULL,
+                    entity_id BIGINT NOT NULL DEFAULT 0,
+                    value JSONB NOT NULL,
+                    PRIMARY KEY (feature, guild_id, entity_id)
+                )
+            ''')
+            
             print("✅ PostgreSQL tables created/verified")
     
     async def _create_tables_sqlite(self):
@@ -128,6 +294,10 @@ class Database:
                 wins_hangman INTEGER DEFAULT 0
             )
         ''')
+        for stat in STAT_COLUMNS:
+            await self.sqlite_conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_user_stats_{stat} ON user_stats ({stat} DESC, user_id)'
+            )
         
         # Warnings table
         await self.sqlite_conn.execute('''
@@ -153,244 +323,675 @@ class Database:
             )
         ''')
         
+        # Per-guild config rows (entity_id is e.g. a message ID, 0 when unused)
+        await self.sqlite_conn.execute('''
+            CREATE TABLE IF NOT EXISTS guild_config (
+                feature TEXT NOT NULL,
+                guild_id INTEGER NOT NULL,
+                entity_id INTEGER NOT NULL DEFAULT 0,
+                value TEXT NOT NULL,
+                PRIMARY KEY (feature, guild_id, entity_id)
+            )
+        ''')
+        
         await self.sqlite_conn.commit()
         print("✅ SQLite tables created/verified")
     
     async def close(self):
-        """Close database connection."""
+        """Flush buffered stats and close database connection."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush_stats()
+        if self._listener_task:
+            self._listener_task.cancel()
+            self._listener_task = None
+        if self._listen_conn is not None:
+            conn, self._listen_conn = self._listen_conn, None
+            try:
+                conn.remove_termination_listener(self._on_config_listener_terminated)
+                await conn.close()
+            except Exception:
+                pass
+        self._invalidate_config()
+        self._log_query_stats()
         if self.is_postgres and self.pool:
             await self.pool.close()
         elif self.is_sqlite and self.sqlite_conn:
+            # Let the writer finish everything already queued, then close all connections
+            if self._sqlite_writer_task:
+                await self._sqlite_write_queue.put(None)
+                await self._sqlite_writer_task
+                self._sqlite_writer_task = None
+            readers, self._sqlite_reader_conns = self._sqlite_reader_conns, []
+            for reader in readers:
+                try:
+                    await reader.close()
+                except Exception as e:
+                    print(f"⚠ Failed to close SQLite reader: {e}")
             await self.sqlite_conn.close()
+        self.is_postgres = False
+        self.is_sqlite = False
+    
+    # SQLite connection helpers
+    
+    @contextlib.asynccontextmanager
+    async def _sqlite_read(self):
+        """Borrow a read-only SQLite connection from the pool."""
+        conn = await self._sqlite_readers.get()
+        try:
+            yield conn
+        finally:
+            self._sqlite_readers.put_nowait(conn)
+    
+    async def _sqlite_write(self, op):
+        """
+        Run op(conn) on the writer connection and return its result.
+        
+        Writes are queued for the writer task, which groups everything queued into a
+        single transaction, so the call returns only once the write is committed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._sqlite_write_queue.put((op, future))
+        return await future
+    
+    async def _sqlite_writer_loop(self):
+        """Drain the write queue, committing each batch of writes as one transaction."""
+        conn = self.sqlite_conn
+        stopping = False
+        while not stopping:
+            batch = [await self._sqlite_write_queue.get()]
+            while len(batch) < SQLITE_WRITE_BATCH and not self._sqlite_write_queue.empty():
+                batch.append(self._sqlite_write_queue.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+            if not batch:
+                continue
+            
+            done = []
+            try:
+                await conn.execute('BEGIN IMMEDIATE')
+                for op, future in batch:
+                    # A savepoint per write keeps one failing write from aborting the whole batch
+                    await conn.execute('SAVEPOINT write_op')
+                    try:
+                        result = await op(conn)
+                    except Exception as e:
+                        await conn.execute('ROLLBACK TO write_op')
+                        await conn.execute('RELEASE write_op')
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                    await conn.execute('RELEASE write_op')
+                    done.append((future, result))
+                await conn.execute('COMMIT')
+            except Exception as e:
+                print(f"❌ SQLite write batch of {len(batch)} failed: {e}")
+                try:
+                    await conn.execute('ROLLBACK')
+                except Exception:
+                    pass
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for future, result in done:
+                if not future.done():
+                    future.set_result(result)
+    
+    # Named query helpers (SQL lives in db_queries.QUERIES)
+    
+    @contextlib.contextmanager
+    def _timed(self, name: str):
+        """Record the latency of one named query call."""
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            histogram = self._query_latency.get(name)
+            if histogram is None:
+                histogram = self._query_latency[name] = LatencyHistogram()
+            histogram.observe((time.perf_counter() - start) * 1000, failed)
+    
+    async def _pg(self, conn, name: str, method: str, *args):
+        """
+        Run a named query on a pooled connection through its prepared statement
+        (or unprepared, behind a transaction pooler).
+        
+        method is 'fetch', 'fetchrow', 'fetchval', 'execute' (returns the status
+        string, e.g. "DELETE 3") or 'executemany' (args is a single list of rows).
+        Rows are mapped to the query's record type when it has one.
+        """
+        query = QUERIES[name]
+        with self._timed(name):
+            if self.transaction_pooler:
+                # Unnamed statements only: a named one may be gone by the next transaction
+                result = await self._run_unprepared(conn, query.postgres, method, args)
+            else:
+                result = await self._run_named(conn, name, query.postgres, method, args)
+        if query.record is not None:
+            if method == 'fetch':
+                return [query.record.from_row(row) for row in result]
+            if method == 'fetchrow' and result is not None:
+                return query.record.from_row(result)
+        return result
+    
+    async def _run_named(self, conn, name: str, sql: str, method: str, args: tuple):
+        # Through the connection's prepared statement for the query, prepared on first use
+        statement = conn.prepared.get(name)
+        if statement is None:
+            statement = conn.prepared[name] = await conn.prepare(sql)
+        try:
+            return await self._run_prepared(statement, method, args)
+        except STALE_STATEMENT_ERRORS:
+            # Schema changed under the statement; re-prepare once (not possible mid-transaction)
+            if conn.is_in_transaction():
+                raise
+            statement = conn.prepared[name] = await conn.prepare(sql)
+            return await self._run_prepared(statement, method, args)
+    
+    @staticmethod
+    async def _run_unprepared(conn, sql: str, method: str, args: tuple):
+        if method == 'executemany':
+            return await conn.executemany(sql, args[0])
+        # Connection.execute with arguments returns the status string, like _run_prepared
+        return await getattr(conn, method)(sql, *args)
+    
+    @staticmethod
+    async def _run_prepared(statement, method: str, args: tuple):
+        if method == 'execute':
+            await statement.fetch(*args)
+            return statement.get_statusmsg()
+        if method == 'executemany':
+            return await statement.executemany(args[0])
+        return await getattr(statement, method)(*args)
+    
+    async def _sqlite_fetch(self, name: str, params: tuple = (), one: bool = False):
+        """Run a named read query on a pooled SQLite reader, mapping rows to its record type."""
+        query = QUERIES[name]
+        async with self._sqlite_read() as conn:
+            with self._timed(name):
+                async with conn.execute(query.sqlite, params) as cursor:
+                    rows = await cursor.fetchone() if one else await cursor.fetchall()
+        if query.record is None:
+            return rows
+        if one:
+            return query.record.from_row(rows) if rows is not None else None
+        return [query.record.from_row(row) for row in rows]
+    
+    async def _sqlite_exec(self, conn, name: str, params, many: bool = False):
+        """Run a named write query on the writer connection (call from inside a _sqlite_write op)."""
+        sql = QUERIES[name].sqlite
+        with self._timed(name):
+            if many:
+                return await conn.executemany(sql, params)
+            return await conn.execute(sql, params)
+    
+    def query_stats(self) -> Dict[str, dict]:
+        """Latency summary per named query, ordered by total time spent (largest first)."""
+        ordered = sorted(self._query_latency.items(), key=lambda item: item[1].total_ms, reverse=True)
+        return {name: histogram.summary() for name, histogram in ordered}
+    
+    def _log_query_stats(self, limit: int = 5):
+        stats = self.query_stats()
+        if not stats:
+            return
+        print("📊 Database time by query:")
+        for name, summary in list(stats.items())[:limit]:
+            print(
+                f"   {name}: {summary['count']} call(s), {summary['total_ms']:.1f} ms total, "
+                f"p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms"
+            )
     
     # User Stats Methods
     
     async def get_user_stats(self, user_id: int) -> Dict[str, int]:
-        """Get all stats for a user."""
+        """Get all stats for a user, including increments not yet flushed."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow(
-                    'SELECT * FROM user_stats WHERE user_id = $1',
-                    user_id
-                )
-                if row:
-                    return dict(row)
-                return {
-                    'userphone_messages': 0,
-                    'userphone_started': 0,
-                    'wins_tictactoe': 0,
-                    'wins_connectfour': 0,
-                    'wins_rps': 0,
-                    'wins_hangman': 0
-                }
+                row = await self._pg(conn, 'user_stats.get', 'fetchrow', user_id)
         else:
-            async with self.sqlite_conn.execute(
-                'SELECT * FROM user_stats WHERE user_id = ?',
-                (user_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    return {
-                        'userphone_messages': row[1],
-                        'userphone_started': row[2],
-                        'wins_tictactoe': row[3],
-                        'wins_connectfour': row[4],
-                        'wins_rps': row[5],
-                        'wins_hangman': row[6]
-                    }
-                return {
-                    'userphone_messages': 0,
-                    'userphone_started': 0,
-                    'wins_tictactoe': 0,
-                    'wins_connectfour': 0,
-                    'wins_rps': 0,
-                    'wins_hangman': 0
-                }
+            row = await self._sqlite_fetch('user_stats.get', (user_id,), one=True)
+        stats = row.stats() if row else {name: 0 for name in STAT_COLUMNS}
+        
+        # Merge in increments that are buffered or currently being flushed
+        for name in STAT_COLUMNS:
+            key = (user_id, name)
+            stats[name] += self._pending_stats.get(key, 0) + self._inflight_stats.get(key, 0)
+        return stats
     
     async def increment_stat(self, user_id: int, stat_name: str, amount: int = 1):
-        """Increment a specific stat for a user."""
-        valid_stats = [
-            'userphone_messages', 'userphone_started',
-            'wins_tictactoe', 'wins_connectfour', 'wins_rps', 'wins_hangman'
-        ]
-        if stat_name not in valid_stats:
+        """
+        Increment a specific stat for a user.
+        
+        The increment is buffered in memory and written in bulk by flush_stats(),
+        which runs every STAT_FLUSH_INTERVAL seconds and on close().
+        """
+        if stat_name not in STAT_COLUMNS:
             raise ValueError(f"Invalid stat name: {stat_name}")
         
-        if self.is_postgres:
-            async with self.pool.acquire() as conn:
-                await conn.execute(f'''
-                    INSERT INTO user_stats (user_id, {stat_name})
-                    VALUES ($1, $2)
-                    ON CONFLICT (user_id)
-                    DO UPDATE SET {stat_name} = user_stats.{stat_name} + $2
-                ''', user_id, amount)
-        else:
-            await self.sqlite_conn.execute(f'''
-                INSERT INTO user_stats (user_id, {stat_name})
-                VALUES (?, ?)
-                ON CONFLICT(user_id)
-                DO UPDATE SET {stat_name} = {stat_name} + ?
-            ''', (user_id, amount, amount))
-            await self.sqlite_conn.commit()
+        key = (user_id, stat_name)
+        self._pending_stats[key] = self._pending_stats.get(key, 0) + amount
+    
+    async def flush_stats(self):
+        """Write all buffered stat increments to the database in a single batch."""
+        async with self._flush_lock:
+            if not self._pending_stats or not (self.is_postgres or self.is_sqlite):
+                return
+            
+            pending, self._pending_stats = self._pending_stats, {}
+            self._inflight_stats = pending
+            
+            # Fold the per-stat deltas into one row per user
+            rows: Dict[int, list] = {}
+            for (user_id, stat_name), delta in pending.items():
+                row = rows.setdefault(user_id, [0] * len(STAT_COLUMNS))
+                row[STAT_COLUMNS.index(stat_name)] += delta
+            
+            try:
+                if self.is_postgres:
+                    # Single multi-row upsert: each column is sent as an array and unnested
+                    columns = [list(rows.keys())] + [list(col) for col in zip(*rows.values())]
+                    async with self.pool.acquire() as conn:
+                        await self._pg(conn, 'user_stats.add', 'execute', *columns)
+                        # Committed: the rows now hold these deltas, so stop merging them into reads
+                        # right away, not after releasing the connection yields to other tasks
+                        self._inflight_stats = {}
+                else:
+                    # All rows go through the writer task as one write (one transaction)
+                    params = [(user_id, *deltas) for user_id, deltas in rows.items()]
+                    await self._sqlite_write(
+                        lambda conn: self._sqlite_exec(conn, 'user_stats.add', params, many=True)
+                    )
+                    self._inflight_stats = {}
+            except Exception as e:
+                # Put the deltas back so the next flush retries them
+                print(f"❌ Failed to flush {len(pending)} buffered stat(s): {e}")
+                for key, delta in pending.items():
+                    self._pending_stats[key] = self._pending_stats.get(key, 0) + delta
+            finally:
+                self._inflight_stats = {}
+    
+    def _start_stat_flusher(self):
+        """Start the background task that periodically flushes buffered stats."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._stat_flush_loop())
+    
+    async def _stat_flush_loop(self):
+        while True:
+            await asyncio.sleep(STAT_FLUSH_INTERVAL)
+            await self.flush_stats()
     
     async def get_all_user_stats(self) -> Dict[int, Dict[str, int]]:
-        """Get stats for all users (for migration purposes)."""
-        result = {}
+        """Get stats for all users (for migration purposes), including unflushed increments."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch('SELECT * FROM user_stats')
-                for row in rows:
-                    result[row['user_id']] = dict(row)
+                rows = await self._pg(conn, 'user_stats.all', 'fetch')
         else:
-            async with self.sqlite_conn.execute('SELECT * FROM user_stats') as cursor:
-                async for row in cursor:
-                    result[row[0]] = {
-                        'userphone_messages': row[1],
-                        'userphone_started': row[2],
-                        'wins_tictactoe': row[3],
-                        'wins_connectfour': row[4],
-                        'wins_rps': row[5],
-                        'wins_hangman': row[6]
-                    }
+            rows = await self._sqlite_fetch('user_stats.all')
+        result = {row.user_id: row.stats() for row in rows}
+        
+        for buffer in (self._pending_stats, self._inflight_stats):
+            for (user_id, stat_name), delta in buffer.items():
+                stats = result.setdefault(user_id, {name: 0 for name in STAT_COLUMNS})
+                stats[stat_name] = stats.get(stat_name, 0) + delta
         return result
     
+    # Leaderboard Methods
+    
+    async def get_leaderboard(self, stat_name: str, limit: int = 10, offset: int = 0,
+                              user_ids: Optional[List[int]] = None) -> List[LeaderboardRow]:
+        """
+        Get users ranked by one stat (highest first, ties by user ID), skipping zero values.
+        
+        user_ids restricts the ranking to those users (e.g. a guild's members).
+        """
+        return await self._leaderboard_query('top', stat_name, user_ids, limit, offset)
+    
+    async def count_ranked(self, stat_name: str, user_ids: Optional[List[int]] = None) -> int:
+        """Count users with a non-zero value for a stat (optionally among user_ids)."""
+        return await self._leaderboard_query('count', stat_name, user_ids)
+    
+    async def get_stat_rank(self, stat_name: str, user_id: int,
+                            user_ids: Optional[List[int]] = None) -> Tuple[int, Optional[int]]:
+        """Get (value, 1-based rank) of a user for a stat; rank is None when the value is zero."""
+        row = await self._leaderboard_query('rank', stat_name, user_ids, user_id)
+        return (row[0], row[1]) if row else (0, None)
+    
+    async def _leaderboard_query(self, kind: str, stat_name: str, user_ids: Optional[List[int]], *args):
+        if stat_name not in STAT_COLUMNS:
+            raise ValueError(f"Invalid stat name: {stat_name}")
+        scoped = user_ids is not None
+        name = f"leaderboard.{kind}{'_in' if scoped else ''}.{stat_name}"
+        method = {'top': 'fetch', 'count': 'fetchval', 'rank': 'fetchrow'}[kind]
+        if self.is_postgres:
+            if scoped:
+                args += (list(user_ids),)
+            async with self.pool.acquire() as conn:
+                return await self._pg(conn, name, method, *args)
+        if scoped:
+            # SQLite has no array parameters, so the member IDs go in as one JSON array
+            args += (json.dumps(list(user_ids)),)
+        rows = await self._sqlite_fetch(name, args, one=(method != 'fetch'))
+        if method == 'fetchval':
+            return rows[0] if rows else 0
+        return rows
+    
     # Warning Methods
     
     async def add_warning(self, guild_id: int, user_id: int, moderator_id: int, reason: str) -> int:
         """Add a warning and return the warning ID."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow('''
-                    INSERT INTO warnings (guild_id, user_id, moderator_id, reason)
-                    VALUES ($1, $2, $3, $4)
-                    RETURNING id
-                ''', guild_id, user_id, moderator_id, reason)
-                return row['id']
+                return await self._pg(conn, 'warnings.add', 'fetchval', guild_id, user_id, moderator_id, reason)
         else:
-            cursor = await self.sqlite_conn.execute('''
-                INSERT INTO warnings (guild_id, user_id, moderator_id, reason)
-                VALUES (?, ?, ?, ?)
-            ''', (guild_id, user_id, moderator_id, reason))
-            await self.sqlite_conn.commit()
-            return cursor.lastrowid
+            async def _insert(conn):
+                cursor = await self._sqlite_exec(conn, 'warnings.add', (guild_id, user_id, moderator_id, reason))
+                return cursor.lastrowid
+            return await self._sqlite_write(_insert)
     
     async def get_warnings(self, guild_id: int, user_id: int) -> list:
-        """Get all warnings for a user in a guild."""
+        """Get all warnings for a user in a guild (newest first) as WarningRow records."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch('''
-                    SELECT id, moderator_id, reason, timestamp
-                    FROM warnings
-                    WHERE guild_id = $1 AND user_id = $2
-                    ORDER BY timestamp DESC
-                ''', guild_id, user_id)
-                return [dict(row) for row in rows]
+                return await self._pg(conn, 'warnings.list', 'fetch', guild_id, user_id)
         else:
-            async with self.sqlite_conn.execute('''
-                SELECT id, moderator_id, reason, timestamp
-                FROM warnings
-                WHERE guild_id = ? AND user_id = ?
-                ORDER BY timestamp DESC
-            ''', (guild_id, user_id)) as cursor:
-                rows = await cursor.fetchall()
-                return [
-                    {'id': row[0], 'moderator_id': row[1], 'reason': row[2], 'timestamp': row[3]}
-                    for row in rows
-                ]
+            return await self._sqlite_fetch('warnings.list', (guild_id, user_id))
     
     async def remove_warning(self, warning_id: int, guild_id: int) -> bool:
         """Remove a specific warning. Returns True if found and removed."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                result = await conn.execute('''
-                    DELETE FROM warnings
-                    WHERE id = $1 AND guild_id = $2
-                ''', warning_id, guild_id)
+                result = await self._pg(conn, 'warnings.remove', 'execute', warning_id, guild_id)
                 return result != 'DELETE 0'
         else:
-            await self.sqlite_conn.execute('''
-                DELETE FROM warnings
-                WHERE id = ? AND guild_id = ?
-            ''', (warning_id, guild_id))
-            await self.sqlite_conn.commit()
-            return self.sqlite_conn.total_changes > 0
+            async def _delete(conn):
+                cursor = await self._sqlite_exec(conn, 'warnings.remove', (warning_id, guild_id))
+                return cursor.rowcount > 0
+            return await self._sqlite_write(_delete)
     
     async def clear_warnings(self, guild_id: int, user_id: int) -> int:
         """Clear all warnings for a user. Returns count of warnings removed."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                result = await conn.execute('''
-                    DELETE FROM warnings
-                    WHERE guild_id = $1 AND user_id = $2
-                ''', guild_id, user_id)
+                result = await self._pg(conn, 'warnings.clear', 'execute', guild_id, user_id)
                 # Extract number from "DELETE 5" string
                 return int(result.split()[-1])
         else:
-            await self.sqlite_conn.execute('''
-                DELETE FROM warnings
-                WHERE guild_id = ? AND user_id = ?
-            ''', (guild_id, user_id))
-            await self.sqlite_conn.commit()
-            return self.sqlite_conn.total_changes
+            async def _delete(conn):
+                cursor = await self._sqlite_exec(conn, 'warnings.clear', (guild_id, user_id))
+                return cursor.rowcount
+            return await self._sqlite_write(_delete)
+    
+    # Bulk Import Methods (used by migrate_to_database.py)
+    
+    async def import_user_stats(self, rows: List[tuple], checkpoint: Optional[Tuple[str, Any]] = None):
+        """
+        Add (user_id, *deltas in STAT_COLUMNS order) rows in bulk; user IDs must be unique within rows.
+        
+        On Postgres the rows are COPYed into a temp table and merged with one upsert. If
+        checkpoint is a (key, value) pair, that bot_config entry is written in the same
+        transaction, so saved progress always matches what was imported.
+        """
+        if self.is_postgres:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute('''
+                        CREATE TEMP TABLE IF NOT EXISTS user_stats_import
+                        (LIKE user_stats) ON COMMIT DELETE ROWS
+                    ''')
+                    with self._timed('user_stats.copy_import'):
+                        await conn.copy_records_to_table(
+                            'user_stats_import', records=rows, columns=('user_id',) + STAT_COLUMNS
+                        )
+                    await self._pg(conn, 'user_stats.merge_import', 'execute')
+                    if checkpoint:
+                        await self._pg_set_config(conn, *checkpoint)
+        else:
+            async def _import(conn):
+                await self._sqlite_exec(conn, 'user_stats.add', rows, many=True)
+                if checkpoint:
+                    await self._sqlite_exec(conn, 'bot_config.set', (checkpoint[0], json.dumps(checkpoint[1])))
+            await self._sqlite_write(_import)
+        if checkpoint:
+            self._invalidate_config(checkpoint[0])
+    
+    async def import_warnings(self, rows: List[tuple], checkpoint: Optional[Tuple[str, Any]] = None):
+        """
+        Insert (guild_id, user_id, moderator_id, reason) warning rows in bulk (COPY on Postgres).
+        
+        checkpoint works as in import_user_stats().
+        """
+        if self.is_postgres:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    with self._timed('warnings.copy_import'):
+                        await conn.copy_records_to_table(
+                            'warnings', records=rows, columns=('guild_id', 'user_id', 'moderator_id', 'reason')
+                        )
+                    if checkpoint:
+                        await self._pg_set_config(conn, *checkpoint)
+        else:
+            async def _import(conn):
+                await self._sqlite_exec(conn, 'warnings.add', rows, many=True)
+                if checkpoint:
+                    await self._sqlite_exec(conn, 'bot_config.set', (checkpoint[0], json.dumps(checkpoint[1])))
+            await self._sqlite_write(_import)
+        if checkpoint:
+            self._invalidate_config(checkpoint[0])
     
     # Config Methods (for giveaway, timechannel, welcomer configs)
     
     async def get_config(self, key: str) -> Optional[dict]:
-        """Get a config value by key."""
+        """Get a config value by key (served from the in-process cache when possible)."""
+        use_cache = self._config_cache_usable()
+        if use_cache and key in self._config_cache:
+            self.config_cache_hits += 1
+            return copy.deepcopy(self._config_cache[key])
+        
+        self.config_cache_misses += 1
+        version = self._config_version
+        value = await self._fetch_config(key)
+        # Only cache if no invalidation happened while the query was in flight
+        if use_cache and version == self._config_version:
+            self._config_cache[key] = value
+        # Callers mutate the returned dicts, so never hand out the cached object
+        return copy.deepcopy(value)
+    
+    async def _fetch_config(self, key: str) -> Optional[dict]:
+        """Read and decode a config value straight from the database."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                row = await conn.fetchrow(
-                    'SELECT value FROM bot_config WHERE key = $1',
-                    key
-                )
-                if not row:
-                    return None
-                
-                # Handle both dict (new format) and string (old format with double JSON encoding)
-                value = row['value']
-                if isinstance(value, str):
-                    # Old format: was stored as json.dumps(dict), need to parse it
-                    return json.loads(value)
-                else:
-                    # New format: JSONB already returns a dict
-                    return value
+                value = await self._pg(conn, 'bot_config.get', 'fetchval', key)
         else:
-            async with self.sqlite_conn.execute(
-                'SELECT value FROM bot_config WHERE key = ?',
-                (key,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                return json.loads(row[0]) if row else None
+            row = await self._sqlite_fetch('bot_config.get', (key,), one=True)
+            value = row[0] if row else None
+        # Postgres JSONB arrives as a JSON string, as does the old double-encoded format
+        return json.loads(value) if isinstance(value, str) else value
     
     async def set_config(self, key: str, value: dict):
         """Set a config value."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                # For JSONB columns, asyncpg needs the value as a JSON string
-                import json as json_module
-                await conn.execute('''
-                    INSERT INTO bot_config (key, value)
-                    VALUES ($1, $2::jsonb)
-                    ON CONFLICT (key)
-                    DO UPDATE SET value = $2::jsonb
-                ''', key, json_module.dumps(value))
+                async with conn.transaction():
+                    await self._pg_set_config(conn, key, value)
         else:
-            await self.sqlite_conn.execute('''
-                INSERT INTO bot_config (key, value)
-                VALUES (?, ?)
-                ON CONFLICT(key)
-                DO UPDATE SET value = ?
-            ''', (key, json.dumps(value), json.dumps(value)))
-            await self.sqlite_conn.commit()
+            await self._sqlite_write(
+                lambda conn: self._sqlite_exec(conn, 'bot_config.set', (key, json.dumps(value)))
+            )
+        self._invalidate_config(key)
+    
+    async def _pg_set_config(self, conn, key: str, value):
+        """Write a config value and notify other processes (call inside a transaction)."""
+        # NOTIFY is delivered on commit, so other processes never see it before the new value
+        await self._pg(conn, 'bot_config.set', 'execute', key, json.dumps(value))
+        await self._pg(conn, 'bot_config.notify', 'execute', CONFIG_NOTIFY_CHANNEL, key)
     
     async def delete_config(self, key: str):
         """Delete a config key."""
         if self.is_postgres:
             async with self.pool.acquire() as conn:
-                await conn.execute('DELETE FROM bot_config WHERE key = $1', key)
+                async with conn.transaction():
+                    await self._pg(conn, 'bot_config.delete', 'execute', key)
+                    await self._pg(conn, 'bot_config.notify', 'execute', CONFIG_NOTIFY_CHANNEL, key)
+        else:
+            await self._sqlite_write(lambda conn: self._sqlite_exec(conn, 'bot_config.delete', (key,)))
+        self._invalidate_config(key)
+    
+    # Per-guild Config Methods (one row per guild/entity instead of one blob per feature)
+    
+    async def get_guild_config(self, feature: str, guild_id: int, entity_id: int = 0) -> Optional[dict]:
+        """Get the config row for one guild (and optional entity, e.g. a message ID)."""
+        if self.is_postgres:
+            async with self.pool.acquire() as conn:
+                value = await self._pg(conn, 'guild_config.get', 'fetchval', feature, guild_id, entity_id)
+        else:
+            row = await self._sqlite_fetch('guild_config.get', (feature, guild_id, entity_id), one=True)
+            value = row[0] if row else None
+        return json.loads(value) if isinstance(value, str) else value
+    
+    async def get_guild_configs(self, feature: str, guild_id: Optional[int] = None) -> Dict[Tuple[int, int], dict]:
+        """Get all config rows for a feature (optionally one guild) as {(guild_id, entity_id): value}."""
+        if guild_id is None:
+            name, args = 'guild_config.list', (feature,)
+        else:
+            name, args = 'guild_config.list_guild', (feature, guild_id)
+        if self.is_postgres:
+            async with self.pool.acquire() as conn:
+                rows = await self._pg(conn, name, 'fetch', *args)
         else:
-            await self.sqlite_conn.execute('DELETE FROM bot_config WHERE key = ?', (key,))
-            await self.sqlite_conn.commit()
+            rows = await self._sqlite_fetch(name, args)
+        return {
+            (row.guild_id, row.entity_id): json.loads(row.value) if isinstance(row.value, str) else row.value
+            for row in rows
+        }
+    
+    async def put_guild_config(self, feature: str, guild_id: int, value: dict, entity_id: int = 0):
+        """Insert or replace the config row for one guild/entity."""
+        await self.put_guild_configs(feature, [(guild_id, entity_id, value)])
+    
+    async def put_guild_configs(self, feature: str, rows: list):
+        """Insert or replace several (guild_id, entity_id, value) rows in one transaction."""
+        if not rows:
+            return
+        params = [(feature, g, e, json.dumps(v)) for g, e, v in rows]
+        if self.is_postgres:
+            async with self.pool.acquire() as conn:
+                await self._pg(conn, 'guild_config.put', 'executemany', params)
+        else:
+            await self._sqlite_write(
+                lambda conn: self._sqlite_exec(conn, 'guild_config.put', params, many=True)
+            )
+    
+    async def delete_guild_config(self, feature: str, guild_id: int, entity_id: int = 0) -> bool:
+        """Delete the config row for one guild/entity. Returns True if a row was removed."""
+        if self.is_postgres:
+            async with self.pool.acquire() as conn:
+                result = await self._pg(conn, 'guild_config.delete', 'execute', feature, guild_id, entity_id)
+                return result != 'DELETE 0'
+        else:
+            async def _delete(conn):
+                cursor = await self._sqlite_exec(conn, 'guild_config.delete', (feature, guild_id, entity_id))
+                return cursor.rowcount > 0
+            return await self._sqlite_write(_delete)
+    
+    async def import_legacy_config(self, key: str, blob: dict) -> int:
+        """Split a legacy whole-feature config blob into guild_config rows. Returns the row count."""
+        feature, split = LEGACY_CONFIG_BLOBS[key]
+        rows = list(split(blob or {}))
+        await self.put_guild_configs(feature, rows)
+        return len(rows)
+    
+    async def _migrate_legacy_configs(self):
+        """One-shot migration of the bot_config blobs listed in LEGACY_CONFIG_BLOBS to guild_config rows."""
+        for key, (feature, split) in LEGACY_CONFIG_BLOBS.items():
+            blob = await self._fetch_config(key)
+            if blob is None:
+                continue
+            rows = [(feature, g, e, json.dumps(v)) for g, e, v in split(blob)]
+            # Rows are written and the blob deleted atomically, so the migration runs exactly once
+            if self.is_postgres:
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        await self._pg(conn, 'guild_config.insert_missing', 'executemany', rows)
+                        await self._pg(conn, 'bot_config.delete', 'execute', key)
+                        await self._pg(conn, 'bot_config.notify', 'execute', CONFIG_NOTIFY_CHANNEL, key)
+            else:
+                async def _migrate(conn):
+                    await self._sqlite_exec(conn, 'guild_config.insert_missing', rows, many=True)
+                    await self._sqlite_exec(conn, 'bot_config.delete', (key,))
+                await self._sqlite_write(_migrate)
+            self._invalidate_config(key)
+            print(f"✅ Migrated {key} to {len(rows)} guild_config row(s)")
+    
+    def config_cache_stats(self) -> Dict[str, Any]:
+        """Return config cache counters (hits, misses, invalidations, size)."""
+        lookups = self.config_cache_hits + self.config_cache_misses
+        return {
+            'hits': self.config_cache_hits,
+            'misses': self.config_cache_misses,
+            'invalidations': self.config_cache_invalidations,
+            'entries': len(self._config_cache),
+            'hit_ratio': self.config_cache_hits / lookups if lookups else 0.0,
+            'enabled': self._config_cache_usable(),
+        }
+    
+    def _config_cache_usable(self) -> bool:
+        # SQLite is a local single-process file. On Postgres another bot process may write at
+        # any time, so the cache is only trusted while the NOTIFY listener is connected.
+        if self.is_sqlite:
+            return True
+        return self.is_postgres and self._listen_conn is not None
+    
+    def _invalidate_config(self, key: Optional[str] = None):
+        """Drop one cached config key, or the whole cache when key is None."""
+        self._config_version += 1
+        self.config_cache_invalidations += 1
+        if key is None:
+            self._config_cache.clear()
+        else:
+            self._config_cache.pop(key, None)
+    
+    async def _start_config_listener(self):
+        """Open a dedicated connection that LISTENs for bot_config changes from any process."""
+        delay = 1.0
+        while self.is_postgres and self._listen_conn is None:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self._database_url)
+                await conn.add_listener(CONFIG_NOTIFY_CHANNEL, self._on_config_notify)
+                conn.add_termination_listener(self._on_config_listener_terminated)
+                # Anything cached before LISTEN was active may have missed a notification
+                self._invalidate_config()
+                self._listen_conn = conn
+                print("✅ Listening for bot_config changes")
+                return
+            except Exception as e:
+                print(f"⚠ Config change listener unavailable, retrying in {delay:.0f}s: {e}")
+                if conn is not None:
+                    # Connected, but setting up LISTEN failed: don't leak a connection per retry
+                    # (and don't let closing it start a second retry loop)
+                    try:
+                        conn.remove_termination_listener(self._on_config_listener_terminated)
+                        await conn.close()
+                    except Exception:
+                        pass
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+    
+    def _on_config_notify(self, connection, pid, channel, payload):
+        self._invalidate_config(payload or None)
+    
+    def _on_config_listener_terminated(self, connection):
+        print("⚠ Lost bot_config change listener, config cache disabled until it reconnects")
+        self._listen_conn = None
+        self._invalidate_config()
+        if self.is_postgres:
+            self._listener_task = asyncio.create_task(self._start_config_listener())
 
 
 # Global database instance
@@ -0,0 +1,359 @@
+"""
+Named SQL queries and typed row records for database.py.
+
+Every query is registered once under a name with its PostgreSQL and SQLite text, so the
+SQL sent for a given name never changes and can be prepared once per pooled connection.
+"""
+from typing import Dict, Optional, Tuple
+
+try:
+    import asyncpg
+    HAS_ASYNCPG = True
+except ImportError:
+    HAS_ASYNCPG = False
+
+
+# Stat columns in user_stats, in table order
+STAT_COLUMNS = (
+    'userphone_messages', 'userphone_started',
+    'wins_tictactoe', 'wins_connectfour', 'wins_rps', 'wins_hangman'
+)
+
+
+# Row records
+
+class Row:
+    """Compact row record. Fields are __slots__; row['field'] and row.get() also work."""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from an asyncpg Record or SQLite tuple selected in __slots__ order."""
+        return cls(*row)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class UserStatsRow(Row):
+    __slots__ = ('user_id',) + STAT_COLUMNS
+
+    def stats(self) -> Dict[str, int]:
+        return {name: getattr(self, name) or 0 for name in STAT_COLUMNS}
+
+
+class WarningRow(Row):
+    __slots__ = ('id', 'moderator_id', 'reason', 'timestamp')
+
+
+class GuildConfigRow(Row):
+    __slots__ = ('guild_id', 'entity_id', 'value')
+
+
+# Query registry
+
+class Query:
+    """A named query with its PostgreSQL and SQLite text and optional row record type."""
+    __slots__ = ('name', 'postgres', 'sqlite', 'record')
+
+    def __init__(self, name: str, postgres: Optional[str], sqlite: Optional[str], record=None):
+        self.name = name
+        self.postgres = postgres
+        self.sqlite = sqlite
+        self.record = record
+
+
+QUERIES: Dict[str, Query] = {}
+
+
+def register(name: str, postgres: Optional[str], sqlite: Optional[str], record=None) -> Query:
+    """Add a query to the registry. Names are unique."""
+    if name in QUERIES:
+        raise ValueError(f"Query already registered: {name}")
+    query = QUERIES[name] = Query(name, postgres, sqlite, record)
+    return query
+
+
+_STAT_SELECT = ', '.join(('user_id',) + STAT_COLUMNS)
+
+register(
+    'user_stats.get',
+    f'SELECT {_STAT_SELECT} FROM user_stats WHERE user_id = $1',
+    f'SELECT {_STAT_SELECT} FROM user_stats WHERE user_id = ?',
+    UserStatsRow,
+)
+register(
+    'user_stats.all',
+    f'SELECT {_STAT_SELECT} FROM user_stats',
+    f'SELECT {_STAT_SELECT} FROM user_stats',
+    UserStatsRow,
+)
+register(
+    'user_stats.add',
+    # Postgres: one multi-row upsert, each column sent as an array and unnested
+    '''
+    INSERT INTO user_stats (
+        user_id, userphone_messages, userphone_started,
+        wins_tictactoe, wins_connectfour, wins_rps, wins_hangman
+    )
+    SELECT * FROM unnest(
+        $1::bigint[], $2::int[], $3::int[],
+        $4::int[], $5::int[], $6::int[], $7::int[]
+    )
+    ON CONFLICT (user_id) DO UPDATE SET
+        userphone_messages = user_stats.userphone_messages + EXCLUDED.userphone_messages,
+        userphone_started = user_stats.userphone_started + EXCLUDED.userphone_started,
+        wins_tictactoe = user_stats.wins_tictactoe + EXCLUDED.wins_tictactoe,
+        wins_connectfour = user_stats.wins_connectfour + EXCLUDED.wins_connectfour,
+        wins_rps = user_stats.wins_rps + EXCLUDED.wins_rps,
+        wins_hangman = user_stats.wins_hangman + EXCLUDED.wins_hangman
+    ''',
+    '''
+    INSERT INTO user_stats (
+        user_id, userphone_messages, userphone_started,
+        wins_tictactoe, wins_connectfour, wins_rps, wins_hangman
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        userphone_messages = userphone_messages + excluded.userphone_messages,
+        userphone_started = userphone_started + excluded.userphone_started,
+        wins_tictactoe = wins_tictactoe + excluded.wins_tictactoe,
+        wins_connectfour = wins_connectfour + excluded.wins_connectfour,
+        wins_rps = wins_rps + excluded.wins_rps,
+        wins_hangman = wins_hangman + excluded.wins_hangman
+    ''',
+)
+register(
+    'user_stats.merge_import',
+    # Merges the per-connection temp table filled by COPY in Database.import_user_stats()
+    '''
+    INSERT INTO user_stats
+    SELECT * FROM user_stats_import
+    ON CONFLICT (user_id) DO UPDATE SET
+        userphone_messages = user_stats.userphone_messages + EXCLUDED.userphone_messages,
+        userphone_started = user_stats.userphone_started + EXCLUDED.userphone_started,
+        wins_tictactoe = user_stats.wins_tictactoe + EXCLUDED.wins_tictactoe,
+        wins_connectfour = user_stats.wins_connectfour + EXCLUDED.wins_connectfour,
+        wins_rps = user_stats.wins_rps + EXCLUDED.wins_rps,
+        wins_hangman = user_stats.wins_hangman + EXCLUDED.wins_hangman
+    ''',
+    None,
+)
+
+register(
+    'warnings.add',
+    '''
+    INSERT INTO warnings (guild_id, user_id, moderator_id, reason)
+    VALUES ($1, $2, $3, $4)
+    RETURNING id
+    ''',
+    '''
+    INSERT INTO warnings (guild_id, user_id, moderator_id, reason)
+    VALUES (?, ?, ?, ?)
+    ''',
+)
+register(
+    'warnings.list',
+    '''
+    SELECT id, moderator_id, reason, timestamp
+    FROM warnings
+    WHERE guild_id = $1 AND user_id = $2
+    ORDER BY timestamp DESC
+    ''',
+    '''
+    SELECT id, moderator_id, reason, timestamp
+    FROM warnings
+    WHERE guild_id = ? AND user_id = ?
+    ORDER BY timestamp DESC
+    ''',
+    WarningRow,
+)
+register(
+    'warnings.remove',
+    'DELETE FROM warnings WHERE id = $1 AND guild_id = $2',
+    'DELETE FROM warnings WHERE id = ? AND guild_id = ?',
+)
+register(
+    'warnings.clear',
+    'DELETE FROM warnings WHERE guild_id = $1 AND user_id = $2',
+    'DELETE FROM warnings WHERE guild_id = ? AND user_id = ?',
+)
+
+register(
+    'bot_config.get',
+    'SELECT value FROM bot_config WHERE key = $1',
+    'SELECT value FROM bot_config WHERE key = ?',
+)
+register(
+    'bot_config.set',
+    # For JSONB columns, asyncpg needs the value as a JSON string
+    '''
+    INSERT INTO bot_config (key, value)
+    VALUES ($1, $2::jsonb)
+    ON CONFLICT (key)
+    DO UPDATE SET value = EXCLUDED.value
+    ''',
+    '''
+    INSERT INTO bot_config (key, value)
+    VALUES (?, ?)
+    ON CONFLICT(key)
+    DO UPDATE SET value = excluded.value
+    ''',
+)
+register(
+    'bot_config.delete',
+    'DELETE FROM bot_config WHERE key = $1',
+    'DELETE FROM bot_config WHERE key = ?',
+)
+register(
+    'bot_config.notify',
+    'SELECT pg_notify($1, $2)',
+    None,
+)
+
+register(
+    'guild_config.get',
+    '''
+    SELECT value FROM guild_config
+    WHERE feature = $1 AND guild_id = $2 AND entity_id = $3
+    ''',
+    '''
+    SELECT value FROM guild_config
+    WHERE feature = ? AND guild_id = ? AND entity_id = ?
+    ''',
+)
+register(
+    'guild_config.list',
+    'SELECT guild_id, entity_id, value FROM guild_config WHERE feature = $1',
+    'SELECT guild_id, entity_id, value FROM guild_config WHERE feature = ?',
+    GuildConfigRow,
+)
+register(
+    'guild_config.list_guild',
+    'SELECT guild_id, entity_id, value FROM guild_config WHERE feature = $1 AND guild_id = $2',
+    'SELECT guild_id, entity_id, value FROM guild_config WHERE feature = ? AND guild_id = ?',
+    GuildConfigRow,
+)
+register(
+    'guild_config.put',
+    '''
+    INSERT INTO guild_config (feature, guild_id, entity_id, value)
+    VALUES ($1, $2, $3, $4::jsonb)
+    ON CONFLICT (feature, guild_id, entity_id)
+    DO UPDATE SET value = EXCLUDED.value
+    ''',
+    '''
+    INSERT INTO guild_config (feature, guild_id, entity_id, value)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(feature, guild_id, entity_id)
+    DO UPDATE SET value = excluded.value
+    ''',
+)
+register(
+    'guild_config.insert_missing',
+    '''
+    INSERT INTO guild_config (feature, guild_id, entity_id, value)
+    VALUES ($1, $2, $3, $4::jsonb)
+    ON CONFLICT (feature, guild_id, entity_id) DO NOTHING
+    ''',
+    '''
+    INSERT INTO guild_config (feature, guild_id, entity_id, value)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(feature, guild_id, entity_id) DO NOTHING
+    ''',
+)
+register(
+    'guild_config.delete',
+    '''
+    DELETE FROM guild_config
+    WHERE feature = $1 AND guild_id = $2 AND entity_id = $3
+    ''',
+    '''
+    DELETE FROM guild_config
+    WHERE feature = ? AND guild_id = ? AND entity_id = ?
+    ''',
+)
+
+
+# Leaderboards: one set of queries per stat column. Each is served by the
+# idx_user_stats_<stat> index on (<stat> DESC, user_id). The *_in variants
+# take a list of member IDs as their last parameter (a bigint[] on Postgres,
+# a JSON array on SQLite) and restrict the ranking to those users.
+
+class LeaderboardRow(Row):
+    __slots__ = ('user_id', 'value')
+
+
+def _register_leaderboard(stat: str):
+    dialects = (
+        # (placeholder for parameter n, member filter for parameter n)
+        (lambda n: f'${n}', lambda n: f'user_id = ANY(${n}::bigint[])'),
+        (lambda n: f'?{n}', lambda n: f'user_id IN (SELECT value FROM json_each(?{n}))'),
+    )
+    texts = {}
+    for dialect, (param, members) in zip(('postgres', 'sqlite'), dialects):
+        for scoped in (False, True):
+            suffix = '_in' if scoped else ''
+            top_filter = f' AND {members(3)}' if scoped else ''
+            rank_filter = f' AND o.{members(2)}' if scoped else ''
+            count_filter = f' AND {members(1)}' if scoped else ''
+            texts.setdefault(f'top{suffix}', {})[dialect] = f'''
+    SELECT user_id, {stat} FROM user_stats
+    WHERE {stat} > 0{top_filter}
+    ORDER BY {stat} DESC, user_id
+    LIMIT {param(1)} OFFSET {param(2)}
+    '''
+            # Rank = users strictly ahead (higher value, or same value and lower ID) + 1
+            texts.setdefault(f'rank{suffix}', {})[dialect] = f'''
+    SELECT s.{stat}, CASE WHEN s.{stat} > 0 THEN
+        (SELECT COUNT(*) FROM user_stats o WHERE o.{stat} > s.{stat}{rank_filter})
+        + (SELECT COUNT(*) FROM user_stats o
+           WHERE o.{stat} = s.{stat} AND o.user_id < s.user_id{rank_filter})
+        + 1 END
+    FROM user_stats s WHERE s.user_id = {param(1)}
+    '''
+            texts.setdefault(f'count{suffix}', {})[dialect] = (
+                f'SELECT COUNT(*) FROM user_stats WHERE {stat} > 0{count_filter}'
+            )
+    for kind, text in texts.items():
+        record = LeaderboardRow if kind.startswith('top') else None
+        register(f'leaderboard.{kind}.{stat}', text['postgres'], text['sqlite'], record)
+
+
+for _stat in STAT_COLUMNS:
+    _register_leaderboard(_stat)
+
+
+# asyncpg connection with per-connection prepared statements
+
+if HAS_ASYNCPG:
+    # Raised when a prepared statement no longer matches the schema (e.g. after ALTER TABLE)
+    STALE_STATEMENT_ERRORS: Tuple[type, ...] = (
+        asyncpg.exceptions.InvalidCachedStatementError,
+        asyncpg.exceptions.OutdatedSchemaCacheError,
+    )
+
+    class PreparedConnection(asyncpg.Connection):
+        """Pool connection that keeps one prepared statement per registered query name."""
+        __slots__ = ('prepared',)
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.prepared = {}
+else:
+    STALE_STATEMENT_ERRORS = ()
+    PreparedConnection = None
@@ -0,0 +1,98 @@
+"""
+Font lookup shared by the image cogs.
+
+Font files are searched for once per process, and FreeTypeFont objects are cached by
+(face, size), so rendering never probes paths or re-parses a font file. Faces fall back
+to Pillow's built-in font (scalable on Pillow 10.1+) when none of the candidates exist.
+"""
+import functools
+import os
+import threading
+from typing import Optional, Tuple
+
+# Candidate files per face, best first
+FONT_CANDIDATES = {
+    'bold': (
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",          # Linux (Debian/Ubuntu)
+        "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf",                    # Linux (RHEL/CentOS)
+        "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",  # Linux alternative
+        "/usr/share/fonts/liberation/LiberationSans-Bold.ttf",
+        "C:/Windows/Fonts/arialbd.ttf",                                   # Windows
+        "C:/Windows/Fonts/arial.ttf",
+        "/System/Library/Fonts/Helvetica.ttc",                            # macOS
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    ),
+    'regular': (
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+        "/usr/share/fonts/liberation/LiberationSans-Regular.ttf",
+        "C:/Windows/Fonts/arial.ttf",
+        "/System/Library/Fonts/Helvetica.ttc",
+    ),
+}
+
+# FreeType faces must not be used by two threads at once, so each render thread gets its own
+_local = threading.local()
+
+
+@functools.lru_cache(maxsize=None)
+def font_path(face: str = 'bold') -> Optional[str]:
+    """First existing file for face, or None (looked up once per process)."""
+    for path in FONT_CANDIDATES[face]:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _load_font(face: str, size: int):
+    from PIL import ImageFont
+    path = font_path(face)
+    if path is not None:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError as e:
+            print(f"[fonts] Could not load {path}: {e}")
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Older Pillow: fixed-size bitmap font only
+        return ImageFont.load_default()
+
+
+def get_font(size: int, face: str = 'bold'):
+    """The font for (face, size), loaded on first use."""
+    fonts = getattr(_local, 'fonts', None)
+    if fonts is None:
+        fonts = _local.fonts = {}
+    font = fonts.get((face, size))
+    if font is None:
+        font = fonts[(face, size)] = _load_font(face, size)
+    return font
+
+
+def point_size(font, default: int) -> int:
+    """Point size of font, or default for a fixed-size bitmap font."""
+    return getattr(font, 'size', default)
+
+
+def text_bbox(text: str, font, stroke_width: int = 0) -> Tuple[int, int, int, int]:
+    """Bounding box of text drawn at (0, 0), like ImageDraw.textbbox."""
+    try:
+        return font.getbbox(text, stroke_width=stroke_width)
+    except AttributeError:
+        # Pillow < 8
+        width, height = font.getsize(text, stroke_width=stroke_width)
+        return 0, 0, width, height
+
+
+def text_size(text: str, font, stroke_width: int = 0) -> Tuple[int, int]:
+    left, top, right, bottom = text_bbox(text, font, stroke_width)
+    return right - left, bottom - top
+
+
+def warm_up():
+    """Resolve every face now, so the choice is logged at startup rather than on first render."""
+    for face in FONT_CANDIDATES:
+        path = font_path(face)
+        print(f"[fonts] {face}: {path or 'built-in default font'}")
@@ -6,6 +6,7 @@ import random
 import json
 import os
 from datetime import datetime, timedelta
+from database import GIVEAWAY_FEATURE
 
 
 class GiveawayCog(commands.Cog):
@@ -98,7 +99,7 @@ class GiveawayCog(commands.Cog):
             'end_time': end_time.isoformat(),
             'ended': False
         }
-        await self.save_config()
+        await self.save_giveaway(giveaway_message.id)
         
         # Acknowledge the interaction (required but silent)
         try:
@@ -158,22 +159,20 @@ class GiveawayCog(commands.Cog):
             channel = self.bot.get_channel(giveaway_info['channel_id'])
             if not channel:
                 print(f"[giveaway] Channel {giveaway_info['channel_id']} not found for giveaway {message_id}")
-                del self.active_giveaways[message_id]
-                await self.save_config()
+                await self.remove_giveaway(message_id)
                 return
             
             try:
                 message = await channel.fetch_message(message_id)
             except discord.errors.NotFound:
                 print(f"[giveaway] Message {message_id} not found in channel {channel.name}")
-                del self.active_giveaways[message_id]
-                await self.save_config()
+                await self.remove_giveaway(message_id)
                 return
             except Exception as e:
                 print(f"[giveaway] Error fetching message {message_id}: {e}")
                 # Mark as ended even if we can't fetch the message
                 giveaway_info['ended'] = True
-                await self.save_config()
+                await self.save_giveaway(message_id)
                 return
             
             # Get users who reacted with the giveaway emoji
@@ -202,7 +201,7 @@ class GiveawayCog(commands.Cog):
                 await message.edit(embed=embed)
                 
                 giveaway_info['ended'] = True
-                await self.save_config()
+                await self.save_giveaway(message_id)
                 return
             
             # Get all users who reacted (excluding bots)
@@ -233,7 +232,7 @@ class GiveawayCog(commands.Cog):
                 await message.edit(embed=embed)
                 
                 giveaway_info['ended'] = True
-                await self.save_config()
+                await self.save_giveaway(message_id)
                 return
             
             # Pick winners
@@ -260,7 +259,7 @@ class GiveawayCog(commands.Cog):
             # Mark as ended
             giveaway_info['ended'] = True
             giveaway_info['winners'] = [w.id for w in winners]
-            await self.save_config()
+            await self.save_giveaway(message_id)
             print(f"[giveaway] ✅ Successfully ended giveaway {message_id} with {len(winners)} winner(s)")
             
         except Exception as e:
@@ -269,7 +268,7 @@ class GiveawayCog(commands.Cog):
             traceback.print_exc()
             # Mark as ended even if there was an error to prevent infinite loops
             giveaway_info['ended'] = True
-            await self.save_config()
+            await self.save_giveaway(message_id)
             print(f"[giveaway] Marked giveaway {message_id} as ended due to error")
     
     @commands.command(name='reroll')
@@ -365,7 +364,7 @@ class GiveawayCog(commands.Cog):
             
             # Update stored winners
             giveaway_info['winners'] = [w.id for w in winners]
-            await self.save_config()
+            await self.save_giveaway(message_id)
             
             # Send confirmation in command channel if different
             if ctx.channel.id != channel.id:
@@ -446,10 +445,10 @@ class GiveawayCog(commands.Cog):
             return
         
         try:
-            config = await self.db.get_config('giveaway_config')
-            if config:
-                # Convert string keys back to integers
-                self.active_giveaways = {int(k): v for k, v in config.items()}
+            rows = await self.db.get_guild_configs(GIVEAWAY_FEATURE)
+            if rows:
+                # One row per giveaway, keyed by (guild_id, message_id)
+                self.active_giveaways = {message_id: info for (_, message_id), info in rows.items()}
                 print(f"[giveaway] Loaded {len(self.active_giveaways)} giveaway(s) from database")
                 
                 # Restart timers for active giveaways
@@ -482,22 +481,40 @@ class GiveawayCog(commands.Cog):
             # Fallback to file
             self.load_config_from_file()
     
-    async def save_config(self):
-        """Save giveaway configuration to database"""
+    async def save_giveaway(self, message_id: int):
+        """Save a single giveaway's row to the database"""
+        info = self.active_giveaways.get(message_id)
+        if info is None:
+            return
+        
         # Try database first
         if self.db and (self.db.is_postgres or self.db.is_sqlite):
             try:
-                # Convert integer keys to strings for JSON storage
-                data = {str(k): v for k, v in self.active_giveaways.items()}
-                await self.db.set_config('giveaway_config', data)
-                print(f"[giveaway] Saved {len(self.active_giveaways)} giveaway(s) to database")
+                await self.db.put_guild_config(GIVEAWAY_FEATURE, info['guild_id'], info, entity_id=message_id)
+                print(f"[giveaway] Saved giveaway {message_id} to database")
                 return
             except Exception as e:
-                print(f"[giveaway] Error saving config to database: {e}, falling back to file")
+                print(f"[giveaway] Error saving giveaway {message_id} to database: {e}, falling back to file")
         
         # Fallback to file
         self.save_config_to_file()
     
+    async def remove_giveaway(self, message_id: int):
+        """Forget a giveaway and delete its row from the database"""
+        info = self.active_giveaways.pop(message_id, None)
+        if info is None:
+            return
+        
+        if self.db and (self.db.is_postgres or self.db.is_sqlite):
+            try:
+                await self.db.delete_guild_config(GIVEAWAY_FEATURE, info['guild_id'], entity_id=message_id)
+                print(f"[giveaway] Removed giveaway {message_id} from database")
+                return
+            except Exception as e:
+                print(f"[giveaway] Error removing giveaway {message_id} from database: {e}, falling back to file")
+        
+        self.save_config_to_file()
+    
     def save_config_to_file(self):
         """Save giveaway configuration to file (fallback)"""
         try:
@@ -22,12 +22,14 @@ UTILITY_COMMANDS = [
     ("<a:phone:1424654842491834449> /userphone", "Join the userphone queue or start connecting channels for anonymous cross-server chat."),
     ("<a:phone:1424654842491834449> /hangup", "End a current userphone call you started, or stop waiting in the queue."),
     ("<:profile:1424652512081739866> /myprofile", "Show your userphone stats: messages relayed and userphones started."),
+    ("<:profile:1424652512081739866> /leaderboard", "Show the top players for a stat, in this server or globally, and your rank."),
     ("<a:clock:1424650341651189772> /timezone", "Get the current time for a nations capital."),
     ("<a:clock:1424655674142363668> /timechannel", "Post a live-updating embed showing the chosen capitals local time."),
     ("<a:ping:1424656851173113937> /ping", "Show bot websocket latency and measured response RTT."),
     ("<a:quote:1424658219703205928> /quote", "Get a random inspirational quote."),
     ("<:reddit:1425747116818694164> /askreddit", "Get a random question from Reddits AskReddit subreddit."),
     ("<a:music:1425403164688908299> /play", "Play audio from a YouTube URL or search term in your current voice channel."),
+    ("<a:music:1425403164688908299> /volume", "Set the music volume for this server, in percent."),
     ("<a:wave:1425776109340987475> /welcomer", "Set a channel to receive welcome messages and images for new members."),
     ("<a:giveaway:1426084232249212969> /giveaway", "Start a giveaway in your server to give away prizes to random participants."),
 ]
@@ -0,0 +1,215 @@
+"""
+Bot-wide HTTP client and avatar cache.
+
+One pooled aiohttp session (started in setup_hook, closed on shutdown) replaces a new
+session per request, so avatar downloads reuse connections instead of paying a TCP+TLS
+handshake each time. Avatars go through a byte-bounded LRU keyed by avatar hash and
+size, optionally backed by a directory on disk (AVATAR_CACHE_DIR), so rendering the
+same user again costs no network I/O. A changed avatar has a new hash, so entries never
+go stale.
+"""
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import aiohttp
+
+# Avatar size requested by the image commands (they all draw avatars at 256px or less)
+AVATAR_SIZE = 256
+# Memory budget for cached avatar bytes (AVATAR_CACHE_MB overrides)
+AVATAR_CACHE_BYTES = int(float(os.environ.get('AVATAR_CACHE_MB', '32')) * 1024 * 1024)
+# Disk budget for the optional on-disk tier (AVATAR_CACHE_DISK_MB overrides)
+AVATAR_DISK_BYTES = int(float(os.environ.get('AVATAR_CACHE_DISK_MB', '256')) * 1024 * 1024)
+# Total and per-host connection limits for the shared session
+HTTP_POOL_LIMIT = 64
+HTTP_POOL_LIMIT_PER_HOST = 16
+# Seconds before a request is abandoned
+HTTP_TIMEOUT = 15
+
+
+class ByteLRU:
+    """LRU mapping of key -> bytes, bounded by the total size of the values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key) -> Optional[bytes]:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class DiskCache:
+    """Directory of cached files, trimmed oldest-first when it grows past max_bytes. Blocking; run in a thread."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # Touch so trimming by mtime is least-recently-used
+        os.utime(path)
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self._trim()
+
+    def _trim(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file()),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        self.size = sum(entry.stat().st_size for entry in entries)
+        # Trim to 90% so the next few writes don't trigger another scan
+        for entry in entries:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.size -= size
+            except OSError:
+                pass
+
+
+class HttpClient:
+    """Shared aiohttp session plus the avatar byte cache."""
+
+    def __init__(self, cache_bytes: int = AVATAR_CACHE_BYTES, disk_dir: Optional[str] = None,
+                 disk_bytes: int = AVATAR_DISK_BYTES):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.avatars = ByteLRU(cache_bytes)
+        self.disk = DiskCache(disk_dir, disk_bytes) if disk_dir else None
+        # Downloads in progress, so concurrent requests for one avatar share a single fetch
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+            )
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session. Must be started (setup_hook does this) before use."""
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HttpClient has not been started")
+        return self._session
+
+    async def get_bytes(self, url: str) -> bytes:
+        async with self.session.get(str(url)) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
+    async def avatar_bytes(self, asset, size: Optional[int] = AVATAR_SIZE) -> bytes:
+        """Bytes of an avatar Asset (e.g. user.display_avatar) at the given size, served from cache when possible."""
+        if size:
+            asset = asset.replace(size=size)
+        # The asset key is the avatar hash, so a new avatar gets a new key
+        key = f"{asset.key}:{size or 'default'}"
+
+        data = self.avatars.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await self._load_avatar(key, asset.url)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters (if any) receive the exception; don't warn when there are none
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _load_avatar(self, key: str, url: str) -> bytes:
+        data = None
+        if self.disk is not None:
+            data = await asyncio.to_thread(self.disk.get, key)
+        if data is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            data = await self.get_bytes(url)
+            if self.disk is not None:
+                try:
+                    await asyncio.to_thread(self.disk.put, key, data)
+                except OSError as e:
+                    print(f"[http] Could not write avatar to disk cache: {e}")
+        self.avatars.put(key, data)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            'memory_entries': len(self.avatars),
+            'memory_bytes': self.avatars.size,
+            'disk_bytes': self.disk.size if self.disk else None,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+        }
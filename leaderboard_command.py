@@ -0,0 +1,188 @@
+import time
+import discord
+from collections import OrderedDict
+from discord.ext import commands
+from discord import app_commands
+from typing import Optional
+
+# Leaderboard stats: column -> (label, emoji)
+LEADERBOARD_STATS = {
+    'userphone_messages': ("Userphone Messages", "<a:phone:1424654842491834449>"),
+    'userphone_started': ("Userphones Started", "<a:phone:1424654842491834449>"),
+    'wins_tictactoe': ("Tic-Tac-Toe Wins", "<a:tictactoe:1424942287070433342>"),
+    'wins_connectfour': ("Connect Four Wins", "<a:connectfour:1425036938984947712>"),
+    'wins_rps': ("Rock-Paper-Scissors Wins", "<a:rockpaperscissor:1425347479389470720>"),
+    'wins_hangman': ("Hangman Wins", "🎮"),
+}
+
+PAGE_SIZE = 10
+# Seconds a cached page or rank stays fresh (stats are flushed to the DB every few seconds anyway)
+CACHE_TTL = 60.0
+# Maximum number of cached pages/ranks before the least recently used are evicted
+CACHE_MAX_ENTRIES = 1024
+
+MEDALS = {1: "🥇", 2: "🥈", 3: "🥉"}
+
+
+class LeaderboardCache:
+    """Small TTL + LRU cache for leaderboard pages and ranks."""
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class LeaderboardView(discord.ui.View):
+    def __init__(self, cog: "Leaderboard", stat: str, guild: Optional[discord.Guild], user: discord.abc.User, page: int, pages: int):
+        super().__init__(timeout=180)
+        self.cog = cog
+        self.stat = stat
+        self.guild = guild
+        self.user = user
+        self.page = page
+        self.pages = pages
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_button.disabled = self.page <= 0
+        self.next_button.disabled = self.page >= self.pages - 1
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        embed, self.pages = await self.cog.build_embed(self.stat, self.guild, self.user, page)
+        self.page = min(page, max(self.pages - 1, 0))
+        self._update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+
+class Leaderboard(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.cache = LeaderboardCache()
+
+    def _member_ids(self, guild: Optional[discord.Guild]):
+        """Member IDs for a server leaderboard, or None for the global one."""
+        if guild is None:
+            return None
+        return [member.id for member in guild.members if not member.bot]
+
+    async def get_page(self, stat: str, guild: Optional[discord.Guild], page: int):
+        """Return (rows, total_ranked) for one page, served from the cache when fresh."""
+        scope = guild.id if guild else 0
+        key = ('page', stat, scope, page)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        db = self.bot.db
+        member_ids = self._member_ids(guild)
+        total = self.cache.get(('count', stat, scope))
+        if total is None:
+            total = await db.count_ranked(stat, member_ids)
+            self.cache.put(('count', stat, scope), total)
+        rows = await db.get_leaderboard(stat, PAGE_SIZE, page * PAGE_SIZE, member_ids)
+        result = ([(row.user_id, row.value) for row in rows], total)
+        self.cache.put(key, result)
+        return result
+
+    async def get_rank(self, stat: str, guild: Optional[discord.Guild], user_id: int):
+        """Return (value, rank or None) for one user, served from the cache when fresh."""
+        key = ('rank', stat, guild.id if guild else 0, user_id)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        result = await self.bot.db.get_stat_rank(stat, user_id, self._member_ids(guild))
+        self.cache.put(key, result)
+        return result
+
+    def _display_name(self, guild: Optional[discord.Guild], user_id: int) -> str:
+        member = guild.get_member(user_id) if guild else None
+        if member:
+            return member.display_name
+        user = self.bot.get_user(user_id)
+        return user.name if user else f"<@{user_id}>"
+
+    async def build_embed(self, stat: str, guild: Optional[discord.Guild], user: discord.abc.User, page: int):
+        """Build the embed for one page. Returns (embed, page_count)."""
+        label, emoji = LEADERBOARD_STATS[stat]
+        rows, total = await self.get_page(stat, guild, max(page, 0))
+        pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+
+        scope = guild.name if guild else "Global"
+        embed = discord.Embed(title=f"{emoji} {label} Leaderboard", color=discord.Color.gold())
+        embed.set_author(name=scope, icon_url=guild.icon.url if guild and guild.icon else None)
+
+        if rows:
+            lines = []
+            for position, (user_id, value) in enumerate(rows, start=page * PAGE_SIZE + 1):
+                marker = MEDALS.get(position, f"**{position}.**")
+                lines.append(f"{marker} {self._display_name(guild, user_id)} — {value}")
+            embed.description = "\n".join(lines)
+        else:
+            embed.description = "Nobody is on this leaderboard yet."
+
+        value, rank = await self.get_rank(stat, guild, user.id)
+        embed.add_field(
+            name="Your rank",
+            value=f"#{rank} of {total} ({value})" if rank else "Unranked",
+            inline=False
+        )
+        embed.set_footer(text=f"Page {min(page, pages - 1) + 1}/{pages}")
+        return embed, pages
+
+    @app_commands.command(name="leaderboard", description="Show the top players for a stat, in this server or globally.")
+    @app_commands.describe(stat="Which stat to rank by", scope="Rank this server's members or everyone")
+    @app_commands.choices(
+        stat=[app_commands.Choice(name=label, value=column) for column, (label, _) in LEADERBOARD_STATS.items()],
+        scope=[
+            app_commands.Choice(name="Server", value="server"),
+            app_commands.Choice(name="Global", value="global"),
+        ]
+    )
+    async def leaderboard(self, interaction: discord.Interaction, stat: app_commands.Choice[str], scope: Optional[app_commands.Choice[str]] = None):
+        if getattr(self.bot, 'db', None) is None:
+            await interaction.response.send_message("❌ Leaderboards are unavailable right now.", ephemeral=True)
+            return
+
+        guild = interaction.guild
+        if scope is not None and scope.value == "global":
+            guild = None
+
+        try:
+            embed, pages = await self.build_embed(stat.value, guild, interaction.user, 0)
+        except Exception as e:
+            print(f"Failed to build leaderboard: {e}")
+            await interaction.response.send_message("❌ Failed to load the leaderboard.", ephemeral=True)
+            return
+
+        view = LeaderboardView(self, stat.value, guild, interaction.user, 0, pages)
+        await interaction.response.send_message(embed=embed, view=view)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Leaderboard(bot))
@@ -0,0 +1,235 @@
+"""
+Index of local audio files for /play.
+
+The configured directories are walked in a worker thread and every audio file is kept in
+memory with its tags, so a /play lookup or an autocomplete keystroke never touches the
+disk. refresh() walks them again, reading tags only for files that are new or changed
+since the last walk; the play cog calls it every LIBRARY_POLL_SECONDS to pick up
+additions and removals.
+
+Tags (title, artist, duration) are read with mutagen when it is installed; otherwise a
+file is known by its name.
+
+Environment:
+    MUSIC_DIRS    directories to index, separated by os.pathsep (default: the working directory)
+"""
+import bisect
+import difflib
+import os
+import re
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.ogg', '.opus', '.flac', '.webm')
+# Directory names never descended into
+SKIP_DIRS = ('__pycache__', 'node_modules', 'venv', 'env')
+LIBRARY_POLL_SECONDS = 30
+# Shortest query /play matches on a name prefix (shorter ones must match a name exactly)
+MIN_PREFIX = 3
+# difflib similarity for suggestions, and the stricter one for picking a file to play
+FUZZY_CUTOFF = 0.6
+PLAY_FUZZY_CUTOFF = 0.85
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalise(text: str) -> str:
+    """Lowercase words only, so 'Artist_-_Song' and 'artist song' compare equal."""
+    return _NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+class LibraryEntry(NamedTuple):
+    path: str
+    # Path relative to its library directory, with '/' separators
+    relpath: str
+    title: str
+    artist: Optional[str]
+    duration: Optional[float]
+    # Audio format when mutagen recognised the file ('opus' can be played without re-encoding)
+    codec: Optional[str]
+    mtime: float
+    size: int
+
+    @property
+    def display(self) -> str:
+        return f"{self.artist} - {self.title}" if self.artist else self.title
+
+
+def _first_tag(tags, key: str) -> Optional[str]:
+    try:
+        values = tags.get(key)
+    except Exception:
+        return None
+    if not values:
+        return None
+    value = values[0] if isinstance(values, list) else values
+    return str(value).strip() or None
+
+
+def read_entry(path: str, relpath: str, stat: os.stat_result) -> LibraryEntry:
+    """Blocking: build path's entry, reading its tags when mutagen is available."""
+    title = artist = codec = None
+    duration = None
+    if mutagen is not None:
+        try:
+            audio = mutagen.File(path, easy=True)
+        except Exception as e:
+            print(f"[library] Could not read tags of {path!r}: {e}")
+            audio = None
+        if audio is not None:
+            if audio.tags is not None:
+                title = _first_tag(audio.tags, 'title')
+                artist = _first_tag(audio.tags, 'artist')
+            duration = getattr(audio.info, 'length', None) or None
+            # The file type, which is all the player needs to know: Opus or not
+            codec = 'opus' if type(audio).__name__ == 'OggOpus' else type(audio).__name__.lower()
+    if title is None:
+        title = os.path.splitext(os.path.basename(path))[0]
+    return LibraryEntry(path, relpath, title, artist, duration, codec, stat.st_mtime, stat.st_size)
+
+
+def _walk(directory: str) -> Iterable[Tuple[str, str, os.stat_result]]:
+    """(path, relpath, stat) of every audio file under directory."""
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith('.') and d not in SKIP_DIRS]
+        for name in files:
+            if not name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, os.path.relpath(path, directory).replace(os.sep, '/'), stat
+
+
+class _Index(NamedTuple):
+    entries: Dict[str, LibraryEntry]
+    # Normalised name -> path (the first file with that name)
+    exact: Dict[str, str]
+    # (name, path) sorted by name, for prefix search
+    names: List[Tuple[str, str]]
+    # Distinct names, for fuzzy matching
+    keys: List[str]
+    # Every path, by display name (autocomplete suggestions before anything is typed)
+    ordered: List[str]
+
+
+def _entry_names(entry: LibraryEntry) -> List[str]:
+    stem = os.path.splitext(entry.relpath)[0]
+    names = [stem, os.path.basename(stem), entry.title, entry.display]
+    if entry.artist:
+        names.append(f"{entry.title} {entry.artist}")
+    return [name for name in dict.fromkeys(normalise(name) for name in names) if name]
+
+
+def _build_index(entries: Dict[str, LibraryEntry]) -> _Index:
+    exact: Dict[str, str] = {}
+    names: List[Tuple[str, str]] = []
+    for path, entry in entries.items():
+        for name in _entry_names(entry):
+            names.append((name, path))
+            exact.setdefault(name, path)
+        # As typed in the old /play: the file name with its extension
+        exact.setdefault(normalise(entry.relpath), path)
+        exact.setdefault(normalise(os.path.basename(entry.relpath)), path)
+    names.sort()
+    keys = sorted({name for name, _ in names})
+    ordered = sorted(entries, key=lambda path: entries[path].display.lower())
+    return _Index(entries, exact, names, keys, ordered)
+
+
+def _candidates(index: _Index, q: str, limit: int, fuzzy_cutoff: float) -> Iterable[str]:
+    # Paths matching the normalised query q, best first (with repeats)
+    if q in index.exact:
+        yield index.exact[q]
+    start = bisect.bisect_left(index.names, (q, ''))
+    for name, path in index.names[start:]:
+        if not name.startswith(q):
+            break
+        yield path
+    for name, path in index.names:
+        if q in name:
+            yield path
+    for name in difflib.get_close_matches(q, index.keys, n=limit, cutoff=fuzzy_cutoff):
+        yield index.exact[name]
+
+
+class LocalLibrary:
+    """In-memory index of the audio files under a set of directories."""
+
+    def __init__(self, directories: Optional[List[str]] = None):
+        if directories is None:
+            configured = os.environ.get('MUSIC_DIRS') or ''
+            directories = [d for d in configured.split(os.pathsep) if d.strip()] or ['.']
+        self.directories = [os.path.abspath(d) for d in directories]
+        # Replaced as a whole on refresh, so lookups on the event loop always see a consistent index
+        self._index = _build_index({})
+        self.scanned_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._index.entries)
+
+    def refresh(self) -> Tuple[int, int, int]:
+        """Blocking: walk the directories again and swap in the new index. Returns (added, changed, removed)."""
+        old = self._index.entries
+        entries: Dict[str, LibraryEntry] = {}
+        added = changed = 0
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for path, relpath, stat in _walk(directory):
+                if path in entries:
+                    continue
+                previous = old.get(path)
+                if previous is not None and previous.mtime == stat.st_mtime and previous.size == stat.st_size:
+                    entries[path] = previous
+                    continue
+                entries[path] = read_entry(path, relpath, stat)
+                if previous is None:
+                    added += 1
+                else:
+                    changed += 1
+        removed = sum(1 for path in old if path not in entries)
+        if added or changed or removed or self.scanned_at is None:
+            self._index = _build_index(entries)
+        self.scanned_at = time.time()
+        return added, changed, removed
+
+    def get(self, path: str) -> Optional[LibraryEntry]:
+        return self._index.entries.get(path)
+
+    def search(self, query: str, limit: int = 25, fuzzy_cutoff: float = FUZZY_CUTOFF) -> List[LibraryEntry]:
+        """Best matches for query: exact name, then name prefix, then substring, then fuzzy."""
+        index = self._index
+        q = normalise(query)
+        if not q:
+            return [index.entries[path] for path in index.ordered[:limit]]
+        found: Dict[str, None] = {}
+        for path in _candidates(index, q, limit, fuzzy_cutoff):
+            found.setdefault(path)
+            if len(found) >= limit:
+                break
+        return [index.entries[path] for path in found]
+
+    def find(self, query: str) -> Optional[LibraryEntry]:
+        """The file /play should play for query, or None to search online instead."""
+        index = self._index
+        q = normalise(query)
+        if not q:
+            return None
+        path = index.exact.get(q)
+        if path is None and len(q) >= MIN_PREFIX:
+            start = bisect.bisect_left(index.names, (q, ''))
+            if start < len(index.names) and index.names[start][0].startswith(q):
+                path = index.names[start][1]
+        if path is None:
+            close = difflib.get_close_matches(q, index.keys, n=1, cutoff=PLAY_FUZZY_CUTOFF)
+            if close:
+                path = index.exact[close[0]]
+        return index.entries.get(path) if path is not None else None
@@ -1,13 +1,26 @@
+import time
+PROCESS_START = time.perf_counter()
+
 import discord
 from discord.ext import commands
 import asyncio
+import hashlib
 import json
 import os
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import pathlib
 import logging
+from typing import Optional
 from database import db
+from userphone import (
+    CallRegistry, MessageRelay, RelayLine,
+    DIAL_BUSY, DIAL_IN_CALL, DIAL_WAITING, HANGUP_ENDED, HANGUP_LEFT_QUEUE, HANGUP_NOT_INITIATOR,
+)
+from cluster import ClusterLink, shard_options
+import fonts
+from http_client import HttpClient
+from render import RenderService
 
 # Enable verbose logging for discord voice debugging. Keep root level at INFO to avoid too much noise.
 logging.basicConfig(level=logging.INFO)
@@ -40,12 +53,177 @@ intents.message_content = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# bot_config key holding the fingerprint of the last synced command tree (per application and scope)
+COMMAND_SYNC_KEY = 'command_tree_fingerprint'
+
+# Extensions are discovered by scanning for *_command.py modules next to this file.
+# Set DISABLED_EXTENSIONS (comma-separated module names) to skip some.
+EXTENSION_DIR = pathlib.Path(__file__).parent
+
 
-# Queue for users waiting for a call: list of (user_id, channel)
-call_queue = []
-# Active calls: {user_id: (partner_id, channel)}
-active_calls = {}
+def discover_extensions() -> list:
+    disabled = {name.strip() for name in os.environ.get('DISABLED_EXTENSIONS', '').split(',') if name.strip()}
+    return sorted(
+        path.stem for path in EXTENSION_DIR.glob('*_command.py')
+        if path.stem not in disabled
+    )
+
+
+class NightshadeBot(commands.AutoShardedBot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Per-extension startup timings: {name: {'module': s, 'setup': s, 'error': str or None}}
+        self.extension_timings = {}
+        self._cog_added_at = {}
+    
+    async def setup_hook(self):
+        # Runs once before connecting to the gateway (unlike on_ready, which repeats on reconnect)
+        started = time.perf_counter()
+        if cluster_link is not None:
+            await cluster_link.start()
+        await http_client.start()
+        fonts.warm_up()
+        db_task = asyncio.create_task(self._connect_database())
+        await self.load_extensions(discover_extensions())
+        await db_task
+        await self.sync_commands()
+        print(f"Startup setup finished in {time.perf_counter() - started:.2f}s "
+              f"({time.perf_counter() - PROCESS_START:.2f}s since process start)")
+    
+    async def _connect_database(self):
+        try:
+            await db.connect()
+        except Exception as e:
+            print(f"❌ Failed to connect to database: {e}")
+            print("Bot will continue but data will not persist!")
+    
+    async def load_extensions(self, names: list):
+        """Load extensions concurrently and print a timing table."""
+        started = time.perf_counter()
+        await asyncio.gather(*(self._load_timed(name) for name in names))
+        self._print_extension_timings(time.perf_counter() - started)
+    
+    async def _load_timed(self, name: str):
+        start = time.perf_counter()
+        error = None
+        try:
+            await self.load_extension(name)
+        except Exception as e:
+            error = str(e.__cause__ or e)
+            print(f'Could not load {name} extension: {error}')
+        end = time.perf_counter()
+        # Module execution runs up to the cog's add_cog call; the rest is the cog's setup
+        cog_added = self._cog_added_at.pop(name, end)
+        self.extension_timings[name] = {
+            'module': cog_added - start,
+            'setup': end - cog_added,
+            'error': error,
+        }
+    
+    def command_tree_fingerprint(self, guild: Optional[discord.abc.Snowflake] = None) -> str:
+        """Stable hash of the command payloads a sync would upload (global, or for one guild)."""
+        payload = []
+        for command in self.tree.get_commands(guild=guild):
+            try:
+                payload.append(command.to_dict(self.tree))
+            except TypeError:
+                # discord.py < 2.4: to_dict() takes no tree argument
+                payload.append(command.to_dict())
+        payload.sort(key=lambda data: (data.get('type', 1), data['name']))
+        encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+    
+    async def sync_commands(self):
+        """
+        Sync the slash-command tree only when it changed since the last successful sync.
+        
+        Fingerprints are stored in bot_config under COMMAND_SYNC_KEY. With DEV_GUILD_ID set,
+        commands are copied to and synced with that guild only (instant, separate limits).
+        Set FORCE_COMMAND_SYNC=1 to sync regardless. In a cluster only cluster 0 syncs.
+        """
+        if cluster_link is not None and cluster_link.cluster_id != 0:
+            return
+        dev_guild_id = os.environ.get('DEV_GUILD_ID')
+        guild = discord.Object(id=int(dev_guild_id)) if dev_guild_id else None
+        if guild is not None:
+            self.tree.copy_global_to(guild=guild)
+        scope = f"guild:{guild.id}" if guild else 'global'
+        
+        fingerprint = self.command_tree_fingerprint(guild)
+        force = os.environ.get('FORCE_COMMAND_SYNC', '').lower() in ('1', 'true', 'yes')
+        try:
+            stored = await db.get_config(COMMAND_SYNC_KEY) or {}
+        except Exception as e:
+            print(f"Could not read stored command fingerprint, syncing: {e}")
+            stored = {}
+        # The fingerprint is only valid for the application it was synced to
+        key = f"{self.application_id}:{scope}"
+        if not force and stored.get(key) == fingerprint:
+            print(f"Command tree unchanged ({scope}), skipping sync.")
+            return
+        
+        try:
+            synced = await self.tree.sync(guild=guild)
+            print(f"Synced {len(synced)} slash commands ({scope}).")
+        except Exception as e:
+            print(f"Error syncing commands: {e}")
+            return
+        stored[key] = fingerprint
+        try:
+            await db.set_config(COMMAND_SYNC_KEY, stored)
+        except Exception as e:
+            print(f"Could not store command fingerprint: {e}")
+    
+    async def add_cog(self, cog, *args, **kwargs):
+        self._cog_added_at.setdefault(type(cog).__module__, time.perf_counter())
+        await super().add_cog(cog, *args, **kwargs)
+    
+    def _print_extension_timings(self, wall: float):
+        rows = sorted(self.extension_timings.items(), key=lambda item: item[1]['module'] + item[1]['setup'], reverse=True)
+        width = max((len(name) for name, _ in rows), default=9)
+        print(f"{'extension':<{width}}  {'module ms':>9}  {'setup ms':>8}  status")
+        for name, timing in rows:
+            status = 'ok' if timing['error'] is None else 'FAILED'
+            print(f"{name:<{width}}  {timing['module'] * 1000:>9.1f}  {timing['setup'] * 1000:>8.1f}  {status}")
+        loaded = sum(1 for timing in self.extension_timings.values() if timing['error'] is None)
+        total = sum(timing['module'] + timing['setup'] for timing in self.extension_timings.values())
+        print(f"Loaded {loaded}/{len(rows)} extensions in {wall * 1000:.0f} ms wall ({total * 1000:.0f} ms summed)")
+    
+    async def close(self):
+        await relay.close()
+        if cluster_link is not None:
+            await cluster_link.close()
+        await http_client.close()
+        render.close()
+        # Flush buffered stats and release the database before disconnecting
+        try:
+            await db.close()
+        except Exception as e:
+            print(f"Failed to close database cleanly: {e}")
+        await super().close()
+
+
+# Shard IDs/count come from the cluster supervisor (cluster.py); otherwise shards are picked automatically
+bot = NightshadeBot(command_prefix='!', intents=intents, **shard_options())
+
+# Userphone waiting queue and active calls (indexed by user and by channel)
+calls = CallRegistry()
+bot.userphone = calls
+# Outbound userphone messages; set USERPHONE_WEBHOOKS=1 to relay under the sender's name and avatar
+relay = MessageRelay(use_webhooks=os.environ.get('USERPHONE_WEBHOOKS', '').lower() in ('1', 'true', 'yes'))
+bot.userphone_relay = relay
+# Connection to the cluster hub when started by cluster.py: pairs userphone calls across
+# processes and totals guild counts; None when running as a single process
+cluster_link = ClusterLink.from_env(bot, calls)
+bot.cluster = cluster_link
+
+# Pooled HTTP session and avatar cache shared by the image commands; set AVATAR_CACHE_DIR
+# to also keep downloaded avatars on disk across restarts
+http_client = HttpClient(disk_dir=os.environ.get('AVATAR_CACHE_DIR') or None)
+bot.http_client = http_client
+# Worker pool for PIL image generation (RENDER_MODE / RENDER_WORKERS / RENDER_QUEUE)
+render = RenderService()
+bot.render = render
 
 from discord import app_commands
 
@@ -71,9 +249,9 @@ async def increment_win_rps(user_id: int):
 async def increment_win_hangman(user_id: int):
     await db.increment_stat(user_id, 'wins_hangman')
 
-# Legacy compatibility: Provide save_stats that does nothing (DB auto-saves)
+# Legacy compatibility: save_stats forces buffered stat increments out to the database
 async def save_stats():
-    pass  # No-op: database saves immediately
+    await db.flush_stats()
 
 bot.save_stats = save_stats
 bot.increment_userphone_messages = increment_userphone_messages
@@ -191,33 +369,36 @@ from discord import app_commands
 async def userphone(interaction: discord.Interaction):
     user_id = interaction.user.id
     channel = interaction.channel
-    if user_id in active_calls:
+    # Queue and try to pair; in a cluster the hub does this so users on any shard can connect
+    try:
+        if cluster_link is not None:
+            status, call = await cluster_link.dial(user_id, channel)
+        else:
+            status, call = calls.dial(user_id, channel)
+    except (ConnectionError, asyncio.TimeoutError) as e:
+        print(f"Userphone dial failed: {e}")
+        await interaction.response.send_message("Userphone is unavailable right now, please try again shortly.", ephemeral=True)
+        return
+    if status == DIAL_IN_CALL:
         await interaction.response.send_message("You are already in a call. Use /hangup to disconnect.", ephemeral=True)
         return
-    if any(user_id == uid for uid, _ in call_queue):
+    if status == DIAL_WAITING:
         await interaction.response.send_message("You are already waiting for a call.", ephemeral=True)
         return
+    if status == DIAL_BUSY:
+        await interaction.response.send_message("This channel is already in a call or waiting for one.", ephemeral=True)
+        return
     # record that this user started a userphone
     try:
         await bot.increment_userphone_started(user_id)
     except Exception as e:
         print(f"Failed to save userphone start stat: {e}")
-    call_queue.append((user_id, channel))
-    # Track who initiated the call for each channel
-    if not hasattr(bot, 'initiators'):
-        bot.initiators = {}
-    bot.initiators[channel.id] = user_id
     await interaction.response.send_message("<a:phone:1424654842491834449> **Waiting for another user...**", ephemeral=False)
-    # Try to pair
-    if len(call_queue) >= 2:
-        (user1, channel1) = call_queue.pop(0)
-        (user2, channel2) = call_queue.pop(0)
-        active_calls[user1] = (user2, channel1)
-        active_calls[user2] = (user1, channel2)
+    if call:
         # Notify both users in their channels
-        for uid, ch in [(user1, channel1), (user2, channel2)]:
+        for side in call.sides:
             try:
-                await ch.send(f"<@{uid}> You are now connected! Type messages here to chat. Use /hangup to disconnect.")
+                await side.channel.send(f"<@{side.user_id}> You are now connected! Type messages here to chat. Use /hangup to disconnect.")
             except Exception:
                 pass
 
@@ -226,256 +407,117 @@ async def hangup(interaction: discord.Interaction):
     user_id = interaction.user.id
     display_name = interaction.user.display_name
     channel = interaction.channel
-    # Only allow the initiator to hang up the call (handle active calls first)
-    initiator_id = getattr(bot, 'initiators', {}).get(channel.id)
-    if user_id in active_calls:
-        if initiator_id is not None and user_id != initiator_id:
-            await interaction.response.send_message("You can't hang up the call because you weren't the one that started it.", ephemeral=True)
-            return
-        partner_id, user_channel = active_calls.pop(user_id)
-        partner_info = active_calls.pop(partner_id, None)
-        # Remove initiator tracking
-        if hasattr(bot, 'initiators') and channel.id in bot.initiators:
-            del bot.initiators[channel.id]
+    # Only the initiator may hang up a call; anyone waiting may leave the queue
+    try:
+        if cluster_link is not None:
+            status, result = await cluster_link.hang_up(user_id, channel.id)
+        else:
+            status, result = calls.hang_up(user_id, channel.id)
+    except (ConnectionError, asyncio.TimeoutError) as e:
+        print(f"Userphone hangup failed: {e}")
+        await interaction.response.send_message("Userphone is unavailable right now, please try again shortly.", ephemeral=True)
+        return
+    if status == HANGUP_NOT_INITIATOR:
+        await interaction.response.send_message("You can't hang up the call because you weren't the one that started it.", ephemeral=True)
+        return
+    if status == HANGUP_ENDED:
+        call = result
+        user_side = call.side_for_user(user_id)
+        partner_side = call.other(user_side)
+        partner_id = partner_side.user_id
         # Notify both users in their channels
         try:
-            await user_channel.send(f"**{display_name}** Call ended.")
+            await user_side.channel.send(f"**{display_name}** Call ended.")
+        except Exception:
+            pass
+        partner_channel = partner_side.channel
+        partner_name = None
+        # Channels on another cluster's shards are partial and have no cached guild
+        partner_guild = getattr(partner_channel, 'guild', None)
+        if partner_guild is not None:
+            partner_member = partner_guild.get_member(partner_id)
+            if partner_member:
+                partner_name = partner_member.display_name
+        if not partner_name:
+            partner_name = f"User {partner_id}"
+        try:
+            await partner_channel.send(f"**{partner_name}** Call ended.")
         except Exception:
             pass
-        if partner_info:
-            partner_channel = partner_info[1]
-            partner_name = None
-            if hasattr(partner_channel, 'guild'):
-                partner_member = partner_channel.guild.get_member(partner_id)
-                if partner_member:
-                    partner_name = partner_member.display_name
-            if not partner_name:
-                partner_name = f"User {partner_id}"
-            try:
-                await partner_channel.send(f"**{partner_name}** Call ended.")
-            except Exception:
-                pass
         await interaction.response.send_message("Call ended.", ephemeral=True)
         return
 
-    # If not in an active call, remove from queue if waiting
-    removed_from_queue = False
-    for i, (uid, ch) in enumerate(call_queue):
-        if uid == user_id:
-            call_queue.pop(i)
-            removed_from_queue = True
-            try:
-                await ch.send(f"**{display_name}** You have left the queue.")
-            except Exception:
-                pass
-            break
-    if removed_from_queue:
+    if status == HANGUP_LEFT_QUEUE:
+        waiting_channel = result
+        try:
+            await waiting_channel.send(f"**{display_name}** You have left the queue.")
+        except Exception:
+            pass
         # acknowledge the interaction without sending an extra ephemeral message
         await interaction.response.defer(ephemeral=True)
     else:
         await interaction.response.send_message("You are not in a call or queue.", ephemeral=True)
 
 
+async def update_presence():
+    """Show the server count (across all clusters when clustered) as a Watching activity."""
+    guild_count = len(bot.guilds)
+    if cluster_link is not None and cluster_link.guild_total is not None:
+        guild_count = cluster_link.guild_total
+    # Every guild count report is broadcast to all clusters; skip presence updates that change nothing
+    if guild_count == getattr(bot, '_presence_guild_count', None):
+        return guild_count
+    bot._presence_guild_count = guild_count
+    # Use a Watching activity so it appears like "Watching X servers"
+    activity = discord.Activity(type=discord.ActivityType.watching, name=f"{guild_count} servers ・ /help")
+    await bot.change_presence(activity=activity)
+    return guild_count
+
+
+@bot.event
+async def on_cluster_guild_total(count: int):
+    # Dispatched by ClusterLink whenever the hub reports a new guild total
+    if bot.is_ready():
+        try:
+            await update_presence()
+        except Exception as e:
+            print(f"Failed to update presence: {e}")
+
+
 @bot.event
 async def on_ready():
+    # on_ready fires again after every reconnect; extensions and the database are set up once in setup_hook
+    first_ready = not getattr(bot, '_ready_once', False)
+    bot._ready_once = True
     print(f'Logged in as {bot.user}')
+    if first_ready:
+        print(f"Ready {time.perf_counter() - PROCESS_START:.2f}s after process start")
     
-    # Connect to database
-    try:
-        await db.connect()
-    except Exception as e:
-        print(f"❌ Failed to connect to database: {e}")
-        print("Bot will continue but data will not persist!")
-    
+    if cluster_link is not None:
+        cluster_link.send('ready')
+        cluster_link.report_guilds()
     # Set an initial presence showing how many servers the bot is in
     try:
-        async def _update_presence():
-            guild_count = len(bot.guilds)
-            # Use a Watching activity so it appears like "Watching X servers"
-            activity = discord.Activity(type=discord.ActivityType.watching, name=f"{guild_count} servers ・ /help")
-            await bot.change_presence(activity=activity)
-        await _update_presence()
+        await update_presence()
     except Exception as e:
         print(f"Failed to set presence: {e}")
-    # Debug: list commands currently registered on the CommandTree
-    # Load optional extensions before syncing so their commands are registered
-    try:
-        await bot.load_extension('ping_command')
-        print('Loaded extension: ping_command')
-    except Exception as e:
-        print(f'Could not load ping_command extension: {e}')
-    try:
-        await bot.load_extension('timechannel_command')
-        print('Loaded extension: timechannel_command')
-    except Exception as e:
-        print(f'Could not load timechannel_command extension: {e}')
-    try:
-        await bot.load_extension('help_command')
-        print('Loaded extension: help_command')
-    except Exception as e:
-        print(f'Could not load help_command extension: {e}')
-    try:
-        await bot.load_extension('eightball_command')
-        print('Loaded extension: eightball_command')
-    except Exception as e:
-        print(f'Could not load eightball_command extension: {e}')
-    try:
-        await bot.load_extension('ai_command')
-        print('Loaded extension: ai_command')
-    except Exception as e:
-        print(f'Could not load ai_command extension: {e}')
-    try:
-        await bot.load_extension('quote_command')
-        print('Loaded extension: quote_command')
-    except Exception as e:
-        print(f'Could not load quote_command extension: {e}')
-    try:
-        await bot.load_extension('coin_command')
-        print('Loaded extension: coin_command')
-    except Exception as e:
-        print(f'Could not load coin_command extension: {e}')
-    try:
-        await bot.load_extension('aura_command')
-        print('Loaded extension: aura_command')
-    except Exception as e:
-        print(f'Could not load aura_command extension: {e}')
-    try:
-        await bot.load_extension('shadow_command')
-        print('Loaded extension: shadow_command')
-    except Exception as e:
-        print(f'Could not load shadow_command extension: {e}')
-    try:
-        await bot.load_extension('tictactoe_command')
-        print('Loaded extension: tictactoe_command')
-    except Exception as e:
-        print(f'Could not load tictactoe_command extension: {e}')
-    try:
-        await bot.load_extension('connectfour_command')
-        print('Loaded extension: connectfour_command')
-    except Exception as e:
-        print(f'Could not load connectfour_command extension: {e}')
-    try:
-        await bot.load_extension('myprofile_command')
-        print('Loaded extension: myprofile_command')
-    except Exception as e:
-        print(f'Could not load myprofile_command extension: {e}')
-    try:
-        await bot.load_extension('snipe_command')
-        print('Loaded extension: snipe_command')
-    except Exception as e:
-        print(f'Could not load snipe_command extension: {e}')
-    try:
-        await bot.load_extension('rockpaperscissor_command')
-        print('Loaded extension: rockpaperscissor_command')
-    except Exception as e:
-        print(f'Could not load rockpaperscissor_command extension: {e}')
-    try:
-        await bot.load_extension('play_command')
-        print('Loaded extension: play_command')
-    except Exception as e:
-        print(f'Could not load play_command extension: {e}')
-    try:
-        await bot.load_extension('askreddit_command')
-        print('Loaded extension: askreddit_command')
-    except Exception as e:
-        print(f'Could not load askreddit_command extension: {e}')
-    try:
-        await bot.load_extension('hangman_command')
-        print('Loaded extension: hangman_command')
-    except Exception as e:
-        print(f'Could not load hangman_command extension: {e}')
-    try:
-        await bot.load_extension('welcomer_command')
-        print('Loaded extension: welcomer_command')
-    except Exception as e:
-        print(f'Could not load welcomer_command extension: {e}')
-    try:
-        await bot.load_extension('giveaway_command')
-        print('Loaded extension: giveaway_command')
-    except Exception as e:
-        print(f'Could not load giveaway_command extension: {e}')
-    try:
-        await bot.load_extension('ban_command')
-        print('Loaded extension: ban_command')
-    except Exception as e:
-        print(f'Could not load ban_command extension: {e}')
-    try:
-        await bot.load_extension('kick_command')
-        print('Loaded extension: kick_command')
-    except Exception as e:
-        print(f'Could not load kick_command extension: {e}')
-    try:
-        await bot.load_extension('userprofile_command')
-        print('Loaded extension: userprofile_command')
-    except Exception as e:
-        print(f'Could not load userprofile_command extension: {e}')
-    try:
-        await bot.load_extension('timeout_command')
-        print('Loaded extension: timeout_command')
-    except Exception as e:
-        print(f'Could not load timeout_command extension: {e}')
-    try:
-        await bot.load_extension('untimeout_command')
-        print('Loaded extension: untimeout_command')
-    except Exception as e:
-        print(f'Could not load untimeout_command extension: {e}')
-    try:
-        await bot.load_extension('ship_command')
-        print('Loaded extension: ship_command')
-    except Exception as e:
-        print(f'Could not load ship_command extension: {e}')
-    try:
-        await bot.load_extension('warn_command')
-        print('Loaded extension: warn_command')
-    except Exception as e:
-        print(f'Could not load warn_command extension: {e}')
-    try:
-        await bot.load_extension('unwarn_command')
-        print('Loaded extension: unwarn_command')
-    except Exception as e:
-        print(f'Could not load unwarn_command extension: {e}')
-    try:
-        await bot.load_extension('purge_command')
-        print('Loaded extension: purge_command')
-    except Exception as e:
-        print(f'Could not load purge_command extension: {e}')
-    try:
-        await bot.load_extension('lock_command')
-        print('Loaded extension: lock_command')
-    except Exception as e:
-        print(f'Could not load lock_command extension: {e}')
-    try:
-        await bot.load_extension('unlock_command')
-        print('Loaded extension: unlock_command')
-    except Exception as e:
-        print(f'Could not load unlock_command extension: {e}')
-    try:
-        await bot.load_extension('truthordare_command')
-        print('Loaded extension: truthordare_command')
-    except Exception as e:
-        print(f'Could not load truthordare_command extension: {e}')
-    # logo_command removed
-
-    try:
-        cmds = [c.name for c in bot.tree.walk_commands()]
-        print(f"Commands in tree before sync: {cmds}")
-        print(f"Total commands found: {len(cmds)}")
-    except Exception as e:
-        print(f"Error listing commands: {e}")
-    try:
-        synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} slash commands.")
-    except Exception as e:
-        print(f"Error syncing commands: {e}")
+    
+    if first_ready:
+        try:
+            cmds = [c.name for c in bot.tree.walk_commands()]
+            print(f"Commands in tree: {cmds}")
+            print(f"Total commands found: {len(cmds)}")
+        except Exception as e:
+            print(f"Error listing commands: {e}")
 
 
 @bot.event
 async def on_guild_join(guild: discord.Guild):
     # Update presence when the bot joins a guild
+    if cluster_link is not None:
+        cluster_link.report_guilds()
     try:
-        guild_count = len(bot.guilds)
-        activity = discord.Activity(type=discord.ActivityType.watching, name=f"{guild_count} servers")
-        await bot.change_presence(activity=activity)
+        guild_count = await update_presence()
         print(f"Joined guild {guild.name} ({guild.id}), updated presence to {guild_count} servers")
     except Exception as e:
         print(f"Failed to update presence on guild join: {e}")
@@ -484,10 +526,10 @@ async def on_guild_join(guild: discord.Guild):
 @bot.event
 async def on_guild_remove(guild: discord.Guild):
     # Update presence when the bot is removed from a guild
+    if cluster_link is not None:
+        cluster_link.report_guilds()
     try:
-        guild_count = len(bot.guilds)
-        activity = discord.Activity(type=discord.ActivityType.watching, name=f"{guild_count} servers")
-        await bot.change_presence(activity=activity)
+        guild_count = await update_presence()
         print(f"Removed from guild {guild.name} ({guild.id}), updated presence to {guild_count} servers")
     except Exception as e:
         print(f"Failed to update presence on guild remove: {e}")
@@ -496,26 +538,24 @@ async def on_guild_remove(guild: discord.Guild):
 async def on_message(message):
     if message.author.bot:
         return
-    user_id = message.author.id
-    # Relay any non-bot message sent in a userphone channel
-    if not message.author.bot:
-        # Check if this channel is an active userphone channel
-        for uid, (partner_id, user_channel) in active_calls.items():
-            if message.channel == user_channel:
-                partner_info = active_calls.get(partner_id)
-                if partner_info:
-                    partner_channel = partner_info[1]
-                    try:
-                        sender_name = message.author.display_name
-                        # increment message count for sender
-                        try:
-                            await bot.increment_userphone_messages(message.author.id)
-                        except Exception as e:
-                            print(f"Failed to save userphone message stat: {e}")
-                        await partner_channel.send(f"**{sender_name}**📞: {message.content}")
-                    except Exception:
-                        await message.channel.send("Failed to deliver message.")
-                break
+    # Relay any non-bot message sent in a userphone channel (one dict lookup for everything else)
+    call = calls.call_for_channel(message.channel.id)
+    if call is not None:
+        partner_channel = call.other(call.side_for_channel(message.channel.id)).channel
+        # increment message count for sender
+        try:
+            await bot.increment_userphone_messages(message.author.id)
+        except Exception as e:
+            print(f"Failed to save userphone message stat: {e}")
+        content = message.content or ("*(sent an attachment)*" if message.attachments else "")
+        if content:
+            # Queued for the partner channel's relay worker; dropped (and counted) if it is backed up
+            relay.submit(partner_channel, RelayLine(
+                message.author.display_name,
+                message.author.display_avatar.url,
+                content,
+                origin=message.channel
+            ))
     await bot.process_commands(message)
 
 # To run the bot, add your token below
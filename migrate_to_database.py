@@ -1,14 +1,213 @@
 """
 Migration script to transfer data from JSON files to PostgreSQL database.
 Run this once after setting up the database to preserve existing data.
+
+Large files are streamed rather than loaded whole, written in batches (COPY on
+PostgreSQL), and progress is checkpointed in the same transaction as each batch,
+so an interrupted migration can simply be run again and resumes where it stopped.
 """
 import asyncio
 import json
 import os
-from database import db
+import time
+from database import db, STAT_COLUMNS
+
+# Records written per batch/transaction
+BATCH_SIZE = 5000
+
+# Characters read from disk at a time while streaming JSON
+CHUNK_SIZE = 1 << 20
+
+# bot_config key holding per-file migration progress
+CHECKPOINT_KEY = 'migration_checkpoints'
+
+# userphone_stats.json sections -> user_stats columns
+STATS_SECTIONS = {
+    'messages': 'userphone_messages',
+    'started': 'userphone_started',
+    'wins_ttt': 'wins_tictactoe',
+    'wins_c4': 'wins_connectfour',
+    'wins_rps': 'wins_rps',
+    'wins_hangman': 'wins_hangman',
+}
+
+
+class JsonStream:
+    """Incremental reader for one large JSON document; walks objects without loading the whole file."""
+    
+    def __init__(self, fp, chunk_size: int = CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+    
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer (dropping what was consumed). False at EOF."""
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                break
+        return self.buf[self.pos] if self.pos < len(self.buf) else ''
+    
+    def expect(self, chars: str) -> str:
+        """Consume one of the given structural characters and return it."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Malformed JSON: expected one of {chars!r}, got {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+    
+    def value(self):
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Value continues past the buffer; read more and retry
+                if self._fill():
+                    continue
+                raise
+            # A number ending exactly at the buffer edge may continue in the next chunk
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+    
+    def items(self):
+        """Yield the keys of the object at the current position. The caller must consume each value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+
+def iter_user_stats(path: str):
+    """Yield (user_id, column, value) from userphone_stats.json, one entry at a time."""
+    with open(path, 'r') as f:
+        stream = JsonStream(f)
+        for section in stream.items():
+            column = STATS_SECTIONS.get(section)
+            if column is None:
+                stream.value()
+                continue
+            for user_id in stream.items():
+                yield int(user_id), column, stream.value()
+
+
+def iter_warnings(path: str):
+    """Yield (guild_id, user_id, moderator_id, reason) from warnings.json, one user at a time."""
+    with open(path, 'r') as f:
+        stream = JsonStream(f)
+        for guild_id in stream.items():
+            for user_id in stream.items():
+                for warning in stream.value():
+                    yield int(guild_id), int(user_id), warning['moderator_id'], warning['reason']
 
 
-async def migrate_user_stats():
+def fold_user_stats(records):
+    """Fold (user_id, column, value) records into one (user_id, *STAT_COLUMNS) row per user."""
+    rows = {}
+    for user_id, column, value in records:
+        row = rows.setdefault(user_id, [0] * len(STAT_COLUMNS))
+        row[STAT_COLUMNS.index(column)] += value
+    return [(user_id, *values) for user_id, values in rows.items()]
+
+
+class ImportReport:
+    """Throughput counters for one migrated file."""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.records = 0
+        self.skipped = 0
+        self.batches = 0
+        self.elapsed = 0.0
+        self.note = None
+    
+    def line(self) -> str:
+        if self.note:
+            return f"{self.name}: {self.note}"
+        rate = self.records / self.elapsed if self.elapsed else 0.0
+        resumed = f", {self.skipped} already done" if self.skipped else ""
+        return (
+            f"{self.name}: {self.records} record(s) in {self.batches} batch(es), "
+            f"{self.elapsed:.2f}s ({rate:,.0f} records/s{resumed})"
+        )
+
+
+async def run_import(path: str, records, write_batch, report: ImportReport):
+    """
+    Stream records into write_batch(batch, checkpoint) in BATCH_SIZE chunks.
+    
+    Progress is the number of records consumed, stored per file in bot_config under
+    CHECKPOINT_KEY by write_batch in the same transaction as the batch.
+    """
+    stat = os.stat(path)
+    fingerprint = [stat.st_size, stat.st_mtime_ns]
+    checkpoints = await db.get_config(CHECKPOINT_KEY) or {}
+    progress = checkpoints.get(path)
+    
+    if progress and progress['fingerprint'] != fingerprint:
+        print(f"⚠ {path} changed since its migration started; skipping it to avoid importing twice.")
+        print(f"  Delete the '{CHECKPOINT_KEY}' entry for it to start over.")
+        report.note = "skipped (file changed since the last run)"
+        return
+    if progress and progress.get('done'):
+        print(f"✅ {path} already migrated")
+        report.note = "already migrated"
+        return
+    
+    done = progress['records'] if progress else 0
+    if done:
+        print(f"↪ Resuming {path} after {done} record(s)")
+    report.skipped = done
+    
+    async def flush(batch, finished=False):
+        nonlocal done
+        done += len(batch)
+        checkpoints[path] = {'fingerprint': fingerprint, 'records': done, 'done': finished}
+        await write_batch(batch, (CHECKPOINT_KEY, checkpoints))
+        report.records += len(batch)
+        report.batches += 1
+    
+    start = time.perf_counter()
+    try:
+        batch = []
+        for index, record in enumerate(records):
+            if index < report.skipped:
+                continue
+            batch.append(record)
+            if len(batch) >= BATCH_SIZE:
+                await flush(batch)
+                batch = []
+        await flush(batch, finished=True)
+    finally:
+        report.elapsed = time.perf_counter() - start
+
+
+async def migrate_user_stats(reports: list):
     """Migrate user stats from userphone_stats.json to database."""
     stats_file = 'userphone_stats.json'
     
@@ -16,52 +215,18 @@ async def migrate_user_stats():
         print(f"✅ {stats_file} not found - nothing to migrate")
         return
     
-    print(f"📂 Loading {stats_file}...")
-    with open(stats_file, 'r') as f:
-        data = json.load(f)
-    
-    messages = data.get('messages', {})
-    started = data.get('started', {})
-    wins_ttt = data.get('wins_ttt', {})
-    wins_c4 = data.get('wins_c4', {})
-    wins_rps = data.get('wins_rps', {})
-    wins_hangman = data.get('wins_hangman', {})
-    
-    # Collect all user IDs
-    all_user_ids = set()
-    all_user_ids.update(messages.keys())
-    all_user_ids.update(started.keys())
-    all_user_ids.update(wins_ttt.keys())
-    all_user_ids.update(wins_c4.keys())
-    all_user_ids.update(wins_rps.keys())
-    all_user_ids.update(wins_hangman.keys())
-    
-    print(f"📊 Found {len(all_user_ids)} users with stats")
-    
-    migrated = 0
-    for user_id_str in all_user_ids:
-        user_id = int(user_id_str)
-        
-        # Increment each stat
-        if user_id_str in messages:
-            await db.increment_stat(user_id, 'userphone_messages', messages[user_id_str])
-        if user_id_str in started:
-            await db.increment_stat(user_id, 'userphone_started', started[user_id_str])
-        if user_id_str in wins_ttt:
-            await db.increment_stat(user_id, 'wins_tictactoe', wins_ttt[user_id_str])
-        if user_id_str in wins_c4:
-            await db.increment_stat(user_id, 'wins_connectfour', wins_c4[user_id_str])
-        if user_id_str in wins_rps:
-            await db.increment_stat(user_id, 'wins_rps', wins_rps[user_id_str])
-        if user_id_str in wins_hangman:
-            await db.increment_stat(user_id, 'wins_hangman', wins_hangman[user_id_str])
-        
-        migrated += 1
+    print(f"📂 Streaming {stats_file}...")
+    report = ImportReport(stats_file)
+    reports.append(report)
     
-    print(f"✅ Migrated stats for {migrated} users")
+    async def write_batch(batch, checkpoint):
+        await db.import_user_stats(fold_user_stats(batch), checkpoint)
+    
+    await run_import(stats_file, iter_user_stats(stats_file), write_batch, report)
+    print(f"✅ Migrated {report.records} stat entries")
 
 
-async def migrate_warnings():
+async def migrate_warnings(reports: list):
     """Migrate warnings from warnings.json to database."""
     warnings_file = 'warnings.json'
     
@@ -69,29 +234,15 @@ async def migrate_warnings():
         print(f"✅ {warnings_file} not found - nothing to migrate")
         return
     
-    print(f"📂 Loading {warnings_file}...")
-    with open(warnings_file, 'r') as f:
-        data = json.load(f)
-    
-    total_warnings = 0
-    for guild_id_str, users in data.items():
-        guild_id = int(guild_id_str)
-        for user_id_str, warnings_list in users.items():
-            user_id = int(user_id_str)
-            for warning in warnings_list:
-                await db.add_warning(
-                    guild_id,
-                    user_id,
-                    warning['moderator_id'],
-                    warning['reason']
-                )
-                total_warnings += 1
-    
-    print(f"✅ Migrated {total_warnings} warnings")
+    print(f"📂 Streaming {warnings_file}...")
+    report = ImportReport(warnings_file)
+    reports.append(report)
+    await run_import(warnings_file, iter_warnings(warnings_file), db.import_warnings, report)
+    print(f"✅ Migrated {report.records} warnings")
 
 
 async def migrate_configs():
-    """Migrate config JSON files to database."""
+    """Migrate config JSON files to per-guild config rows in the database."""
     config_files = [
         'giveaway_config.json',
         'timechannel_config.json',
@@ -106,10 +257,18 @@ async def migrate_configs():
         with open(config_file, 'r') as f:
             data = json.load(f)
         
-        # Use filename without extension as the config key
+        # Use filename without extension as the legacy config key; each entry becomes its own row
         key = config_file.replace('.json', '')
-        await db.set_config(key, data)
-        print(f"✅ Migrated {key}")
+        count = await db.import_legacy_config(key, data)
+        print(f"✅ Migrated {key} ({count} row(s))")
+
+
+def print_throughput(reports: list):
+    if not reports:
+        return
+    print("📈 Throughput:")
+    for report in reports:
+        print(f"  - {report.line()}")
 
 
 async def main():
@@ -127,19 +286,23 @@ async def main():
     print()
     
     # Migrate data
+    reports = []
     try:
-        await migrate_user_stats()
+        await migrate_user_stats(reports)
         print()
-        await migrate_warnings()
+        await migrate_warnings(reports)
         print()
         await migrate_configs()
     except Exception as e:
         print(f"❌ Migration failed: {e}")
+        print("Progress up to the last completed batch is saved; run the script again to resume.")
         import traceback
         traceback.print_exc()
         return
     finally:
         await db.close()
+        print()
+        print_throughput(reports)
     
     print()
     print("=" * 50)
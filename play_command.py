@@ -1,39 +1,47 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import discord.utils
+import contextlib
+import itertools
+import os
 import pathlib
 import asyncio
-from typing import Optional
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
 
 import discord.ui
 
+from library import LIBRARY_POLL_SECONDS, LibraryEntry, LocalLibrary
+from ytdl import REFRESH_MARGIN, YtdlResolver, is_playlist_url
+
 
 class PauseResumeView(discord.ui.View):
-    def __init__(self, voice_client: discord.VoiceClient, *, timeout: Optional[float] = None):
+    def __init__(self, player: 'GuildPlayer', *, timeout: Optional[float] = None):
         super().__init__(timeout=timeout)
-        self.voice_client = voice_client
+        self.player = player
 
     @discord.ui.button(label="Pause", style=discord.ButtonStyle.primary)
     async def toggle(self, interaction: discord.Interaction, button: discord.ui.Button):
         # Only allow control if bot has a voice client and is in the same guild
         try:
-            vc = self.voice_client
-            if not vc:
+            player = self.player
+            if not player.voice_client.is_connected():
                 await interaction.response.send_message('<a:warning:1424944783587147868> No active voice client.', ephemeral=True)
                 return
 
-            if vc.is_playing() and not vc.is_paused():
+            if player.state == STATE_PLAYING:
                 try:
-                    vc.pause()
+                    player.pause()
                     button.label = "Resume"
                     button.style = discord.ButtonStyle.success
                     await interaction.response.edit_message(view=self)
                 except Exception as e:
                     await interaction.response.send_message(f'<a:warning:1424944783587147868> Failed to pause: {e}', ephemeral=True)
-            elif vc.is_paused():
+            elif player.state == STATE_PAUSED:
                 try:
-                    vc.resume()
+                    player.resume()
                     button.label = "Pause"
                     button.style = discord.ButtonStyle.primary
                     await interaction.response.edit_message(view=self)
@@ -51,20 +59,19 @@ class PauseResumeView(discord.ui.View):
     @discord.ui.button(label="Skip", style=discord.ButtonStyle.danger)
     async def skip(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
-            vc = self.voice_client
-            if not vc:
+            player = self.player
+            if not player.voice_client.is_connected():
                 await interaction.response.send_message('<a:warning:1424944783587147868>No active voice client.', ephemeral=True)
                 return
 
             # Check if there's anything in the queue to skip to
-            queue = getattr(vc, 'queue', None)
-            if not queue:
+            if not player.queue:
                 await interaction.response.send_message('<a:warning:1424944783587147868> Nothing queued to skip to.', ephemeral=True)
                 return
 
-            # Stop the current player — the existing after callback will schedule the next track
+            # Stop the current track — the player's after callback starts the next one
             try:
-                vc.stop()
+                player.skip()
                 await interaction.response.send_message('⏩ Skipped to next track.', ephemeral=True)
             except Exception as e:
                 await interaction.response.send_message(f'<a:warning:1424944783587147868> Failed to skip: {e}', ephemeral=True)
@@ -74,8 +81,8 @@ class PauseResumeView(discord.ui.View):
             except Exception:
                 pass
 
-# Plays a local file by name (or streams from YouTube if yt_dlp is installed).
-# Usage: /play query: str
+# Plays a file from the local music library (or streams from YouTube if yt_dlp is installed).
+# Usage: /play query: str (a playlist link queues the whole playlist)
 # Requirements for streaming: ffmpeg installed and yt_dlp available in the environment.
 
 FFMPEG_OPTIONS = {
@@ -84,161 +91,401 @@ FFMPEG_OPTIONS = {
     'options': '-vn'
 }
 
-class PlayCog(commands.Cog):
-    def __init__(self, bot: commands.Bot):
-        self.bot = bot
-
-    async def _fetch_metadata_in_background(self, query: str):
-        """Run yt_dlp extraction in a background thread to avoid blocking the event loop."""
-        def _extract():
+# GuildPlayer states
+STATE_IDLE = 'idle'            # nothing playing, queue empty
+STATE_RESOLVING = 'resolving'  # getting the next track ready
+STATE_PLAYING = 'playing'
+STATE_PAUSED = 'paused'
+
+# Upcoming tracks resolved in the background while the current one plays
+PREFETCH_AHEAD = 2
+# Seconds to wait for a track that wasn't resolved ahead of time before skipping it
+RESOLVE_TIMEOUT = 20.0
+# Stream URLs with no known expiry are resolved again before playing once they are this old
+STREAM_URL_MAX_AGE = 30 * 60
+# /volume range, in percent
+MAX_VOLUME = 200
+
+
+class Track:
+    """One queued request: a local file, or a search query resolved to a stream URL."""
+
+    def __init__(self, query: str, requester=None, channel_id: Optional[int] = None, local_path: Optional[str] = None):
+        self.query = query
+        self.local_path = local_path
+        self.stream_url: Optional[str] = None
+        self.title = pathlib.Path(local_path).name if local_path else query
+        self.webpage: Optional[str] = None
+        self.thumbnail: Optional[str] = None
+        self.requester = requester
+        # channel id where the play command was invoked; used to send now-playing embeds for queued tracks
+        self.channel_id = channel_id
+        # time.monotonic() of the last successful resolve
+        self.resolved_at: Optional[float] = None
+        # time.time() at which stream_url stops working, when known
+        self.expires_at: Optional[float] = None
+        # Audio codec and bitrate (kbps) of the source, when known; Opus is played without re-encoding
+        self.codec: Optional[str] = None
+        self.bitrate: Optional[int] = None
+        # Background resolve started by the prefetcher
+        self.prefetch: Optional[asyncio.Task] = None
+
+    @property
+    def is_fresh(self) -> bool:
+        """Resolved recently enough to play without resolving again."""
+        if self.resolved_at is None:
+            return False
+        if self.local_path is not None:
+            return True
+        if self.expires_at is not None:
+            return time.time() < self.expires_at - REFRESH_MARGIN
+        return time.monotonic() - self.resolved_at < STREAM_URL_MAX_AGE
+
+    def apply_metadata(self, metadata: dict):
+        self.stream_url = metadata.get('stream_url') or self.stream_url
+        self.title = metadata.get('title') or self.title
+        self.webpage = metadata.get('webpage') or self.webpage
+        self.thumbnail = metadata.get('thumbnail') or self.thumbnail
+        self.expires_at = metadata.get('expires_at') or self.expires_at
+        self.codec = metadata.get('codec') or self.codec
+        self.bitrate = metadata.get('bitrate') or self.bitrate
+
+
+class GuildPlayer:
+    """
+    Queue and playback state for one guild's voice connection.
+
+    While a track plays, the next PREFETCH_AHEAD tracks are resolved (and local files
+    checked) in the background, so when it ends the next one starts without waiting
+    on yt-dlp.
+
+    Tracks are sent to Discord as Opus straight from ffmpeg (copied as-is when the source
+    is already Opus). Only a guild that changed the volume gets decoded PCM, since that is
+    the one case where discord.py has to touch the samples.
+    """
+
+    def __init__(self, cog: 'PlayCog', voice_client: discord.VoiceClient):
+        self.cog = cog
+        self.voice_client = voice_client
+        self.queue: Deque[Track] = deque()
+        self.current: Optional[Track] = None
+        self.state = STATE_IDLE
+        self.volume = 1.0
+        # Why the last track failed to start, for the /play reply
+        self.last_error: Optional[Exception] = None
+        # Serialises advancing, so a skip and a track ending can't both start a track
+        self._advance = asyncio.Lock()
+
+    @property
+    def needs_pcm(self) -> bool:
+        """Whether tracks must be decoded to PCM (the volume can only be changed on PCM)."""
+        return self.volume != 1.0
+
+    def enqueue(self, track: Track) -> int:
+        """Add track to the end of the queue and return its position."""
+        self.queue.append(track)
+        self._prefetch_upcoming()
+        return len(self.queue)
+
+    def _prefetch_upcoming(self):
+        for track in itertools.islice(self.queue, PREFETCH_AHEAD):
+            if track.is_fresh:
+                continue
+            # Resolve if never tried, or resolved once but gone stale
+            if track.prefetch is None or (track.prefetch.done() and track.resolved_at is not None):
+                track.prefetch = asyncio.create_task(self.resolve(track))
+
+    async def resolve(self, track: Track) -> bool:
+        """Resolve track's stream URL (or check its local file still exists). True if it is playable."""
+        if track.local_path is not None:
+            ok = await asyncio.to_thread(os.path.isfile, track.local_path)
+            if ok and track.codec is None:
+                # ffprobe, so Opus files (.ogg/.opus/.webm) can be passed through; (None, None) if it fails
+                try:
+                    track.codec, track.bitrate = await discord.FFmpegOpusAudio.probe(track.local_path)
+                except Exception as e:
+                    print(f"[music] Could not probe {track.local_path!r}: {e}")
+        else:
             try:
-                import importlib
-                yt_dlp = importlib.import_module('yt_dlp')
-                ytdl_opts = {
-                    'format': 'bestaudio/best',
-                    'noplaylist': True,
-                    'quiet': True,
-                    'ignoreerrors': True,
-                }
-                with yt_dlp.YoutubeDL(ytdl_opts) as ydl:
-                    info = ydl.extract_info(f"ytsearch1:{query}", download=False)
-                    if not info:
-                        return {}
-                    entry = None
-                    if 'entries' in info and info['entries']:
-                        entry = info['entries'][0]
-                    else:
-                        entry = info
-                    if not entry:
-                        return {}
-
-                    stream_url = None
-                    fmts = entry.get('formats') or []
-                    if fmts:
-                        audio_fmts = [f for f in fmts if f.get('acodec') and f.get('acodec') != 'none']
-                        if audio_fmts:
-                            audio_only = [f for f in audio_fmts if not f.get('vcodec') or f.get('vcodec') == 'none']
-                            candidates = audio_only or audio_fmts
-                            def _fmt_score(f):
-                                return (f.get('abr') or f.get('tbr') or f.get('filesize') or 0)
-                            candidates.sort(key=_fmt_score, reverse=True)
-                            stream_url = candidates[0].get('url')
-                    if not stream_url:
-                        stream_url = entry.get('url') or entry.get('webpage_url')
-
-                    return {
-                        'stream_url': stream_url,
-                        'title': entry.get('title'),
-                        'webpage': entry.get('webpage_url') or entry.get('url'),
-                        'thumbnail': entry.get('thumbnail'),
-                    }
-            except Exception:
-                return {}
+                metadata = await self.cog._fetch_metadata_in_background(track.query)
+            except Exception as e:
+                print(f"[music] Failed to resolve {track.query!r}: {e}")
+                metadata = {}
+            track.apply_metadata(metadata)
+            ok = bool(metadata.get('stream_url'))
+        if ok:
+            track.resolved_at = time.monotonic()
+        return ok
+
+    async def _ready(self, track: Track) -> bool:
+        if track.prefetch is not None and not track.prefetch.done():
+            # Normally finished long ago; wait without cancelling it or raising its errors
+            await asyncio.wait({track.prefetch}, timeout=RESOLVE_TIMEOUT)
+            if not track.prefetch.done():
+                return False
+        if track.is_fresh:
+            return True
+        if track.resolved_at is None and track.prefetch is not None:
+            # The prefetcher already tried and found nothing; don't hold up the queue trying again
+            return False
+        try:
+            return await asyncio.wait_for(self.resolve(track), RESOLVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+
+    async def play_next(self, announce: bool = True) -> Optional[Track]:
+        """Start the next playable track in the queue and return it (None if the queue ran out)."""
+        async with self._advance:
+            if self.voice_client.is_playing() or self.voice_client.is_paused():
+                return self.current
+            while self.queue and self.voice_client.is_connected():
+                track = self.queue.popleft()
+                self.state = STATE_RESOLVING
+                if not await self._ready(track):
+                    print(f"[music] Skipping {track.title!r}: nothing playable was found")
+                    continue
+                try:
+                    source = self.cog.make_source(track, self.volume if self.needs_pcm else None)
+                except discord.errors.ClientException as e:
+                    # Can't prepare this source (typically ffmpeg missing); skip to next
+                    self.last_error = e
+                    print(f"[music] Failed to prepare {track.title!r}: {e}")
+                    continue
+
+                self.current = track
+                self.state = STATE_PLAYING
+                self.voice_client.play(source, after=self._after)
+                self._prefetch_upcoming()
+                if announce:
+                    self._announce(track)
+                return track
+
+            self.current = None
+            self.state = STATE_IDLE
+            return None
+
+    def _after(self, error):
+        # Runs on discord.py's audio thread when a track ends, is skipped or fails
+        if error:
+            print(f"[music] Playback error: {error}")
+        try:
+            asyncio.run_coroutine_threadsafe(self.play_next(), self.cog.bot.loop)
+        except Exception:
+            pass
 
-        # Run blocking yt_dlp in a thread
-        return await asyncio.to_thread(_extract)
+    def pause(self):
+        self.voice_client.pause()
+        self.state = STATE_PAUSED
+
+    def resume(self):
+        self.voice_client.resume()
+        self.state = STATE_PLAYING
+
+    def skip(self):
+        # Stopping fires the after callback, which starts the next track
+        self.voice_client.stop()
+
+    def stop(self):
+        """Clear the queue and stop playback."""
+        for track in self.queue:
+            if track.prefetch is not None:
+                track.prefetch.cancel()
+        self.queue.clear()
+        self.current = None
+        self.state = STATE_IDLE
+        self.voice_client.stop()
+
+    def _announce(self, track: Track):
+        # Send a now-playing embed. Prefer the original request channel stored with the queued item,
+        # otherwise fall back to the guild system channel when available.
+        try:
+            guild = getattr(self.voice_client, 'guild', None)
+            if guild:
+                channel = None
+                if track.channel_id:
+                    channel = guild.get_channel(track.channel_id)
+                if channel is None:
+                    channel = guild.system_channel
+
+                if channel is not None and channel.permissions_for(guild.me).send_messages:
+                    embed = track_embed("<a:music:1425403164688908299> Now playing", track, "Requested by")
+                    # fire-and-forget send with Pause/Resume/Skip controls
+                    try:
+                        view = PauseResumeView(self)
+                        asyncio.create_task(channel.send(embed=embed, view=view))
+                    except Exception:
+                        try:
+                            asyncio.create_task(channel.send(embed=embed))
+                        except Exception:
+                            pass
+        except Exception:
+            pass
 
-    async def _play_next(self, voice_client: discord.VoiceClient):
-        """
-        Play the next item from the voice_client.queue if present.
-        This runs in the bot event loop.
-        """
+
+def track_embed(heading: str, track: Track, footer: str) -> discord.Embed:
+    embed = discord.Embed(title=heading, description=f"{track.title}", color=discord.Color.blurple())
+    if track.webpage:
+        embed.add_field(name="Source", value=f"[Link]({track.webpage})", inline=False)
+    try:
+        if track.requester:
+            embed.set_footer(text=f"{footer} {getattr(track.requester, 'display_name', str(track.requester))}")
+    except Exception:
+        pass
+    if track.thumbnail:
         try:
-            if not hasattr(voice_client, 'queue') or not voice_client.queue:
-                return
+            embed.set_thumbnail(url=track.thumbnail)
+        except Exception:
+            pass
+    return embed
 
-            item = voice_client.queue.pop(0)
-            local_path = item.get('local_path')
-            stream_url = item.get('stream_url')
-            title = item.get('title') or item.get('webpage') or 'Unknown'
-            thumbnail = item.get('thumbnail')
-            requester = item.get('requester')
 
-            # If stream_url is still None and we have a query, try to fetch metadata (wait up to 3 seconds)
-            if local_path is None and not stream_url and item.get('query'):
-                try:
-                    metadata = await asyncio.wait_for(
-                        self._fetch_metadata_in_background(item['query']),
-                        timeout=3.0
-                    )
-                    if metadata:
-                        stream_url = metadata.get('stream_url') or stream_url
-                        title = metadata.get('title') or title
-                        thumbnail = metadata.get('thumbnail') or thumbnail
-                        item['stream_url'] = stream_url
-                        item['title'] = title
-                        item['webpage'] = metadata.get('webpage') or item.get('webpage')
-                        item['thumbnail'] = thumbnail
-                except asyncio.TimeoutError:
-                    pass  # Continue with whatever we have
-                except Exception:
-                    pass
+def _choice_name(entry: LibraryEntry) -> str:
+    name = entry.display
+    if entry.duration:
+        minutes, seconds = divmod(int(entry.duration), 60)
+        name = f"{name} ({minutes}:{seconds:02d})"
+    return name if len(name) <= 100 else name[:99] + '…'
 
-            try:
-                if local_path is not None:
-                    source = discord.FFmpegPCMAudio(local_path, **FFMPEG_OPTIONS)
-                else:
-                    source = discord.FFmpegPCMAudio(stream_url, **FFMPEG_OPTIONS)
-            except discord.errors.ClientException:
-                # Can't prepare this source; skip to next
-                await self._play_next(voice_client)
-                return
 
-            # after callback schedules next track when this one finishes
-            def _after(err):
-                try:
-                    asyncio.run_coroutine_threadsafe(self._play_next(voice_client), self.bot.loop)
-                except Exception:
-                    pass
+def _choice_value(entry: LibraryEntry) -> str:
+    # The relative path finds exactly this file again; Discord caps choice values at 100 characters
+    return entry.relpath if len(entry.relpath) <= 100 else entry.display[:100]
 
-            voice_client.play(source, after=_after)
 
-            # Send a now-playing embed. Prefer the original request channel stored with the queued item,
-            # otherwise fall back to the guild system channel when available.
-            try:
-                guild = getattr(voice_client, 'guild', None)
-                if guild:
-                    channel = None
-                    try:
-                        chan_id = item.get('channel_id')
-                        if chan_id:
-                            channel = guild.get_channel(chan_id)
-                    except Exception:
-                        channel = None
+class PlayCog(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        # guild id -> GuildPlayer
+        self.players: Dict[int, GuildPlayer] = {}
+        # Shared yt-dlp workers and search/stream caches
+        self.ytdl = YtdlResolver()
+        # Sources started, by kind ('passthrough', 'opus', 'pcm')
+        self.source_kinds: Counter = Counter()
+        # Local audio files, indexed in the background and kept up to date by watch_library
+        self.library = LocalLibrary()
+        self.watch_library.start()
+
+    def get_player(self, voice_client: discord.VoiceClient) -> GuildPlayer:
+        player = self.players.get(voice_client.guild.id)
+        if player is None:
+            player = self.players[voice_client.guild.id] = GuildPlayer(self, voice_client)
+        else:
+            # A reconnect gives a new voice client
+            player.voice_client = voice_client
+        return player
+
+    def cog_unload(self):
+        self.watch_library.cancel()
+        for player in self.players.values():
+            player.stop()
+        self.players.clear()
+        print(f"[music] yt-dlp cache: {self.ytdl.stats()}")
+        print(f"[music] Audio sources: {dict(self.source_kinds)}")
+        self.ytdl.close()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        # Drop the guild's player when the bot leaves (or is removed from) voice
+        if self.bot.user is not None and member.id == self.bot.user.id and after.channel is None:
+            player = self.players.pop(member.guild.id, None)
+            if player is not None:
+                player.stop()
+
+    @tasks.loop(seconds=LIBRARY_POLL_SECONDS)
+    async def watch_library(self):
+        first = self.library.scanned_at is None
+        try:
+            added, changed, removed = await asyncio.to_thread(self.library.refresh)
+        except Exception as e:
+            print(f"[library] Scan failed: {e}")
+            return
+        if first:
+            print(f"[library] Indexed {len(self.library)} audio files in {', '.join(self.library.directories)}")
+        elif added or changed or removed:
+            print(f"[library] {added} added, {changed} changed, {removed} removed ({len(self.library)} files)")
 
-                    if channel is None:
-                        channel = guild.system_channel
+    def make_source(self, track: Track, pcm_volume: Optional[float] = None) -> discord.AudioSource:
+        """
+        ffmpeg source for track. Opus sources are copied through untouched and anything else
+        is encoded to Opus by ffmpeg; with pcm_volume, it is decoded to PCM at that volume instead.
+        """
+        # stream_url may be a webpage URL; FFmpeg can accept it via yt-dlp's output if direct stream is not provided
+        location = track.local_path if track.local_path is not None else track.stream_url
+        if pcm_volume is not None:
+            self.source_kinds['pcm'] += 1
+            return discord.PCMVolumeTransformer(discord.FFmpegPCMAudio(location, **FFMPEG_OPTIONS), volume=pcm_volume)
+        self.source_kinds['passthrough' if track.codec == 'opus' else 'opus'] += 1
+        return discord.FFmpegOpusAudio(location, codec=track.codec, bitrate=track.bitrate, **FFMPEG_OPTIONS)
+
+    async def _fetch_metadata_in_background(self, query: str):
+        """Resolve a search term through the shared yt-dlp workers and caches ({} if nothing was found)."""
+        try:
+            return await self.ytdl.resolve(query)
+        except Exception as e:
+            print(f"[music] yt-dlp extraction failed for {query!r}: {e}")
+            return {}
 
-                    if channel is not None and channel.permissions_for(guild.me).send_messages:
-                        embed = discord.Embed(title="<a:music:1425403164688908299> Now playing", description=f"{title}", color=discord.Color.blurple())
-                        if item.get('webpage'):
-                            embed.add_field(name="Source", value=f"[Link]({item.get('webpage')})", inline=False)
+    async def _enqueue_playlist(self, interaction: discord.Interaction, player: GuildPlayer, url: str):
+        """
+        Queue a playlist's entries as yt-dlp lists them. Playback starts with the first one,
+        and entries are only resolved once they come within PREFETCH_AHEAD of playing.
+        """
+        requester = getattr(interaction, 'user', None)
+        channel_id = getattr(interaction.channel, 'id', None)
+        title = None
+        added = 0
+        message = None
+        failed = None
+        try:
+            # Closing the generator on the way out stops the listing thread at once
+            async with contextlib.aclosing(self.ytdl.playlist(url)) as items:
+                async for item in items:
+                    if not isinstance(item, dict):
+                        title = item
+                        continue
+                    if self.players.get(player.voice_client.guild.id) is not player or not player.voice_client.is_connected():
+                        # The bot left voice while the playlist was being listed
+                        break
+                    track = Track(item['url'], requester=requester, channel_id=channel_id)
+                    track.title = item.get('title') or track.title
+                    track.webpage = item['url']
+                    player.enqueue(track)
+                    added += 1
+                    if added == 1:
+                        if player.state == STATE_IDLE:
+                            asyncio.create_task(player.play_next())
+                        embed = discord.Embed(title="<a:music:1425403164688908299> Adding playlist", description=title or url, color=discord.Color.blurple())
                         try:
-                            if requester:
-                                embed.set_footer(text=f"Requested by {getattr(requester,'display_name', str(requester))}")
+                            message = await interaction.followup.send(embed=embed, wait=True)
                         except Exception:
                             pass
-                        if thumbnail:
-                            try:
-                                embed.set_thumbnail(url=thumbnail)
-                            except Exception:
-                                pass
-                        # fire-and-forget send with Pause/Resume/Skip controls
-                        try:
-                            view = PauseResumeView(voice_client)
-                            asyncio.create_task(channel.send(embed=embed, view=view))
-                        except Exception:
-                            try:
-                                asyncio.create_task(channel.send(embed=embed))
-                            except Exception:
-                                pass
+        except Exception as e:
+            failed = e
+            print(f"[music] Failed to list playlist {url!r}: {e}")
+
+        if not added:
+            reason = f': {failed}' if failed else '. It may be empty or private, or `yt_dlp` is not installed.'
+            try:
+                await interaction.followup.send(f'<a:warning:1424944783587147868> Could not load the playlist{reason}', ephemeral=True)
             except Exception:
                 pass
-        except Exception:
             return
 
+        embed = discord.Embed(
+            title="<a:music:1425403164688908299> Added playlist",
+            description=f"{title or url}\n{added} track{'s' if added != 1 else ''} queued",
+            color=discord.Color.blurple(),
+        )
+        try:
+            if message is not None:
+                await message.edit(embed=embed)
+            else:
+                await interaction.followup.send(embed=embed)
+        except Exception:
+            pass
+
     @app_commands.command(name='play', description='Join your voice channel and play an audio by name or search term')
-    @app_commands.describe(query='Filename (in bot folder) or search term to play')
+    @app_commands.describe(query='Song from the music library, a search term, or a link (playlists are queued whole)')
     async def play(self, interaction: discord.Interaction, query: str):
         # Ensure the user is in a voice channel
         user_voice = getattr(interaction.user, 'voice', None)
@@ -286,43 +533,25 @@ class PlayCog(commands.Cog):
                 await interaction.followup.send(f'❌ Failed to connect to voice channel: {e}', ephemeral=True)
             return
 
-        # Try to find a local file matching the query
-        local_path = None
-        search_names = [query]
-        # Also try common extensions
-        exts = ['.mp3', '.wav', '.m4a', '.ogg']
-        for ext in exts:
-            search_names.append(query + ext)
-
-        base = pathlib.Path('.')
-        for name in search_names:
-            p = base / name
-            if p.exists() and p.is_file():
-                local_path = str(p.resolve())
-                break
-
-        # If no local file found, and yt_dlp is available, try streaming from YouTube search
-        stream_url = None
-        track_title = None
-        track_webpage = None
-        track_thumbnail = None
-        if local_path is None:
-            # Always use background fetch to avoid blocking the event loop (keeps bot responsive)
-            # Fetch metadata in background thread
-            try:
-                metadata = await self._fetch_metadata_in_background(query)
-                if metadata:
-                    stream_url = metadata.get('stream_url')
-                    track_title = metadata.get('title')
-                    track_webpage = metadata.get('webpage')
-                    track_thumbnail = metadata.get('thumbnail')
-                else:
-                    # Fetch returned empty - set placeholder
-                    track_title = query
-            except Exception:
-                # Fetch failed - set placeholder
-                track_title = query
-                stream_url = None
+        player = self.get_player(voice_client)
+
+        if is_playlist_url(query):
+            await self._enqueue_playlist(interaction, player, query)
+            return
+
+        # A matching file in the local library wins over searching online
+        entry = await asyncio.to_thread(self.library.find, query)
+        track = Track(
+            query,
+            requester=getattr(interaction, 'user', None),
+            channel_id=getattr(interaction.channel, 'id', None),
+            local_path=entry.path if entry else None,
+        )
+        if entry is not None:
+            track.title = entry.display
+            track.codec = entry.codec
+        # Resolve now so the reply can show the title (the player re-resolves it if it goes stale)
+        resolved = await player.resolve(track)
 
         # Helper to send a message or embed, using followup if the initial response was already used
         async def _safe_reply(content: str | None = None, *, embed: discord.Embed | None = None, ephemeral: bool = True, view: discord.ui.View | None = None):
@@ -335,69 +564,16 @@ class PlayCog(commands.Cog):
                 # If this fails, there's not much we can do; swallow to avoid crash
                 pass
 
-        # Prepare source / handle queueing when already playing
+        # Start playback or queue behind the current track
         try:
-            # Prepare friendly metadata for either playing now or queueing
-            if local_path is not None:
-                display_title = pathlib.Path(local_path).name
-                source_url = None
-                thumbnail = None
-            else:
-                display_title = track_title or query
-                source_url = track_webpage
-                thumbnail = track_thumbnail
-
-            # If something is already playing, save this request to a simple queue on the voice client
-            if voice_client.is_playing():
-                # attach a queue list to the voice client if missing
-                if not hasattr(voice_client, 'queue') or voice_client.queue is None:
-                    voice_client.queue = []
-
-                # store minimal info needed for later playback or display
-                item = {
-                    'local_path': local_path,
-                    'stream_url': stream_url,
-                    'title': display_title,
-                    'webpage': track_webpage,
-                    'thumbnail': track_thumbnail,
-                    'requester': getattr(interaction, 'user', None),
-                    # channel id where the play command was invoked; used to send now-playing embeds for queued tracks
-                    'channel_id': getattr(interaction.channel, 'id', None),
-                    'query': query,  # Store original query for background fetch
-                }
-                voice_client.queue.append(item)
-
-                # If metadata wasn't fetched yet (stream_url is None), schedule background fetch
-                if local_path is None and stream_url is None:
-                    async def _fetch_and_update():
-                        try:
-                            metadata = await self._fetch_metadata_in_background(query)
-                            if metadata:
-                                # Update the queued item in-place
-                                item['stream_url'] = metadata.get('stream_url') or item.get('stream_url')
-                                item['title'] = metadata.get('title') or item.get('title')
-                                item['webpage'] = metadata.get('webpage') or item.get('webpage')
-                                item['thumbnail'] = metadata.get('thumbnail') or item.get('thumbnail')
-                        except Exception:
-                            pass  # Silently ignore fetch errors
-                    
-                    # Schedule background fetch (fire-and-forget)
-                    asyncio.create_task(_fetch_and_update())
+            display_title = track.title
+
+            # If something is already playing, add this request to the guild's queue
+            if player.state != STATE_IDLE:
+                player.enqueue(track)
 
                 # send an embed confirming item was added to queue
-                q_embed = discord.Embed(title="<a:music:1425403164688908299> Added to queue", description=f"{display_title}", color=discord.Color.blurple())
-                if source_url:
-                    q_embed.add_field(name="Source", value=f"[Link]({source_url})", inline=False)
-                try:
-                    requester = interaction.user
-                    q_embed.set_footer(text=f"Queued by {requester.display_name}")
-                except Exception:
-                    pass
-                if thumbnail:
-                    try:
-                        q_embed.set_thumbnail(url=thumbnail)
-                    except Exception:
-                        pass
+                q_embed = track_embed("<a:music:1425403164688908299> Added to queue", track, "Queued by")
 
                 # Try to respond to the interaction or followup. If that fails, fall back to sending
                 # directly in the invocation channel or system channel so the user sees confirmation.
@@ -435,10 +611,9 @@ class PlayCog(commands.Cog):
                         pass
                 return
 
-            # Not playing: prepare ffmpeg source and start playback (unchanged behaviour)
-            # Check that we have something to play
-            if local_path is None and stream_url is None:
-                msg = '<a:warning:1424944783587147868> No local audio file found and streaming dependencies are not available or the query returned nothing. Place a file in the bot folder or install `yt_dlp`+`ffmpeg` for streaming.'
+            # Idle: check that we have something to play
+            if not resolved:
+                msg = '<a:warning:1424944783587147868> No matching file in the music library and streaming dependencies are not available or the query returned nothing. Add the file to the library folder (`MUSIC_DIRS`) or install `yt_dlp`+`ffmpeg` for streaming.'
                 try:
                     if not interaction.response.is_done():
                         await interaction.response.send_message(msg, ephemeral=True)
@@ -448,47 +623,25 @@ class PlayCog(commands.Cog):
                     pass
                 return
 
-            try:
-                if local_path is not None:
-                    source = discord.FFmpegPCMAudio(local_path, **FFMPEG_OPTIONS)
+            player.last_error = None
+            player.queue.appendleft(track)
+            started = await player.play_next(announce=False)
+            if started is not track:
+                if isinstance(player.last_error, discord.errors.ClientException):
+                    # Typical message: 'ffmpeg was not found.' — give the user instructions
+                    msg = (
+                        "Failed to prepare audio: ffmpeg was not found on the system.\n"
+                        "Install ffmpeg and ensure `ffmpeg` is available on your PATH.\n"
+                        "On Windows, download from https://www.gyan.dev/ffmpeg/builds/ and add the `bin` folder to PATH."
+                    )
+                    await _safe_reply(msg, ephemeral=True)
                 else:
-                    # stream_url may be a webpage URL; FFmpeg can accept it via yt-dlp's output if direct stream is not provided
-                    source = discord.FFmpegPCMAudio(stream_url, **FFMPEG_OPTIONS)
-            except discord.errors.ClientException as ce:
-                # Typical message: 'ffmpeg was not found.' — give the user instructions
-                msg = (
-                    "Failed to prepare audio: ffmpeg was not found on the system.\n"
-                    "Install ffmpeg and ensure `ffmpeg` is available on your PATH.\n"
-                    "On Windows, download from https://www.gyan.dev/ffmpeg/builds/ and add the `bin` folder to PATH."
-                )
-                await _safe_reply(msg, ephemeral=True)
+                    await _safe_reply('<a:warning:1424944783587147868> Failed to play audio.', ephemeral=True)
                 return
 
-            # after callback schedules next queued track when this one finishes
-            def _after(err):
-                try:
-                    asyncio.run_coroutine_threadsafe(self._play_next(voice_client), self.bot.loop)
-                except Exception:
-                    pass
-
-            voice_client.play(source, after=_after)
-
-            embed = discord.Embed(title="<a:music:1425403164688908299> Now playing", description=f"{display_title}", color=discord.Color.blurple())
-            if source_url:
-                embed.add_field(name="Source", value=f"[Link]({source_url})", inline=False)
-            try:
-                requester = interaction.user
-                embed.set_footer(text=f"Requested by {requester.display_name}")
-            except Exception:
-                pass
-            if thumbnail:
-                try:
-                    embed.set_thumbnail(url=thumbnail)
-                except Exception:
-                    pass
-
+            embed = track_embed("<a:music:1425403164688908299> Now playing", track, "Requested by")
             try:
-                view = PauseResumeView(voice_client)
+                view = PauseResumeView(player)
                 await _safe_reply(None, embed=embed, ephemeral=False, view=view)
             except Exception:
                 # Fallback: send text-only reply
@@ -498,5 +651,32 @@ class PlayCog(commands.Cog):
             return
 
 
+    @play.autocomplete('query')
+    async def play_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        # Served from the in-memory index (off the event loop, as fuzzy matching a large library
+        # takes a few milliseconds); free text is still accepted as a search term
+        entries = await asyncio.to_thread(self.library.search, current)
+        return [app_commands.Choice(name=_choice_name(entry), value=_choice_value(entry)) for entry in entries]
+
+    @app_commands.command(name='volume', description='Set the music volume for this server')
+    @app_commands.describe(percent=f'Volume in percent (100 is the original loudness, up to {MAX_VOLUME})')
+    async def volume(self, interaction: discord.Interaction, percent: app_commands.Range[int, 0, MAX_VOLUME]):
+        player = self.players.get(getattr(interaction.guild, 'id', None))
+        if player is None:
+            await interaction.response.send_message('<a:warning:1424944783587147868> Nothing is currently playing.', ephemeral=True)
+            return
+
+        player.volume = percent / 100
+        source = player.voice_client.source
+        if isinstance(source, discord.PCMVolumeTransformer):
+            source.volume = player.volume
+            await interaction.response.send_message(f'🔊 Volume set to {percent}%.')
+        elif player.needs_pcm and player.current is not None:
+            # The current track is streamed as Opus and can't be turned up or down mid-track
+            await interaction.response.send_message(f'🔊 Volume set to {percent}%, starting with the next track.')
+        else:
+            await interaction.response.send_message(f'🔊 Volume set to {percent}%.')
+
+
 async def setup(bot: commands.Bot):
-    await bot.add_cog(PlayCog(bot))
\ No newline at end of file
+    await bot.add_cog(PlayCog(bot))
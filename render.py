@@ -0,0 +1,134 @@
+"""
+Image rendering service.
+
+PIL work (drawing, LANCZOS resizes, PNG encoding) is CPU-bound; run on the event loop it
+stalls gateway heartbeats and every other interaction. Cogs hand their renderers to
+bot.render.run() instead, which executes them on a worker pool. A renderer is a plain
+sync function taking picklable arguments (bytes, numbers, strings, lists) and returning
+PNG bytes, so the same code runs in a thread or a separate process.
+
+Environment:
+    RENDER_MODE     'thread' (default) or 'process'
+    RENDER_WORKERS  pool size (default: CPU count, at most 4)
+    RENDER_QUEUE    renders in flight (running or queued) before new ones wait (default: 4 per worker)
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from metrics import LatencyHistogram
+
+# Seconds a render may wait for a free slot before it is refused with RenderBusy
+RENDER_QUEUE_TIMEOUT = 10.0
+
+
+class RenderBusy(Exception):
+    """The render queue stayed full for RENDER_QUEUE_TIMEOUT seconds."""
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict):
+    # Runs on the worker, so the measured time excludes queueing and (in process mode) pickling
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class RenderService:
+    """Bounded worker pool for renderers, with per-renderer queue-wait and run-time histograms."""
+
+    def __init__(self, mode: Optional[str] = None, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.mode = (mode or os.environ.get('RENDER_MODE') or 'thread').lower()
+        if self.mode not in ('thread', 'process'):
+            print(f"[render] Unknown RENDER_MODE {self.mode!r}, using threads")
+            self.mode = 'thread'
+        self.workers = workers or int(os.environ.get('RENDER_WORKERS') or 0) or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or int(os.environ.get('RENDER_QUEUE') or 0) or self.workers * 4
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wait: Dict[str, LatencyHistogram] = {}
+        self._run: Dict[str, LatencyHistogram] = {}
+
+    def _pool(self):
+        if self._executor is None:
+            if self.mode == 'process':
+                # spawn: forking a process that runs an event loop and other threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='render')
+        return self._executor
+
+    @property
+    def in_process(self) -> bool:
+        """True when renderers run in this process, so they may keep state (e.g. a canvas) between calls."""
+        return self.mode == 'thread'
+
+    async def run(self, name: str, fn: Callable, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the pool and return its result.
+
+        Waits for a slot when max_pending renders are already in flight, and raises
+        RenderBusy if none frees up in time. In process mode fn must be a module-level function.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        queued = time.perf_counter()
+        try:
+            # Not wait_for(): it can time out just after acquire() succeeded, leaking the slot.
+            # acquire() itself hands a slot back when it is cancelled after getting one.
+            async with asyncio.timeout(RENDER_QUEUE_TIMEOUT):
+                await self._slots.acquire()
+        except TimeoutError:
+            self.rejected += 1
+            raise RenderBusy("Too many images are being generated right now, please try again in a moment.")
+
+        self.pending += 1
+        elapsed = None
+        try:
+            result, elapsed = await asyncio.get_running_loop().run_in_executor(
+                self._pool(), _timed_call, fn, args, kwargs
+            )
+            return result
+        finally:
+            self.pending -= 1
+            self._slots.release()
+            total = time.perf_counter() - queued
+            failed = elapsed is None
+            run = self._run.setdefault(name, LatencyHistogram())
+            wait = self._wait.setdefault(name, LatencyHistogram())
+            # A failed render's time on the worker is unknown; count it all as run time
+            run.observe((total if failed else elapsed) * 1000, failed)
+            wait.observe(0.0 if failed else (total - elapsed) * 1000)
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-renderer run time and queue wait, ordered by total run time (largest first)."""
+        ordered = sorted(self._run.items(), key=lambda item: item[1].total_ms, reverse=True)
+        return {
+            name: {'run': histogram.summary(), 'wait': self._wait[name].summary()}
+            for name, histogram in ordered
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        if not stats and not self.rejected:
+            return
+        print(f"🖼 Render time by renderer ({self.mode} pool, {self.workers} worker(s), {self.rejected} rejected):")
+        for name, summary in stats.items():
+            run, wait = summary['run'], summary['wait']
+            print(
+                f"   {name}: {run['count']} render(s), {run['errors']} failed, "
+                f"run p50 {run['p50_ms']} ms / p99 {run['p99_ms']} ms, wait p99 {wait['p99_ms']} ms"
+            )
+
+    def close(self):
+        self.log_stats()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,11 +1,218 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from PIL import Image, ImageDraw, ImageFont
-import aiohttp
+import functools
 import io
 import random
 import os
+from fonts import get_font, text_bbox
+
+
+def render_ship(avatar1: bytes, avatar2: bytes, compatibility: int) -> bytes:
+    """Decode both avatars, compose the ship image and encode it as PNG (runs on the render pool)."""
+    from PIL import Image
+    image = create_ship_image(
+        Image.open(io.BytesIO(avatar1)).convert('RGBA'),
+        Image.open(io.BytesIO(avatar2)).convert('RGBA'),
+        compatibility
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def create_ship_image(avatar1: 'Image.Image', avatar2: 'Image.Image', compatibility: int):
+    """Create the ship image with two avatars and a heart"""
+    from PIL import Image
+    # Image dimensions - made narrower to bring avatars closer
+    width = 600
+    height = 400
+    avatar_size = 180
+    
+    # Start from the (cached) gradient background
+    image = create_gradient_background(width, height, compatibility).copy()
+    
+    # Resize and make avatars circular
+    avatar1 = make_circular(avatar1.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS))
+    avatar2 = make_circular(avatar2.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS))
+    
+    # Calculate positions - closer together
+    avatar1_x = 30
+    avatar2_x = width - avatar_size - 30
+    avatar_y = (height - avatar_size) // 2 + 30
+    
+    # Paste avatars
+    image.paste(avatar1, (avatar1_x, avatar_y), avatar1)
+    image.paste(avatar2, (avatar2_x, avatar_y), avatar2)
+    
+    # Add plus symbol in the middle
+    plus = create_plus(100, 100)
+    plus_x = (width - 100) // 2
+    plus_y = (height - 100) // 2 + 30
+    image.paste(plus, (plus_x, plus_y), plus)
+    
+    # Add compatibility percentage at the top
+    text, position = percentage_overlay(width, height, compatibility)
+    image.paste(text, position, text)
+    
+    return image
+
+
+@functools.lru_cache(maxsize=101)
+def percentage_overlay(width: int, height: int, compatibility: int):
+    """The outlined compatibility percentage as a cropped overlay, with where to paste it"""
+    from PIL import Image, ImageDraw
+    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    
+    font_large = get_font(80)
+    
+    # Draw compatibility percentage
+    percentage_text = f"{compatibility}%"
+    
+    # Get text bounding box for centering
+    bbox = text_bbox(percentage_text, font_large)
+    text_width = bbox[2] - bbox[0]
+    text_x = (width - text_width) // 2
+    
+    # Draw text with outline for better visibility
+    outline_color = (0, 0, 0, 255)
+    text_color = (255, 255, 255, 255)
+    
+    # Draw outline
+    for offset_x in [-2, 0, 2]:
+        for offset_y in [-2, 0, 2]:
+            draw.text((text_x + offset_x, 30 + offset_y), percentage_text, font=font_large, fill=outline_color)
+    
+    # Draw main text
+    draw.text((text_x, 30), percentage_text, font=font_large, fill=text_color)
+    
+    box = overlay.getbbox()
+    return overlay.crop(box), box[:2]
+
+
+def gradient_colors(compatibility: int):
+    """Top and bottom gradient colours for a compatibility bracket"""
+    if compatibility >= 75:
+        return (255, 105, 180), (255, 20, 147)   # Hot pink -> deep pink
+    elif compatibility >= 50:
+        return (255, 182, 193), (255, 105, 180)  # Light pink -> hot pink
+    elif compatibility >= 25:
+        return (173, 216, 230), (255, 182, 193)  # Light blue -> light pink
+    else:
+        return (128, 128, 128), (169, 169, 169)  # Gray -> dark gray
+
+
+def create_gradient_background(width: int, height: int, compatibility: int):
+    """Gradient background for a compatibility (shared between renders: copy before drawing on it)"""
+    color1, color2 = gradient_colors(compatibility)
+    return _gradient(width, height, color1, color2)
+
+
+@functools.lru_cache(maxsize=16)
+def _gradient(width: int, height: int, color1: tuple, color2: tuple):
+    from PIL import Image
+    # Build one pixel column, then stretch it sideways
+    column = bytearray()
+    for y in range(height):
+        ratio = y / height
+        column += bytes((
+            int(color1[0] * (1 - ratio) + color2[0] * ratio),
+            int(color1[1] * (1 - ratio) + color2[1] * ratio),
+            int(color1[2] * (1 - ratio) + color2[2] * ratio),
+            255,
+        ))
+    return Image.frombytes('RGBA', (1, height), bytes(column)).resize((width, height), Image.Resampling.NEAREST)
+
+
+@functools.lru_cache(maxsize=8)
+def circle_mask(size: tuple):
+    """Anti-aliased circular alpha mask (drawn at 4x and scaled down)"""
+    from PIL import Image, ImageDraw
+    scale = 4
+    mask = Image.new('L', (size[0] * scale, size[1] * scale), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size[0] * scale - 1, size[1] * scale - 1), fill=255)
+    return mask.resize(size, Image.Resampling.LANCZOS)
+
+
+def make_circular(image: 'Image.Image'):
+    """Make an image circular"""
+    output = image.convert('RGBA')
+    output.putalpha(circle_mask(image.size))
+    
+    return output
+
+
+@functools.lru_cache(maxsize=4)
+def create_plus(width: int, height: int):
+    """Create a nice-looking plus symbol (cached: paste it, don't draw on it)"""
+    from PIL import Image, ImageDraw
+    image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    
+    # Plus color (pink/magenta)
+    color = (255, 255, 255, 255)  # White
+    outline_color = (255, 20, 147, 255)  # Deep pink
+    shadow_color = (0, 0, 0, 80)  # Semi-transparent black for shadow
+    
+    center_x = width // 2
+    center_y = height // 2
+    
+    # Plus dimensions - rounded ends
+    plus_thickness = int(width * 0.25)
+    plus_length = int(width * 0.8)
+    
+    # Calculate corner radius for rounded rectangles
+    corner_radius = plus_thickness // 2
+    
+    # Draw shadow (offset slightly)
+    shadow_offset = 3
+    
+    # Horizontal bar shadow
+    draw.rounded_rectangle(
+        [center_x - plus_length // 2 + shadow_offset, 
+         center_y - plus_thickness // 2 + shadow_offset,
+         center_x + plus_length // 2 + shadow_offset, 
+         center_y + plus_thickness // 2 + shadow_offset],
+        radius=corner_radius,
+        fill=shadow_color
+    )
+    
+    # Vertical bar shadow
+    draw.rounded_rectangle(
+        [center_x - plus_thickness // 2 + shadow_offset, 
+         center_y - plus_length // 2 + shadow_offset,
+         center_x + plus_thickness // 2 + shadow_offset, 
+         center_y + plus_length // 2 + shadow_offset],
+        radius=corner_radius,
+        fill=shadow_color
+    )
+    
+    # Draw horizontal bar (with outline)
+    draw.rounded_rectangle(
+        [center_x - plus_length // 2, 
+         center_y - plus_thickness // 2,
+         center_x + plus_length // 2, 
+         center_y + plus_thickness // 2],
+        radius=corner_radius,
+        fill=color,
+        outline=outline_color,
+        width=3
+    )
+    
+    # Draw vertical bar (with outline)
+    draw.rounded_rectangle(
+        [center_x - plus_thickness // 2, 
+         center_y - plus_length // 2,
+         center_x + plus_thickness // 2, 
+         center_y + plus_length // 2],
+        radius=corner_radius,
+        fill=color,
+        outline=outline_color,
+        width=3
+    )
+    
+    return image
 
 
 class ShipCog(commands.Cog):
@@ -46,13 +253,9 @@ class ShipCog(commands.Cog):
             user1_avatar = await self.get_avatar(user1)
             user2_avatar = await self.get_avatar(user2)
             
-            # Generate ship image
-            ship_image = await self.create_ship_image(user1_avatar, user2_avatar, compatibility)
-            
-            # Save to BytesIO
-            image_buffer = io.BytesIO()
-            ship_image.save(image_buffer, format='PNG')
-            image_buffer.seek(0)
+            # Generate ship image on the render pool
+            png = await self.bot.render.run('ship', render_ship, user1_avatar, user2_avatar, compatibility)
+            image_buffer = io.BytesIO(png)
             
             # Create embed
             embed = discord.Embed(
@@ -99,213 +302,12 @@ class ShipCog(commands.Cog):
         random.seed()
         return compatibility
     
-    async def get_avatar(self, user: discord.Member):
-        """Download user's avatar"""
-        avatar_url = user.display_avatar.url
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(avatar_url) as response:
-                if response.status == 200:
-                    data = await response.read()
-                    return Image.open(io.BytesIO(data)).convert('RGBA')
-                else:
-                    raise Exception(f"Failed to download avatar for {user.display_name}")
-    
-    async def create_ship_image(self, avatar1: Image.Image, avatar2: Image.Image, compatibility: int):
-        """Create the ship image with two avatars and a heart"""
-        # Image dimensions - made narrower to bring avatars closer
-        width = 600
-        height = 400
-        avatar_size = 180
-        
-        # Create base image with gradient background
-        image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-        
-        # Create gradient background
-        gradient = self.create_gradient_background(width, height, compatibility)
-        image.paste(gradient, (0, 0))
-        
-        # Resize and make avatars circular
-        avatar1 = self.make_circular(avatar1.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS))
-        avatar2 = self.make_circular(avatar2.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS))
-        
-        # Calculate positions - closer together
-        avatar1_x = 30
-        avatar2_x = width - avatar_size - 30
-        avatar_y = (height - avatar_size) // 2 + 30
-        
-        # Paste avatars
-        image.paste(avatar1, (avatar1_x, avatar_y), avatar1)
-        image.paste(avatar2, (avatar2_x, avatar_y), avatar2)
-        
-        # Add plus symbol in the middle
-        plus = self.create_plus(100, 100)
-        plus_x = (width - 100) // 2
-        plus_y = (height - 100) // 2 + 30
-        image.paste(plus, (plus_x, plus_y), plus)
-        
-        # Add compatibility percentage at the top
-        draw = ImageDraw.Draw(image)
-        
-        # Try to load a font, fall back to default if not available
-        font_large = None
-        font_small = None
-        
-        # Try multiple common font paths for different operating systems
-        font_paths = [
-            "arial.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-            "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
-            "/System/Library/Fonts/Helvetica.ttc",
-            "C:\\Windows\\Fonts\\arial.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        ]
-        
-        for font_path in font_paths:
-            try:
-                font_large = ImageFont.truetype(font_path, 80)
-                font_small = ImageFont.truetype(font_path, 40)
-                break
-            except:
-                continue
-        
-        # If no font found, use default
-        if font_large is None:
-            font_large = ImageFont.load_default()
-            font_small = ImageFont.load_default()
-        
-        # Draw compatibility percentage
-        percentage_text = f"{compatibility}%"
-        
-        # Get text bounding box for centering
-        bbox = draw.textbbox((0, 0), percentage_text, font=font_large)
-        text_width = bbox[2] - bbox[0]
-        text_x = (width - text_width) // 2
-        
-        # Draw text with outline for better visibility
-        outline_color = (0, 0, 0, 255)
-        text_color = (255, 255, 255, 255)
-        
-        # Draw outline
-        for offset_x in [-2, 0, 2]:
-            for offset_y in [-2, 0, 2]:
-                draw.text((text_x + offset_x, 30 + offset_y), percentage_text, font=font_large, fill=outline_color)
-        
-        # Draw main text
-        draw.text((text_x, 30), percentage_text, font=font_large, fill=text_color)
-        
-        return image
-    
-    def create_gradient_background(self, width: int, height: int, compatibility: int):
-        """Create a gradient background based on compatibility"""
-        image = Image.new('RGBA', (width, height))
-        draw = ImageDraw.Draw(image)
-        
-        # Choose colors based on compatibility
-        if compatibility >= 75:
-            color1 = (255, 105, 180)  # Hot pink
-            color2 = (255, 20, 147)   # Deep pink
-        elif compatibility >= 50:
-            color1 = (255, 182, 193)  # Light pink
-            color2 = (255, 105, 180)  # Hot pink
-        elif compatibility >= 25:
-            color1 = (173, 216, 230)  # Light blue
-            color2 = (255, 182, 193)  # Light pink
-        else:
-            color1 = (128, 128, 128)  # Gray
-            color2 = (169, 169, 169)  # Dark gray
-        
-        # Create gradient
-        for y in range(height):
-            ratio = y / height
-            r = int(color1[0] * (1 - ratio) + color2[0] * ratio)
-            g = int(color1[1] * (1 - ratio) + color2[1] * ratio)
-            b = int(color1[2] * (1 - ratio) + color2[2] * ratio)
-            draw.line([(0, y), (width, y)], fill=(r, g, b, 255))
-        
-        return image
-    
-    def make_circular(self, image: Image.Image):
-        """Make an image circular"""
-        size = image.size
-        mask = Image.new('L', size, 0)
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse((0, 0) + size, fill=255)
-        
-        output = Image.new('RGBA', size, (0, 0, 0, 0))
-        output.paste(image, (0, 0))
-        output.putalpha(mask)
-        
-        return output
-    
-    def create_plus(self, width: int, height: int):
-        """Create a nice-looking plus symbol"""
-        image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(image)
-        
-        # Plus color (pink/magenta)
-        color = (255, 255, 255, 255)  # White
-        outline_color = (255, 20, 147, 255)  # Deep pink
-        shadow_color = (0, 0, 0, 80)  # Semi-transparent black for shadow
-        
-        center_x = width // 2
-        center_y = height // 2
-        
-        # Plus dimensions - rounded ends
-        plus_thickness = int(width * 0.25)
-        plus_length = int(width * 0.8)
-        
-        # Calculate corner radius for rounded rectangles
-        corner_radius = plus_thickness // 2
-        
-        # Draw shadow (offset slightly)
-        shadow_offset = 3
-        
-        # Horizontal bar shadow
-        draw.rounded_rectangle(
-            [center_x - plus_length // 2 + shadow_offset, 
-             center_y - plus_thickness // 2 + shadow_offset,
-             center_x + plus_length // 2 + shadow_offset, 
-             center_y + plus_thickness // 2 + shadow_offset],
-            radius=corner_radius,
-            fill=shadow_color
-        )
-        
-        # Vertical bar shadow
-        draw.rounded_rectangle(
-            [center_x - plus_thickness // 2 + shadow_offset, 
-             center_y - plus_length // 2 + shadow_offset,
-             center_x + plus_thickness // 2 + shadow_offset, 
-             center_y + plus_length // 2 + shadow_offset],
-            radius=corner_radius,
-            fill=shadow_color
-        )
-        
-        # Draw horizontal bar (with outline)
-        draw.rounded_rectangle(
-            [center_x - plus_length // 2, 
-             center_y - plus_thickness // 2,
-             center_x + plus_length // 2, 
-             center_y + plus_thickness // 2],
-            radius=corner_radius,
-            fill=color,
-            outline=outline_color,
-            width=3
-        )
-        
-        # Draw vertical bar (with outline)
-        draw.rounded_rectangle(
-            [center_x - plus_thickness // 2, 
-             center_y - plus_length // 2,
-             center_x + plus_thickness // 2, 
-             center_y + plus_length // 2],
-            radius=corner_radius,
-            fill=color,
-            outline=outline_color,
-            width=3
-        )
-        
-        return image
+    async def get_avatar(self, user: discord.Member) -> bytes:
+        """Download user's avatar (image bytes)"""
+        try:
+            return await self.bot.http_client.avatar_bytes(user.display_avatar)
+        except Exception as e:
+            raise Exception(f"Failed to download avatar for {user.display_name}") from e
     
     def get_color_from_compatibility(self, compatibility: int):
         """Get embed color based on compatibility"""
@@ -1,33 +1,147 @@
+import functools
 import io
 import random
-from typing import Optional
+from typing import List, Optional
 import discord
 from discord.ext import commands
 from discord import app_commands
-from PIL import Image, ImageDraw, ImageFont # type: ignore
+from tictactoe_engine import DIFFICULTIES, bot_move, lookup, play
 
 
-def _generate_empty_board_image(width: int = 600, height: int = 600) -> io.BytesIO:
+# Board image geometry and colours
+BOARD_SIZE = 600
+BOARD_PAD = 20
+GRID_COLOR = (220, 220, 220)
+# Colors: green for X, red for O
+MARK_COLORS = {'X': (50, 205, 50), 'O': (220, 20, 60)}
+# Encoded boards kept in memory, keyed by position and winning line (there are 5478 reachable positions)
+BOARD_PNG_CACHE_SIZE = 1024
+
+
+def _draw_empty_board(width: int = BOARD_SIZE, height: int = BOARD_SIZE) -> 'Image.Image':
+    from PIL import Image, ImageDraw
 
     img = Image.new('RGBA', (width, height), (30, 30, 30, 255))
     draw = ImageDraw.Draw(img)
     # draw border
-    pad = 20
-    draw.rectangle([pad, pad, width - pad, height - pad], outline=(220, 220, 220), width=4)
+    pad = BOARD_PAD
+    draw.rectangle([pad, pad, width - pad, height - pad], outline=GRID_COLOR, width=4)
     # draw 2 vertical and 2 horizontal lines to make 3x3
     # vertical positions
     third_w = (width - 2 * pad) / 3
     third_h = (height - 2 * pad) / 3
     for i in range(1, 3):
         x = pad + i * third_w
-        draw.line([(x, pad), (x, height - pad)], fill=(220, 220, 220), width=6)
+        draw.line([(x, pad), (x, height - pad)], fill=GRID_COLOR, width=6)
         y = pad + i * third_h
-        draw.line([(pad, y), (width - pad, y)], fill=(220, 220, 220), width=6)
-
-    bio = io.BytesIO()
-    img.save(bio, 'PNG')
-    bio.seek(0)
-    return bio
+        draw.line([(pad, y), (width - pad, y)], fill=GRID_COLOR, width=6)
+
+    return img
+
+
+@functools.lru_cache(maxsize=1)
+def _empty_board() -> 'Image.Image':
+    """The empty grid, drawn once per process. Shared: copy it before drawing on it."""
+    # The background is opaque, so RGB loses nothing
+    return _draw_empty_board().convert('RGB')
+
+
+def _generate_empty_board_image() -> io.BytesIO:
+    return io.BytesIO(_render_cached((None,) * 9, None))
+
+
+_THIRD = (BOARD_SIZE - 2 * BOARD_PAD) / 3
+_STROKE = max(3, int(_THIRD * 0.12))
+
+
+@functools.lru_cache(maxsize=None)
+def _mark_sprite(mark: str, index: int):
+    """(sprite, position) of mark drawn in cell index, with room for the stroke around the cell box."""
+    from PIL import Image, ImageDraw
+    col = index % 3
+    row = index // 3
+    # calculate cell box
+    x0 = int(BOARD_PAD + col * _THIRD + _THIRD * 0.12)
+    y0 = int(BOARD_PAD + row * _THIRD + _THIRD * 0.12)
+    x1 = int(BOARD_PAD + (col + 1) * _THIRD - _THIRD * 0.12)
+    y1 = int(BOARD_PAD + (row + 1) * _THIRD - _THIRD * 0.12)
+    # Thick lines spill past their end points; keep a stroke-wide margin
+    margin = _STROKE
+    sprite = Image.new('RGBA', (x1 - x0 + 2 * margin + 1, y1 - y0 + 2 * margin + 1), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(sprite)
+    left, top, right, bottom = margin, margin, margin + x1 - x0, margin + y1 - y0
+    color = MARK_COLORS[mark]
+    if mark == 'X':
+        # draw two diagonal lines in green
+        draw.line([(left, top), (right, bottom)], fill=color, width=_STROKE)
+        draw.line([(left, bottom), (right, top)], fill=color, width=_STROKE)
+    else:
+        # draw an O as an ellipse outline in red
+        draw.ellipse([(left, top), (right, bottom)], outline=color, width=_STROKE)
+    return sprite, (x0 - margin, y0 - margin)
+
+
+@functools.lru_cache(maxsize=None)
+def _line_sprite(combo: tuple, mark: str):
+    """(sprite, position) of the line drawn across a winning combo, cropped to the line."""
+    from PIL import Image, ImageDraw
+    a_idx, b_idx, c_idx = combo
+
+    def cell_center(index):
+        col = index % 3
+        row = index // 3
+        cx = int(BOARD_PAD + col * _THIRD + _THIRD / 2)
+        cy = int(BOARD_PAD + row * _THIRD + _THIRD / 2)
+        return (cx, cy)
+
+    p1 = cell_center(a_idx)
+    p3 = cell_center(c_idx)
+
+    # extend the line a bit beyond the centers so it covers the full cell region
+    dx = p3[0] - p1[0]
+    dy = p3[1] - p1[1]
+    dist = (dx * dx + dy * dy) ** 0.5 or 1.0
+    nx = dx / dist
+    ny = dy / dist
+    ext = _THIRD * 0.35
+    start = (int(p1[0] - nx * ext), int(p1[1] - ny * ext))
+    end = (int(p3[0] + nx * ext), int(p3[1] + ny * ext))
+
+    overlay = Image.new('RGBA', (BOARD_SIZE, BOARD_SIZE), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    # draw a bold black outline first, then the colored line for contrast
+    outline_width = max(8, int(_STROKE * 1.8))
+    core_width = max(4, int(_STROKE * 1.1))
+    draw.line([start, end], fill=(0, 0, 0), width=outline_width)
+    draw.line([start, end], fill=MARK_COLORS[mark], width=core_width)
+    box = overlay.getbbox()
+    return overlay.crop(box), box[:2]
+
+
+@functools.lru_cache(maxsize=BOARD_PNG_CACHE_SIZE)
+def _render_cached(board: tuple, combo: Optional[tuple]) -> bytes:
+    img = _empty_board().copy()
+    for idx, mark in enumerate(board):
+        if mark is not None:
+            sprite, position = _mark_sprite(mark, idx)
+            img.paste(sprite, position, sprite)
+
+    # If there's a winner, draw a connecting line across the three winning cells
+    if combo:
+        # determine winner mark from board (safer than outer "winner")
+        sprite, position = _line_sprite(tuple(combo), board[combo[0]])
+        img.paste(sprite, position, sprite)
+
+    # write image to bytes
+    out = io.BytesIO()
+    img.save(out, 'PNG')
+    return out.getvalue()
+
+
+def render_board(board: List[Optional[str]], combo) -> bytes:
+    """Render a Tic-Tac-Toe position (9 cells of 'X', 'O' or None) as PNG bytes."""
+    # Positions recur across games, so most renders are a cache hit
+    return _render_cached(tuple(board), tuple(combo) if combo else None)
 
 
 class ChallengeView(discord.ui.View):
@@ -46,7 +160,7 @@ class ChallengeView(discord.ui.View):
         await interaction.response.edit_message(content=f"**{self.opponent.display_name}** accepted the challenge! Starting game...", view=None)
         # send the board image and buttons
         try:
-            bio = _generate_empty_board_image()
+            bio = await interaction.client.render.run('tictactoe.empty', _generate_empty_board_image)
         except Exception:
             await interaction.followup.send("This command requires the Pillow library. Install it in the bot environment.")
             return
@@ -120,146 +234,142 @@ class TicTacToeButton(discord.ui.Button):
             await interaction.response.send_message("<a:warning:1424944783587147868> You're not a participant in this game.", ephemeral=True)
             return
 
+        view = self.ttt_view
+        # The turn only passes once the move has been rendered, so a second click meanwhile must be refused
+        if view.busy:
+            await interaction.response.send_message("<a:warning:1424944783587147868> Wait for the last move to finish.", ephemeral=True)
+            return
+
         # check turn
-        if user.id != self.ttt_view.current_player_id:
+        if user.id != view.current_player_id:
             await interaction.response.send_message("<a:warning:1424944783587147868> Not your turn.", ephemeral=True)
             return
 
-        symbol = self.ttt_view.current_symbol
         # update state
-        if self.ttt_view.board[self.index] is not None:
+        if view.board[self.index] is not None:
             await interaction.response.send_message("<a:warning:1424944783587147868> This cell is already taken.", ephemeral=True)
             return
 
-        self.ttt_view.board[self.index] = symbol
-        # mark button (update this UI button instance)
-        self.label = symbol
-        self.disabled = True
-        # use green for X (success) and red for O (danger)
-        self.style = discord.ButtonStyle.success if symbol == 'X' else discord.ButtonStyle.danger
+        # Set before the first await, so the move and its turn switch can't interleave with another click
+        view.busy = True
+        try:
+            view.play(self.index)
+
+            # Acknowledge the button press and we will send a followup with the updated board image
+            await interaction.response.defer()
 
-        # check win/draw
-        winner = self.ttt_view.check_winner()
+            if await view.finish_move(interaction):
+                return
+            if view.ai_symbol == view.current_symbol:
+                view.play(bot_move(view.code, view.difficulty))
+                await view.finish_move(interaction)
+        finally:
+            view.busy = False
 
-        # Acknowledge the button press and we will send a followup with the updated board image
-        await interaction.response.defer()
 
-        # regenerate the board image with current moves
+class TicTacToeView(discord.ui.View):
+    def __init__(self, player_x: discord.User, player_o: discord.User, timeout: Optional[float] = 3600,
+                 ai_symbol: Optional[str] = None, difficulty: str = 'hard'):
+        super().__init__(timeout=timeout)
+        self.player_x = player_x
+        self.player_o = player_o
+        # X always starts
+        self.current_symbol = 'X'
+        self.player_map = {'X': player_x.id, 'O': player_o.id}
+        self.board = [None] * 9
+        # Base-3 code of the board, for tictactoe_engine lookups
+        self.code = 0
+        # Symbol played by the bot in a single-player game (None for two players)
+        self.ai_symbol = ai_symbol
+        self.difficulty = difficulty
+        # placeholder for the single combined message (file + embed + view)
+        self.game_message = None
+        # True while a move is being played (rendered, and answered by the bot)
+        self.busy = False
+        # add 9 buttons
+        for i in range(9):
+            self.add_item(TicTacToeButton(i, self))
+
+    @property
+    def current_player_id(self):
+        return self.player_map[self.current_symbol]
+
+    def current_player_name(self):
+        return self.player_x.display_name if self.current_symbol == 'X' else self.player_o.display_name
+
+    def switch_turn(self):
+        self.current_symbol = 'O' if self.current_symbol == 'X' else 'X'
+
+    def play(self, index: int):
+        """Mark the (empty) cell index for the current player and update its button."""
+        symbol = self.current_symbol
+        self.board[index] = symbol
+        self.code = play(self.code, index, symbol)
+        for item in self.children:
+            if isinstance(item, TicTacToeButton) and item.index == index:
+                item.label = symbol
+                item.disabled = True
+                # use green for X (success) and red for O (danger)
+                item.style = discord.ButtonStyle.success if symbol == 'X' else discord.ButtonStyle.danger
+
+    def check_winner(self) -> Optional[str]:
+        return lookup(self.code).winner
+
+    def get_winning_combo(self) -> Optional[tuple]:
+        """Return the indices (a,b,c) of the winning combo or None if no winner."""
+        return lookup(self.code).line
+
+    async def finish_move(self, interaction: discord.Interaction) -> bool:
+        """Render the move just played, update the game message and announce the result. True when the game is over."""
+        # regenerate the board image with current moves on the render pool
         try:
-            bio = _generate_empty_board_image()
-            # draw X/O onto the image according to board state
-            img = Image.open(bio).convert('RGBA')
-            draw = ImageDraw.Draw(img)
-            pad = 20
-            w, h = img.size
-            third_w = (w - 2 * pad) / 3
-            third_h = (h - 2 * pad) / 3
-            # choose a font size
-            try:
-                font = ImageFont.truetype('arial.ttf', int(min(third_w, third_h) * 0.6))
-            except Exception:
-                font = ImageFont.load_default()
-
-            # Colors: green for X, red for O
-            color_x = (50, 205, 50)    # lime green
-            color_o = (220, 20, 60)    # crimson red
-            stroke = max(3, int(min(third_w, third_h) * 0.12))
-            for idx, mark in enumerate(self.ttt_view.board):
-                if mark is None:
-                    continue
-                col = idx % 3
-                row = idx // 3
-                # calculate cell box
-                x0 = int(pad + col * third_w + third_w * 0.12)
-                y0 = int(pad + row * third_h + third_h * 0.12)
-                x1 = int(pad + (col + 1) * third_w - third_w * 0.12)
-                y1 = int(pad + (row + 1) * third_h - third_h * 0.12)
-                if mark == 'X':
-                    # draw two diagonal lines in green
-                    draw.line([(x0, y0), (x1, y1)], fill=color_x, width=stroke)
-                    draw.line([(x0, y1), (x1, y0)], fill=color_x, width=stroke)
-                else:
-                    # draw an O as an ellipse outline in red
-                    # PIL's ellipse outline width supported in modern Pillow; fallback handled by width param
-                    draw.ellipse([(x0, y0), (x1, y1)], outline=color_o, width=stroke)
-
-            # If there's a winner, draw a connecting line across the three winning cells
-            combo = self.ttt_view.get_winning_combo()
-            if combo:
-                a_idx, b_idx, c_idx = combo
-                def cell_center(index):
-                    col = index % 3
-                    row = index // 3
-                    cx = int(pad + col * third_w + third_w / 2)
-                    cy = int(pad + row * third_h + third_h / 2)
-                    return (cx, cy)
-
-                p1 = cell_center(a_idx)
-                p3 = cell_center(c_idx)
-                # determine winner mark from board (safer than outer "winner")
-                mark = self.ttt_view.board[a_idx]
-                line_color = color_x if mark == 'X' else color_o
-
-                # extend the line a bit beyond the centers so it covers the full cell region
-                dx = p3[0] - p1[0]
-                dy = p3[1] - p1[1]
-                dist = (dx * dx + dy * dy) ** 0.5 or 1.0
-                nx = dx / dist
-                ny = dy / dist
-                ext = max(third_w, third_h) * 0.35
-                start = (int(p1[0] - nx * ext), int(p1[1] - ny * ext))
-                end = (int(p3[0] + nx * ext), int(p3[1] + ny * ext))
-
-                # draw a bold black outline first, then the colored line for contrast
-                outline_width = max(8, int(stroke * 1.8))
-                core_width = max(4, int(stroke * 1.1))
-                draw.line([start, end], fill=(0, 0, 0), width=outline_width)
-                draw.line([start, end], fill=line_color, width=core_width)
-
-            # write image to bytes
-            out = io.BytesIO()
-            img.save(out, 'PNG')
-            out.seek(0)
+            png = await interaction.client.render.run(
+                'tictactoe.board', render_board, list(self.board), self.get_winning_combo()
+            )
+            out = io.BytesIO(png)
         except Exception as e:
             # If Pillow is missing or something else failed, notify and continue with button labels only
             print(f"<a:warning:1424944783587147868> Failed to render board image: {e}")
             out = None
 
+        winner = self.check_winner()
+        is_draw = winner is None and all(cell is not None for cell in self.board)
+
         # disable buttons if game over or draw
-        if winner or (all(cell is not None for cell in self.ttt_view.board) and not winner):
-            for item in self.ttt_view.children:
+        if winner or is_draw:
+            for item in self.children:
                 item.disabled = True
 
         # send updated board message (edit the original single game message to keep image, embed and view together)
         if out is not None:
             file = discord.File(out, filename='board.png')
-            new_embed = discord.Embed(title=f"<a:tictactoe:1424942287070433342> Tic-Tac-Toe: {self.ttt_view.player_x.display_name} (X) vs {self.ttt_view.player_o.display_name} (O)")
+            new_embed = discord.Embed(title=f"<a:tictactoe:1424942287070433342> Tic-Tac-Toe: {self.player_x.display_name} (X) vs {self.player_o.display_name} (O)")
             # make embed reference the attachment so updated attachment is shown in the embed
             new_embed.set_image(url="attachment://board.png")
             # status line
             if winner:
                 new_embed.description = f"<a:trophy:1424944527315042415> Game over — **{winner}** wins! <a:trophy:1424944527315042415>"
-            elif all(cell is not None for cell in self.ttt_view.board):
+            elif is_draw:
                 new_embed.description = "Game over — Draw!"
             else:
                 # show the NEXT player's turn (the one who will play next), not the player who just moved
-                next_symbol = 'O' if self.ttt_view.current_symbol == 'X' else 'X'
-                next_name = self.ttt_view.player_x.display_name if next_symbol == 'X' else self.ttt_view.player_o.display_name
+                next_symbol = 'O' if self.current_symbol == 'X' else 'X'
+                next_name = self.player_x.display_name if next_symbol == 'X' else self.player_o.display_name
                 new_embed.description = f"<a:tictactoe:1424942287070433342> **{next_name}'s** turn ({next_symbol})"
 
             # Edit the original game message: replace attachment, embed and view in-place
             # Discord.py supports editing with attachments - we pass attachments=[] to clear old ones
             # and then provide the new file(s) in the edit call
             try:
-                game_msg = getattr(self.ttt_view, 'game_message', None)
+                game_msg = getattr(self, 'game_message', None)
                 if game_msg:
                     # Edit the existing message with new attachment, embed and view
                     # Use attachments=[] to clear old attachments, then pass new file via attachments parameter
-                    await game_msg.edit(attachments=[file], embed=new_embed, view=self.ttt_view)
+                    await game_msg.edit(attachments=[file], embed=new_embed, view=self)
                 else:
                     # No existing message stored; send a new combined message and keep a reference
-                    new_msg = await interaction.followup.send(file=file, embed=new_embed, view=self.ttt_view)
-                    self.ttt_view.game_message = new_msg
+                    new_msg = await interaction.followup.send(file=file, embed=new_embed, view=self)
+                    self.game_message = new_msg
             except Exception as e:
                 # log the exception to help debug why edit failed
                 try:
@@ -268,13 +378,13 @@ class TicTacToeButton(discord.ui.Button):
                     pass
                 # If edit fails, try without clearing attachments (just update embed and view)
                 try:
-                    game_msg = getattr(self.ttt_view, 'game_message', None)
+                    game_msg = getattr(self, 'game_message', None)
                     if game_msg:
                         # Keep the existing attachment, just update embed text and view
-                        await game_msg.edit(embed=new_embed, view=self.ttt_view)
+                        await game_msg.edit(embed=new_embed, view=self)
                     else:
-                        new_msg = await interaction.followup.send(file=file, embed=new_embed, view=self.ttt_view)
-                        self.ttt_view.game_message = new_msg
+                        new_msg = await interaction.followup.send(file=file, embed=new_embed, view=self)
+                        self.game_message = new_msg
                 except Exception as e2:
                     try:
                         print(f"[tictactoe] fallback embed-only edit failed: {e2}")
@@ -283,15 +393,16 @@ class TicTacToeButton(discord.ui.Button):
 
         # announce winner or draw
         if winner:
-            player_name = self.ttt_view.player_x.display_name if winner == 'X' else self.ttt_view.player_o.display_name
+            player_name = self.player_x.display_name if winner == 'X' else self.player_o.display_name
             # increment persistent win counter if available on the bot
             try:
                 bot = getattr(interaction.client, 'bot', None) or interaction.client
                 # determine winner id
-                winner_id = self.ttt_view.player_x.id if winner == 'X' else self.ttt_view.player_o.id
+                winner_id = self.player_x.id if winner == 'X' else self.player_o.id
                 # Save win to database
                 inc_fn = getattr(bot, 'increment_win_tictactoe', None)
-                if inc_fn is not None:
+                # Wins by the bot itself aren't recorded
+                if inc_fn is not None and winner != self.ai_symbol:
                     try:
                         await inc_fn(winner_id)
                     except Exception as e:
@@ -302,73 +413,32 @@ class TicTacToeButton(discord.ui.Button):
             await interaction.followup.send(f"<a:trophy:1424944527315042415> **{player_name}** ({winner}) wins! <a:trophy:1424944527315042415>")
             # disable the view to prevent more clicks and edit the game message to reflect final state
             try:
-                game_msg = getattr(self.ttt_view, 'game_message', None)
-                for item in self.ttt_view.children:
+                game_msg = getattr(self, 'game_message', None)
+                for item in self.children:
                     item.disabled = True
                 if game_msg:
-                    await game_msg.edit(view=self.ttt_view)
+                    await game_msg.edit(view=self)
             except Exception:
                 pass
-            self.ttt_view.stop()
-            return
+            self.stop()
+            return True
 
-        if all(cell is not None for cell in self.ttt_view.board) and not winner:
+        if is_draw:
             await interaction.followup.send("<a:tictactoe:1424942287070433342> It's a draw!")
             try:
-                game_msg = getattr(self.ttt_view, 'game_message', None)
-                for item in self.ttt_view.children:
+                game_msg = getattr(self, 'game_message', None)
+                for item in self.children:
                     item.disabled = True
                 if game_msg:
-                    await game_msg.edit(view=self.ttt_view)
+                    await game_msg.edit(view=self)
             except Exception:
                 pass
-            self.ttt_view.stop()
-            return
+            self.stop()
+            return True
 
         # switch player
-        self.ttt_view.switch_turn()
-        # Optionally send a short followup to indicate next player's turn (we already updated embed description)
-
-
-class TicTacToeView(discord.ui.View):
-    def __init__(self, player_x: discord.User, player_o: discord.User, timeout: Optional[float] = 3600):
-        super().__init__(timeout=timeout)
-        self.player_x = player_x
-        self.player_o = player_o
-        # X always starts
-        self.current_symbol = 'X'
-        self.player_map = {'X': player_x.id, 'O': player_o.id}
-        self.board = [None] * 9
-        # placeholder for the single combined message (file + embed + view)
-        self.game_message = None
-        # add 9 buttons
-        for i in range(9):
-            self.add_item(TicTacToeButton(i, self))
-
-    @property
-    def current_player_id(self):
-        return self.player_map[self.current_symbol]
-
-    def current_player_name(self):
-        return self.player_x.display_name if self.current_symbol == 'X' else self.player_o.display_name
-
-    def switch_turn(self):
-        self.current_symbol = 'O' if self.current_symbol == 'X' else 'X'
-
-    def check_winner(self) -> Optional[str]:
-        combos = [(0,1,2),(3,4,5),(6,7,8),(0,3,6),(1,4,7),(2,5,8),(0,4,8),(2,4,6)]
-        for a, b_idx, c in combos:
-            if self.board[a] and self.board[a] == self.board[b_idx] == self.board[c]:
-                return self.board[a]
-        return None
-
-    def get_winning_combo(self) -> Optional[tuple]:
-        """Return the indices (a,b,c) of the winning combo or None if no winner."""
-        combos = [(0,1,2),(3,4,5),(6,7,8),(0,3,6),(1,4,7),(2,5,8),(0,4,8),(2,4,6)]
-        for a,b_idx,c in combos:
-            if self.board[a] and self.board[a] == self.board[b_idx] == self.board[c]:
-                return (a, b_idx, c)
-        return None
+        self.switch_turn()
+        return False
 
 
 class TicTacToeCog(commands.Cog):
@@ -376,13 +446,22 @@ class TicTacToeCog(commands.Cog):
         self.bot = bot
 
     @app_commands.command(name='tictactoe', description='Challenge someone to a Tic-Tac-Toe match')
-    @app_commands.describe(opponent='User to challenge')
-    async def tictactoe(self, interaction: discord.Interaction, opponent: discord.User):
+    @app_commands.describe(
+        opponent='User to challenge (pick the bot to play against it)',
+        difficulty='How well the bot plays, when playing against the bot'
+    )
+    @app_commands.choices(difficulty=[app_commands.Choice(name=level.title(), value=level) for level in DIFFICULTIES])
+    async def tictactoe(self, interaction: discord.Interaction, opponent: discord.User,
+                        difficulty: Optional[app_commands.Choice[str]] = None):
         challenger = interaction.user
         if opponent.id == challenger.id:
             await interaction.response.send_message("<a:warning:1424944783587147868> You can't challenge yourself.", ephemeral=True)
             return
 
+        if opponent.id == interaction.client.user.id:
+            await self.start_ai_game(interaction, difficulty.value if difficulty else 'medium')
+            return
+
         view = ChallengeView(challenger, opponent)
         try:
             await interaction.response.send_message(f"<a:tictactoe:1424942287070433342> {opponent.mention}, **{challenger.display_name}** is requesting a Tic-Tac-Toe battle!", view=view)
@@ -411,6 +490,31 @@ class TicTacToeCog(commands.Cog):
                 except Exception:
                     pass
 
+    async def start_ai_game(self, interaction: discord.Interaction, difficulty: str):
+        """Single-player game against the bot; who plays X (and moves first) is random, as in a challenge."""
+        await interaction.response.defer()
+        try:
+            bio = await interaction.client.render.run('tictactoe.empty', _generate_empty_board_image)
+        except Exception:
+            await interaction.followup.send("This command requires the Pillow library. Install it in the bot environment.")
+            return
+
+        human, bot_user = interaction.user, interaction.client.user
+        if random.choice([True, False]):
+            view = TicTacToeView(human, bot_user, ai_symbol='O', difficulty=difficulty)
+        else:
+            view = TicTacToeView(bot_user, human, ai_symbol='X', difficulty=difficulty)
+        player_x, player_o = view.player_x, view.player_o
+
+        status_embed = discord.Embed(title=f"<a:tictactoe:1424942287070433342> Tic-Tac-Toe: **{player_x.display_name}** (X) vs **{player_o.display_name}** (O) — {difficulty.title()}")
+        status_embed.description = f"{player_x.display_name}'s turn (X)"
+        status_embed.set_image(url="attachment://board.png")
+        view.game_message = await interaction.followup.send(file=discord.File(bio, filename='board.png'), embed=status_embed, view=view)
+
+        if view.ai_symbol == view.current_symbol:
+            view.play(bot_move(view.code, view.difficulty))
+            await view.finish_move(interaction)
+
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(TicTacToeCog(bot))
@@ -0,0 +1,93 @@
+"""
+Tic-Tac-Toe positions as base-3 codes, with every reachable position solved at import.
+
+A board of 9 cells ('X', 'O' or None, row by row) is encoded as sum(value * 3**index)
+with empty = 0, X = 1, O = 2, so playing a move is one addition. At import the game tree
+is walked once from the empty board (5478 reachable positions) and each position's winner,
+winning line and best moves are stored. After that the view's win checks and the bot's
+moves are dictionary lookups.
+"""
+import random
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+LINES = ((0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6))
+MARK_VALUES = {'X': 1, 'O': 2}
+POW3 = tuple(3 ** index for index in range(9))
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+# Chance the bot plays a best move on each difficulty (otherwise any legal move)
+BEST_MOVE_CHANCE = {'easy': 0.0, 'medium': 0.6, 'hard': 1.0}
+
+
+class Position(NamedTuple):
+    winner: Optional[str]
+    line: Optional[Tuple[int, int, int]]
+    # For the player to move: > 0 wins, 0 draws, < 0 loses with best play (sooner results are larger)
+    score: int
+    # Cells that achieve score (empty once the game is over)
+    best_moves: Tuple[int, ...]
+    legal_moves: Tuple[int, ...]
+
+
+def encode(board: List[Optional[str]]) -> int:
+    return sum(MARK_VALUES[mark] * POW3[index] for index, mark in enumerate(board) if mark is not None)
+
+
+def play(code: int, index: int, mark: str) -> int:
+    """Code of the position after mark is played on the (empty) cell index."""
+    return code + MARK_VALUES[mark] * POW3[index]
+
+
+def _cells(code: int) -> List[int]:
+    cells = []
+    for _ in range(9):
+        code, value = divmod(code, 3)
+        cells.append(value)
+    return cells
+
+
+def _solve(code: int, table: Dict[int, Position]) -> int:
+    if code in table:
+        return table[code].score
+    cells = _cells(code)
+    empty = tuple(index for index, value in enumerate(cells) if value == 0)
+    for line in LINES:
+        value = cells[line[0]]
+        if value and value == cells[line[1]] == cells[line[2]]:
+            # The previous player just won; losing later is better for the player to move
+            score = -(len(empty) + 1)
+            table[code] = Position('X' if value == 1 else 'O', line, score, (), ())
+            return score
+    if not empty:
+        table[code] = Position(None, None, 0, (), ())
+        return 0
+
+    value = 1 if len(empty) % 2 == 1 else 2  # X moves when an odd number of cells is empty
+    scores = {index: -_solve(code + value * POW3[index], table) for index in empty}
+    score = max(scores.values())
+    best = tuple(index for index in empty if scores[index] == score)
+    table[code] = Position(None, None, score, best, empty)
+    return score
+
+
+def _build_table() -> Dict[int, Position]:
+    table: Dict[int, Position] = {}
+    _solve(0, table)
+    return table
+
+
+TABLE = _build_table()
+
+
+def lookup(code: int) -> Position:
+    return TABLE[code]
+
+
+def bot_move(code: int, difficulty: str = 'hard', rng: random.Random = random) -> int:
+    """Cell for the player to move, as played by the bot on the given difficulty."""
+    position = TABLE[code]
+    if not position.legal_moves:
+        raise ValueError("The game is already over")
+    if rng.random() < BEST_MOVE_CHANCE.get(difficulty, 1.0):
+        return rng.choice(position.best_moves)
+    return rng.choice(position.legal_moves)
@@ -5,6 +5,7 @@ from datetime import datetime
 import pytz
 import json
 import os
+from database import TIMECHANNEL_FEATURE
 
 # Map of city names to their timezones (using pytz timezone names)
 CITY_TIMEZONES = {
@@ -76,11 +77,13 @@ CLOCK_EMOJIS = {
 class TimeChannelCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.db = getattr(bot, 'db', None)
         # Dictionary to store {message_id: {'channel_id': int, 'guild_id': int, 'cities': [str]}}
         self.time_messages = {}
         self.config_file = os.path.join(os.path.dirname(__file__), 'timechannel_config.json')
-        # Load saved time messages
-        self.load_config()
+        self._config_loaded = False
+        # Load saved time messages once the database is ready
+        self.bot.loop.create_task(self._delayed_load_config())
         # Start the update loop
         self.update_time_messages.start()
     
@@ -148,8 +151,8 @@ class TimeChannelCog(commands.Cog):
                 'cities': unique_cities
             }
             
-            # Save to file
-            self.save_config()
+            # Save to database
+            await self.save_time_message(message.id)
             
             print(f"[timechannel] Created time display for {len(unique_cities)} cities in guild {interaction.guild.name}")
             
@@ -232,8 +235,7 @@ class TimeChannelCog(commands.Cog):
         # Remove messages that no longer exist
         if messages_to_remove:
             for message_id in messages_to_remove:
-                del self.time_messages[message_id]
-            self.save_config()
+                await self.remove_time_message(message_id)
             print(f"[timechannel] Removed {len(messages_to_remove)} deleted message(s)")
     
     @update_time_messages.before_loop
@@ -256,8 +258,54 @@ class TimeChannelCog(commands.Cog):
         """Handle errors in the update loop and keep it running"""
         print(f"[timechannel] Error in update loop: {error}")
     
-    def load_config(self):
-        """Load time message configuration from file"""
+    async def _delayed_load_config(self):
+        """Wait for database to be ready, then load config"""
+        import asyncio
+        
+        # Wait for bot to be ready
+        await self.bot.wait_until_ready()
+        
+        # Give database a moment to connect
+        for attempt in range(10):
+            await asyncio.sleep(0.5)
+            
+            # Re-get the database reference
+            self.db = getattr(self.bot, 'db', None)
+            
+            if self.db and (self.db.is_postgres or self.db.is_sqlite):
+                print(f"[timechannel] Database ready, loading config (attempt {attempt + 1})")
+                await self.load_config()
+                self._config_loaded = True
+                return
+            else:
+                print(f"[timechannel] Database not ready yet, retrying... (attempt {attempt + 1}/10)")
+        
+        print("[timechannel] ❌ Database not available after 10 attempts, trying file fallback")
+        self.load_config_from_file()
+    
+    async def load_config(self):
+        """Load time message configuration from database"""
+        try:
+            rows = await self.db.get_guild_configs(TIMECHANNEL_FEATURE)
+            if not rows and os.path.isfile(self.config_file):
+                # One-shot import of the legacy JSON file into per-guild rows
+                with open(self.config_file, 'r') as f:
+                    data = json.load(f)
+                count = await self.db.import_legacy_config('timechannel_config', data)
+                os.replace(self.config_file, self.config_file + '.migrated')
+                print(f"[timechannel] Imported {count} time message(s) from {os.path.basename(self.config_file)}")
+                rows = await self.db.get_guild_configs(TIMECHANNEL_FEATURE)
+            
+            # One row per time message, keyed by (guild_id, message_id)
+            self.time_messages = {message_id: info for (_, message_id), info in rows.items()}
+            if self.time_messages:
+                print(f"[timechannel] Loaded {len(self.time_messages)} time message(s) from database")
+        except Exception as e:
+            print(f"[timechannel] Error loading config from database: {e}")
+            self.load_config_from_file()
+    
+    def load_config_from_file(self):
+        """Load time message configuration from file (fallback)"""
         try:
             if os.path.isfile(self.config_file):
                 with open(self.config_file, 'r') as f:
@@ -277,13 +325,43 @@ class TimeChannelCog(commands.Cog):
                     # If we filtered out invalid entries, save the cleaned config
                     if len(valid_messages) != len(data):
                         print(f"[timechannel] Cleaned up {len(data) - len(valid_messages)} invalid entry(ies)")
-                        self.save_config()
+                        self.save_config_to_file()
         except Exception as e:
             print(f"[timechannel] Error loading config: {e}")
             self.time_messages = {}
     
-    def save_config(self):
-        """Save time message configuration to file"""
+    async def save_time_message(self, message_id: int):
+        """Save a single time message's row to the database"""
+        info = self.time_messages.get(message_id)
+        if info is None:
+            return
+        
+        if self.db and (self.db.is_postgres or self.db.is_sqlite):
+            try:
+                await self.db.put_guild_config(TIMECHANNEL_FEATURE, info.get('guild_id', 0), info, entity_id=message_id)
+                return
+            except Exception as e:
+                print(f"[timechannel] Error saving message {message_id} to database: {e}, falling back to file")
+        
+        self.save_config_to_file()
+    
+    async def remove_time_message(self, message_id: int):
+        """Forget a time message and delete its row from the database"""
+        info = self.time_messages.pop(message_id, None)
+        if info is None:
+            return
+        
+        if self.db and (self.db.is_postgres or self.db.is_sqlite):
+            try:
+                await self.db.delete_guild_config(TIMECHANNEL_FEATURE, info.get('guild_id', 0), entity_id=message_id)
+                return
+            except Exception as e:
+                print(f"[timechannel] Error removing message {message_id} from database: {e}, falling back to file")
+        
+        self.save_config_to_file()
+    
+    def save_config_to_file(self):
+        """Save time message configuration to file (fallback)"""
         try:
             # Convert integer keys to strings for JSON
             data = {str(k): v for k, v in self.time_messages.items()}
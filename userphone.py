@@ -0,0 +1,477 @@
+"""
+Userphone call state and message relay.
+
+CallRegistry holds the waiting queue and active calls, indexed for O(1) lookups:
+on_message checks every message the bot sees against it, so the per-message path
+is a single dict lookup by channel ID. MessageRelay delivers the relayed lines.
+"""
+import asyncio
+import itertools
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+
+# CallRegistry.dial results
+DIAL_IN_CALL = 'in_call'
+DIAL_WAITING = 'waiting'
+DIAL_BUSY = 'busy'
+DIAL_QUEUED = 'queued'
+DIAL_CONNECTED = 'connected'
+
+# CallRegistry.hang_up results
+HANGUP_ENDED = 'ended'
+HANGUP_LEFT_QUEUE = 'left_queue'
+HANGUP_NOT_INITIATOR = 'not_initiator'
+HANGUP_NONE = 'none'
+
+
+class CallSide:
+    """One end of a call: the user who started it and the channel they started it in."""
+    __slots__ = ('user_id', 'channel')
+
+    def __init__(self, user_id: int, channel):
+        self.user_id = user_id
+        self.channel = channel
+
+
+class Call:
+    """Two connected channels."""
+    __slots__ = ('sides', 'started_at')
+
+    def __init__(self, first: CallSide, second: CallSide):
+        self.sides = (first, second)
+        self.started_at = time.monotonic()
+
+    def side_for_channel(self, channel_id: int) -> Optional[CallSide]:
+        for side in self.sides:
+            if side.channel.id == channel_id:
+                return side
+        return None
+
+    def side_for_user(self, user_id: int) -> Optional[CallSide]:
+        for side in self.sides:
+            if side.user_id == user_id:
+                return side
+        return None
+
+    def other(self, side: CallSide) -> CallSide:
+        return self.sides[1] if side is self.sides[0] else self.sides[0]
+
+
+class CallRegistry:
+    """Waiting queue plus active calls, indexed by user ID and by channel ID."""
+
+    def __init__(self):
+        # FIFO of (ticket, user_id, channel); entries whose ticket no longer matches
+        # _waiting are stale (the user left the queue) and are skipped when pairing
+        self._queue: deque = deque()
+        self._waiting: Dict[int, Tuple[int, object]] = {}
+        self._tickets = itertools.count()
+        self._calls_by_user: Dict[int, Call] = {}
+        self._calls_by_channel: Dict[int, Call] = {}
+
+    # Lookups
+
+    def call_for_channel(self, channel_id: int) -> Optional[Call]:
+        """The call a channel belongs to, if any (the hot path for message relay)."""
+        return self._calls_by_channel.get(channel_id)
+
+    def call_for_user(self, user_id: int) -> Optional[Call]:
+        return self._calls_by_user.get(user_id)
+
+    def is_waiting(self, user_id: int) -> bool:
+        return user_id in self._waiting
+
+    def channel_busy(self, channel_id: int) -> bool:
+        """True if the channel is in a call or has someone waiting in it."""
+        if channel_id in self._calls_by_channel:
+            return True
+        return any(channel.id == channel_id for _, channel in self._waiting.values())
+
+    def initiator(self, channel_id: int) -> Optional[int]:
+        """The user who started the call (or is waiting) in a channel."""
+        call = self._calls_by_channel.get(channel_id)
+        if call is not None:
+            return call.side_for_channel(channel_id).user_id
+        for user_id, (_, channel) in self._waiting.items():
+            if channel.id == channel_id:
+                return user_id
+        return None
+
+    @property
+    def waiting_count(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def call_count(self) -> int:
+        return len(self._calls_by_user) // 2
+
+    def active_calls(self) -> List[Call]:
+        """Every active call, once each."""
+        return list({id(call): call for call in self._calls_by_user.values()}.values())
+
+    # Queue
+
+    def enqueue(self, user_id: int, channel):
+        """Add a user to the back of the waiting queue."""
+        ticket = next(self._tickets)
+        self._waiting[user_id] = (ticket, channel)
+        self._queue.append((ticket, user_id, channel))
+
+    def leave_queue(self, user_id: int):
+        """Remove a waiting user. Returns the channel they were waiting in, or None."""
+        entry = self._waiting.pop(user_id, None)
+        # The deque entry is left in place and skipped as stale when it reaches the front;
+        # compact only if stale entries start to dominate
+        if len(self._queue) > 2 * len(self._waiting) + 32:
+            self._queue = deque(
+                item for item in self._queue
+                if self._waiting.get(item[1], (None,))[0] == item[0]
+            )
+        return entry[1] if entry else None
+
+    def _pop_waiting(self) -> Optional[CallSide]:
+        while self._queue:
+            ticket, user_id, channel = self._queue.popleft()
+            entry = self._waiting.get(user_id)
+            if entry is not None and entry[0] == ticket:
+                del self._waiting[user_id]
+                return CallSide(user_id, channel)
+        return None
+
+    def try_pair(self) -> Optional[Call]:
+        """Connect the two longest-waiting users, if there are two."""
+        if len(self._waiting) < 2:
+            return None
+        call = Call(self._pop_waiting(), self._pop_waiting())
+        self.attach(call)
+        return call
+
+    # Calls
+
+    def attach(self, call: Call):
+        """Index a call (also used to mirror calls paired elsewhere, e.g. by the cluster hub)."""
+        for side in call.sides:
+            self._calls_by_user[side.user_id] = call
+            self._calls_by_channel[side.channel.id] = call
+
+    def end_call(self, user_id: int) -> Optional[Call]:
+        """End the call a user is in. Returns the ended call, or None."""
+        call = self._calls_by_user.get(user_id)
+        if call is None:
+            return None
+        for side in call.sides:
+            self._calls_by_user.pop(side.user_id, None)
+            if self._calls_by_channel.get(side.channel.id) is call:
+                del self._calls_by_channel[side.channel.id]
+        return call
+
+    # Commands
+
+    def dial(self, user_id: int, channel) -> Tuple[str, Optional[Call]]:
+        """
+        /userphone: queue a user and pair if possible.
+
+        Returns (status, call): DIAL_IN_CALL, DIAL_WAITING or DIAL_BUSY when refused,
+        otherwise DIAL_QUEUED, or DIAL_CONNECTED with the new call.
+        """
+        if user_id in self._calls_by_user:
+            return DIAL_IN_CALL, None
+        if user_id in self._waiting:
+            return DIAL_WAITING, None
+        if self.channel_busy(channel.id):
+            return DIAL_BUSY, None
+        self.enqueue(user_id, channel)
+        call = self.try_pair()
+        return (DIAL_CONNECTED, call) if call else (DIAL_QUEUED, None)
+
+    def hang_up(self, user_id: int, channel_id: int) -> Tuple[str, object]:
+        """
+        /hangup: end the user's call (only its initiator may) or take them out of the queue.
+
+        Returns (HANGUP_ENDED, call), (HANGUP_LEFT_QUEUE, channel),
+        (HANGUP_NOT_INITIATOR, None) or (HANGUP_NONE, None).
+        """
+        if user_id in self._calls_by_user:
+            initiator_id = self.initiator(channel_id)
+            if initiator_id is not None and user_id != initiator_id:
+                return HANGUP_NOT_INITIATOR, None
+            return HANGUP_ENDED, self.end_call(user_id)
+        channel = self.leave_queue(user_id)
+        if channel is not None:
+            return HANGUP_LEFT_QUEUE, channel
+        return HANGUP_NONE, None
+
+
+# Message relay
+
+# Maximum relayed lines waiting per destination channel before new ones are dropped
+RELAY_QUEUE_SIZE = 50
+# Maximum queued lines folded into one delivery when a channel backs up
+RELAY_COALESCE_MAX = 20
+# Seconds a channel's relay worker waits for new lines before exiting
+RELAY_IDLE_TIMEOUT = 60.0
+# Discord message length limit
+MESSAGE_LIMIT = 2000
+# Name of the webhook the relay creates in destination channels
+RELAY_WEBHOOK_NAME = 'Nightshade Userphone'
+# Maximum number of channels whose webhook (or lack of one) is remembered
+RELAY_WEBHOOK_CACHE_SIZE = 1024
+# Words Discord refuses in webhook usernames
+_RESERVED_NAME_RE = re.compile(r'discord|clyde|everyone|here', re.IGNORECASE)
+_NAME_SYMBOLS_RE = re.compile(r'[@#:`]')
+
+
+def _webhook_username(name: str) -> str:
+    """name with the parts Discord rejects in webhook usernames taken out."""
+    name = _NAME_SYMBOLS_RE.sub('', _RESERVED_NAME_RE.sub('', name)).strip()
+    return name[:80] or 'Userphone caller'
+
+
+class RelayLine:
+    """One relayed userphone message."""
+    __slots__ = ('author_name', 'avatar_url', 'content', 'origin')
+
+    def __init__(self, author_name: str, avatar_url: Optional[str], content: str, origin=None):
+        self.author_name = author_name
+        self.avatar_url = avatar_url
+        self.content = content
+        self.origin = origin
+
+    def render(self) -> str:
+        return f"**{self.author_name}**📞: {self.content}"
+
+
+class _ChannelRelay:
+    __slots__ = ('channel', 'queue', 'task', 'max_depth')
+
+    def __init__(self, channel, queue_size: int):
+        self.channel = channel
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.max_depth = 0
+
+
+def _pack(texts: List[str]) -> List[Tuple[str, int]]:
+    """
+    Join texts with newlines into as few messages as fit within MESSAGE_LIMIT.
+    Returns (message, number of texts in it) pairs; a text is never split across messages.
+    """
+    messages, current, count = [], '', 0
+    for text in texts:
+        text = text[:MESSAGE_LIMIT]
+        if current and len(current) + 1 + len(text) > MESSAGE_LIMIT:
+            messages.append((current, count))
+            current, count = text, 1
+        else:
+            current = f"{current}\n{text}" if current else text
+            count += 1
+    if current:
+        messages.append((current, count))
+    return messages
+
+
+class MessageRelay:
+    """
+    Delivers relayed userphone lines through a bounded outbound queue per destination channel.
+
+    on_message only enqueues; one worker per channel sends in order, so a slow or
+    rate-limited channel never stalls the event handler. When a channel backs up, the
+    queued lines are coalesced into as few messages as possible. With use_webhooks,
+    lines are sent through a cached per-channel webhook under the sender's name and
+    avatar, falling back to a normal message where webhooks are unavailable.
+    """
+
+    def __init__(self, queue_size: int = RELAY_QUEUE_SIZE, use_webhooks: bool = False):
+        self.queue_size = queue_size
+        self.use_webhooks = use_webhooks
+        self._channels: Dict[int, _ChannelRelay] = {}
+        # channel_id -> Webhook, or None when the channel can't use webhooks
+        self._webhooks: 'OrderedDict[int, Optional[discord.Webhook]]' = OrderedDict()
+        self.submitted = 0
+        self.delivered = 0
+        self.sends = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, channel, line: RelayLine) -> bool:
+        """Queue a line for a channel without waiting. Returns False if it was dropped (queue full)."""
+        relay = self._channels.get(channel.id)
+        if relay is None:
+            relay = self._channels[channel.id] = _ChannelRelay(channel, self.queue_size)
+            relay.task = asyncio.create_task(self._worker(relay))
+        try:
+            relay.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        relay.max_depth = max(relay.max_depth, relay.queue.qsize())
+        return True
+
+    def stats(self) -> dict:
+        """Relay counters plus the current queue depth of every active channel."""
+        return {
+            'submitted': self.submitted,
+            'delivered': self.delivered,
+            'sends': self.sends,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'channels': {
+                channel_id: {'depth': relay.queue.qsize(), 'max_depth': relay.max_depth}
+                for channel_id, relay in self._channels.items()
+            },
+        }
+
+    async def close(self):
+        """Stop all channel workers (queued lines are discarded)."""
+        relays = list(self._channels.values())
+        self._channels.clear()
+        for relay in relays:
+            relay.task.cancel()
+        await asyncio.gather(*(relay.task for relay in relays), return_exceptions=True)
+
+    async def _worker(self, relay: _ChannelRelay):
+        try:
+            while True:
+                try:
+                    first = await asyncio.wait_for(relay.queue.get(), RELAY_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    if relay.queue.empty():
+                        break
+                    continue
+                batch = [first]
+                while len(batch) < RELAY_COALESCE_MAX and not relay.queue.empty():
+                    batch.append(relay.queue.get_nowait())
+                try:
+                    await self._deliver(relay.channel, batch)
+                except Exception as e:
+                    # Keep the worker (and the lines queued behind this batch) alive
+                    self.failed += len(batch)
+                    print(f"[userphone] Failed to relay {len(batch)} line(s) to {relay.channel.id}: {e}")
+        finally:
+            if self._channels.get(relay.channel.id) is relay:
+                del self._channels[relay.channel.id]
+
+    async def _deliver(self, channel, batch: List[RelayLine]):
+        webhook = await self._webhook_for(channel) if self.use_webhooks else None
+        if webhook is not None:
+            # Consecutive lines from the same sender share one webhook message
+            groups: List[List[RelayLine]] = []
+            for line in batch:
+                if groups and groups[-1][0].author_name == line.author_name:
+                    groups[-1].append(line)
+                else:
+                    groups.append([line])
+            for index, group in enumerate(groups):
+                sent = await self._send_webhook_group(channel, webhook, group)
+                if sent < len(group):
+                    # Send what the webhook didn't, and the rest, normally
+                    await self._send_plain(channel, group[sent:] + [line for rest in groups[index + 1:] for line in rest])
+                    break
+        else:
+            await self._send_plain(channel, batch)
+        if len(batch) > 1:
+            self.coalesced += len(batch) - 1
+
+    async def _send_webhook_group(self, channel, webhook, lines: List[RelayLine]) -> int:
+        """
+        Send lines from one sender through a webhook under their name and avatar.
+        Returns how many lines went out; on a failure the rest are left to the caller.
+        """
+        head = lines[0]
+        username = head.author_name[:80]
+        retried = False
+        sent = 0
+        chunks = _pack([line.content for line in lines])
+        index = 0
+        while index < len(chunks):
+            text, count = chunks[index]
+            try:
+                await webhook.send(
+                    text,
+                    username=username,
+                    avatar_url=head.avatar_url,
+                    allowed_mentions=discord.AllowedMentions.none()
+                )
+            except (discord.NotFound, discord.Forbidden) as e:
+                # The webhook was deleted (look it up again next time) or may no longer be used
+                self._webhooks.pop(channel.id, None)
+                print(f"[userphone] Webhook delivery failed in {channel.id}, falling back: {e}")
+                return sent
+            except discord.HTTPException as e:
+                if e.status == 400 and not retried:
+                    # Usually a username Discord rejects: the webhook itself is fine
+                    retried = True
+                    username = _webhook_username(head.author_name)
+                    continue
+                print(f"[userphone] Webhook delivery failed in {channel.id}, falling back: {e}")
+                return sent
+            except Exception as e:
+                # Network errors and timeouts included
+                print(f"[userphone] Webhook delivery failed in {channel.id}, falling back: {e}")
+                return sent
+            self.sends += 1
+            self.delivered += count
+            sent += count
+            index += 1
+        return sent
+
+    async def _send_plain(self, channel, lines: List[RelayLine]):
+        sent = 0
+        try:
+            for text, count in _pack([line.render() for line in lines]):
+                await channel.send(text, allowed_mentions=discord.AllowedMentions.none())
+                self.sends += 1
+                self.delivered += count
+                sent += count
+        except Exception as e:
+            self.failed += len(lines) - sent
+            print(f"[userphone] Failed to relay {len(lines) - sent} line(s) to {channel.id}: {e}")
+            origin = lines[0].origin
+            if origin is not None:
+                try:
+                    await origin.send("Failed to deliver message.")
+                except Exception:
+                    pass
+
+    async def _webhook_for(self, channel) -> Optional['discord.Webhook']:
+        """Get (or create) this bot's relay webhook for a channel; None if not permitted."""
+        if channel.id in self._webhooks:
+            self._webhooks.move_to_end(channel.id)
+            return self._webhooks[channel.id]
+        webhook = None
+        try:
+            for existing in await channel.webhooks():
+                if existing.name == RELAY_WEBHOOK_NAME and existing.token:
+                    webhook = existing
+                    break
+            if webhook is None:
+                webhook = await channel.create_webhook(name=RELAY_WEBHOOK_NAME)
+        except (discord.Forbidden, AttributeError):
+            # Missing Manage Webhooks permission, or a channel type without webhooks
+            webhook = None
+        except discord.HTTPException as e:
+            if e.status >= 500:
+                print(f"[userphone] Could not get a webhook for {channel.id}: {e}")
+                return None
+            # e.g. the channel already has the maximum number of webhooks
+            webhook = None
+        except Exception as e:
+            # Probably temporary: send normally this time and try again next time
+            print(f"[userphone] Could not get a webhook for {channel.id}: {e}")
+            return None
+        self._remember_webhook(channel.id, webhook)
+        return webhook
+
+    def _remember_webhook(self, channel_id: int, webhook):
+        self._webhooks[channel_id] = webhook
+        self._webhooks.move_to_end(channel_id)
+        while len(self._webhooks) > RELAY_WEBHOOK_CACHE_SIZE:
+            self._webhooks.popitem(last=False)
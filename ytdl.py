@@ -0,0 +1,394 @@
+"""
+yt-dlp extraction pool and caches for the music player.
+
+yt-dlp is imported once, and each worker thread keeps one YoutubeDL for its lifetime
+(YoutubeDL is not thread-safe, so instances are never shared). Results are cached at
+two levels:
+
+- search query or link -> (extractor, video id) and the page to re-extract it from,
+  for QUERY_CACHE_TTL (what a search finds rarely changes)
+- (extractor, video id) -> stream info, until the signed stream URL expires (its
+  `expire` parameter)
+
+An entry close to expiry is still served, but is re-extracted in the background so
+the next request gets a fresh URL. Concurrent requests for the same query or video
+share one extraction.
+
+Playlists are listed without extracting their videos ("flat"), and their entries are
+handed over as yt-dlp pages through them, so a long playlist can start playing after
+its first page.
+
+Environment:
+    YTDL_WORKERS    extractor threads (default 2)
+"""
+import asyncio
+import itertools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Optional
+from urllib.parse import parse_qs, urlparse
+
+try:
+    import yt_dlp
+except ImportError:
+    yt_dlp = None
+
+YTDL_OPTIONS = {
+    'format': 'bestaudio/best',
+    'noplaylist': True,
+    'quiet': True,
+    'ignoreerrors': True,
+}
+# Listing playlists: entries are only named, not extracted, and come as they are paged in
+PLAYLIST_OPTIONS = {
+    **YTDL_OPTIONS,
+    'noplaylist': False,
+    'extract_flat': 'in_playlist',
+    'lazy_playlist': True,
+}
+# Most entries taken from one playlist
+PLAYLIST_LIMIT = 500
+# Entries fetched at a time from playlists yt-dlp pages by index
+PLAYLIST_CHUNK = 50
+# URL path parts of playlist pages (YouTube, SoundCloud sets, Bandcamp albums, ...)
+PLAYLIST_PATHS = ('/playlist', '/sets/', '/album/')
+# How long a search keeps pointing at the same video
+QUERY_CACHE_TTL = 6 * 60 * 60
+QUERY_CACHE_SIZE = 2048
+VIDEO_CACHE_SIZE = 1024
+# Stream URLs with no readable expiry are trusted for this long
+DEFAULT_URL_TTL = 60 * 60
+# Re-extract a video this long before its stream URL expires
+REFRESH_MARGIN = 10 * 60
+
+_EXPIRE_RE = re.compile(r'[?&/]expire[=/](\d+)')
+
+_local = threading.local()
+
+
+class TTLCache:
+    """LRU mapping whose entries each expire at a given time.time()."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def url_expiry(url: str) -> float:
+    """time.time() at which a signed stream URL stops working (estimated when it doesn't say)."""
+    match = _EXPIRE_RE.search(url or '')
+    if match:
+        return float(match.group(1))
+    return time.time() + DEFAULT_URL_TTL
+
+
+def _ydl(playlist: bool = False):
+    # One YoutubeDL (of each kind) per worker thread, created on first use and kept
+    attr = 'playlist_ydl' if playlist else 'ydl'
+    ydl = getattr(_local, attr, None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(PLAYLIST_OPTIONS if playlist else YTDL_OPTIONS)
+        setattr(_local, attr, ydl)
+    return ydl
+
+
+def is_url(query: str) -> bool:
+    return query.startswith(('http://', 'https://'))
+
+
+def is_playlist_url(query: str) -> bool:
+    """Whether query links to a playlist, rather than to one video (possibly within a playlist)."""
+    if not is_url(query):
+        return False
+    url = urlparse(query)
+    params = parse_qs(url.query)
+    if 'list' in params and 'v' not in params:
+        return True
+    return any(part in url.path for part in PLAYLIST_PATHS)
+
+
+def _pick_format(entry: dict) -> Optional[dict]:
+    """Best audio format of entry, preferring Opus (which the player can pass through without transcoding)."""
+    fmts = entry.get('formats') or []
+    audio_fmts = [f for f in fmts if f.get('url') and f.get('acodec') and f.get('acodec') != 'none']
+    if not audio_fmts:
+        return None
+    audio_only = [f for f in audio_fmts if not f.get('vcodec') or f.get('vcodec') == 'none']
+    candidates = audio_only or audio_fmts
+
+    def _fmt_score(f):
+        return (f.get('acodec') == 'opus', f.get('abr') or f.get('tbr') or f.get('filesize') or 0)
+    return max(candidates, key=_fmt_score)
+
+
+def _entry_info(entry: dict, target: str) -> dict:
+    fmt = _pick_format(entry)
+    if fmt is not None:
+        stream_url = fmt['url']
+        codec, bitrate = fmt.get('acodec'), fmt.get('abr')
+    else:
+        # No format list: the entry itself is the stream (its codec, if yt-dlp knows it)
+        stream_url = entry.get('url') or entry.get('webpage_url')
+        codec, bitrate = entry.get('acodec'), entry.get('abr')
+    return {
+        'id': entry.get('id'),
+        'extractor': entry.get('extractor_key') or entry.get('ie_key') or entry.get('extractor'),
+        # What to extract again once stream_url expires: the video's own page (any site), else what was asked for
+        'source': entry.get('webpage_url') or target,
+        'stream_url': stream_url,
+        'title': entry.get('title'),
+        'webpage': entry.get('webpage_url') or entry.get('url'),
+        'thumbnail': entry.get('thumbnail'),
+        'expires_at': url_expiry(stream_url),
+        'codec': codec if codec != 'none' else None,
+        'bitrate': int(bitrate) if bitrate else None,
+    }
+
+
+def _extract(target: str) -> Optional[dict]:
+    """Blocking: full extraction of a search ('ytsearch1:...') or video URL, on a worker thread."""
+    info = _ydl().extract_info(target, download=False)
+    if not info:
+        return None
+    entry = info
+    if 'entries' in info:
+        entries = [e for e in info['entries'] if e]
+        if not entries:
+            return None
+        entry = entries[0]
+    return _entry_info(entry, target)
+
+
+def _iter_entries(entries) -> Iterable[dict]:
+    if hasattr(entries, 'getslice'):
+        # yt-dlp PagedList: fetch it a chunk at a time rather than all at once
+        start = 0
+        while True:
+            chunk = entries.getslice(start, start + PLAYLIST_CHUNK)
+            if not chunk:
+                return
+            yield from chunk
+            start += len(chunk)
+    else:
+        yield from entries
+
+
+def _list_playlist(url: str, emit, stop: threading.Event):
+    """
+    Blocking: call emit(entry) for each entry of the playlist at url as yt-dlp reads it, and
+    emit(title) first. Entries are {'url', 'title', 'id'}. Stops early once stop is set.
+    """
+    ydl = _ydl(playlist=True)
+    info = ydl.extract_info(url, download=False, process=False)
+    # Some links redirect to the playlist page first
+    for _ in range(3):
+        if not info or info.get('_type') != 'url':
+            break
+        info = ydl.extract_info(info['url'], download=False, process=False)
+    if not info:
+        return
+    emit(info.get('title'))
+    if 'entries' not in info:
+        # Not a playlist after all: a single video
+        emit({'url': info.get('webpage_url') or url, 'title': info.get('title'), 'id': info.get('id')})
+        return
+    for entry in itertools.islice(_iter_entries(info['entries']), PLAYLIST_LIMIT):
+        if stop.is_set():
+            return
+        if not entry or entry.get('_type') == 'playlist':
+            continue
+        link = entry.get('webpage_url') or entry.get('url')
+        if not link:
+            continue
+        if not is_url(link):
+            # Flat YouTube entries may carry only the video id; other sites' entries need a link
+            if entry.get('ie_key') != 'Youtube' or not entry.get('id'):
+                continue
+            link = f"https://www.youtube.com/watch?v={entry['id']}"
+        emit({'url': link, 'title': entry.get('title'), 'id': entry.get('id')})
+
+
+def _normalise(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+def _video_key(info: dict) -> tuple:
+    # Ids are only unique per site
+    return info.get('extractor') or '', info['id']
+
+
+class YtdlResolver:
+    """Resolves /play search terms to stream info through the worker pool and caches."""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or int(os.environ.get('YTDL_WORKERS') or 2)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Playlist listings can take a while, so they get their own threads and never hold up a track
+        self._playlist_executor: Optional[ThreadPoolExecutor] = None
+        self.queries = TTLCache(QUERY_CACHE_SIZE)
+        self.videos = TTLCache(VIDEO_CACHE_SIZE)
+        # Extractions in progress, so identical concurrent requests share one
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        # Background refreshes (kept referenced until they finish)
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        # yt-dlp calls actually made (concurrent identical requests count once)
+        self.extractions = 0
+
+    @property
+    def available(self) -> bool:
+        return yt_dlp is not None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ytdl')
+        return self._executor
+
+    async def resolve(self, query: str) -> dict:
+        """Stream info for a search term: stream_url, title, webpage, thumbnail, id, expires_at, codec, bitrate ({} if nothing found)."""
+        if yt_dlp is None:
+            return {}
+        # Video ids in links are case-sensitive, so only search terms are normalised
+        key = query.strip() if is_url(query) else _normalise(query)
+        known = self.queries.get(key)
+        if known is not None:
+            video_key, source = known
+            info = self.videos.get(video_key)
+            if info is not None:
+                self.hits += 1
+                if info['expires_at'] - time.time() < REFRESH_MARGIN:
+                    self._refresh_later(video_key, source)
+                return dict(info)
+            # Known video, but its stream URL lapsed: extract its page again and skip the search
+            self.refreshes += 1
+            info = await self._shared(('video', video_key), source)
+        else:
+            self.misses += 1
+            # Links are extracted as they are; anything else is a search
+            target = query if is_url(query) else f"ytsearch1:{query}"
+            info = await self._shared(('query', key), target)
+        if info is None:
+            return {}
+        if info.get('id'):
+            self.queries.put(key, (_video_key(info), info['source']), time.time() + QUERY_CACHE_TTL)
+        return dict(info)
+
+    async def _shared(self, key: tuple, target: str) -> Optional[dict]:
+        # The extraction runs as its own task, shared by every caller asking for the same key.
+        # Callers await it through shield(), so cancelling one (a timeout, a guild leaving
+        # voice) never cancels the extraction the others are waiting on.
+        task = self._inflight.get(key)
+        if task is None:
+            self.extractions += 1
+            task = asyncio.create_task(self._run_extraction(target))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._extraction_done(key, done))
+        return await asyncio.shield(task)
+
+    async def _run_extraction(self, target: str) -> Optional[dict]:
+        info = await asyncio.get_running_loop().run_in_executor(self._pool(), _extract, target)
+        if info is not None and info.get('id'):
+            self.videos.put(_video_key(info), info, info['expires_at'])
+        return info
+
+    def _extraction_done(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the error as seen even when every caller gave up waiting
+        if not task.cancelled():
+            task.exception()
+
+    async def playlist(self, url: str) -> AsyncIterator:
+        """
+        The playlist at url: its title (None if unknown) first, then one {'url', 'title', 'id'}
+        per entry, each as soon as yt-dlp has read it. Stopping the iteration stops the listing.
+        """
+        if yt_dlp is None:
+            return
+        loop = asyncio.get_running_loop()
+        if self._playlist_executor is None:
+            self._playlist_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ytdl-list')
+        items: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def _emit(item):
+            loop.call_soon_threadsafe(items.put_nowait, item)
+
+        def _run():
+            try:
+                _list_playlist(url, _emit, stop)
+            finally:
+                loop.call_soon_threadsafe(items.put_nowait, done)
+
+        listing = loop.run_in_executor(self._playlist_executor, _run)
+        try:
+            while True:
+                item = await items.get()
+                if item is done:
+                    break
+                yield item
+            # Raise whatever stopped the listing
+            await listing
+        finally:
+            stop.set()
+
+    def _refresh_later(self, video_key: tuple, source: str):
+        key = ('video', video_key)
+        if key in self._inflight:
+            return
+        self.refreshes += 1
+
+        async def _refresh():
+            try:
+                await self._shared(key, source)
+            except Exception as e:
+                print(f"[ytdl] Background refresh of {source} failed: {e}")
+
+        task = asyncio.create_task(_refresh())
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+    def stats(self) -> dict:
+        return {
+            'queries': len(self.queries),
+            'videos': len(self.videos),
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'extractions': self.extractions,
+        }
+
+    def close(self):
+        for task in (*self._refreshing, *self._inflight.values()):
+            task.cancel()
+        for executor in (self._executor, self._playlist_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._playlist_executor = None